@@ -0,0 +1,108 @@
+"""
+Định dạng câu trả lời cho kết quả tool ngay trên máy, theo đúng các quy tắc trong
+prompt viết lại của ``PollutionQueryHandler`` nhưng không cần gọi Claude lần hai.
+"""
+
+import math
+
+# Cách gọi mức ô nhiễm trong câu trả lời truy vấn (xem prompt "query").
+QUERY_LEVEL_NAMES = ["thấp", "trung bình", "cao", "rất cao", "mức nguy hại"]
+
+STATS_TITLES = {
+    "mean": "Kết quả thống kê trung bình (`mean`) của các chỉ số ô nhiễm:",
+    "median": "Kết quả thống kê trung vị (`median`) của các chỉ số ô nhiễm:",
+    "std": "Độ lệch chuẩn (`std`) của các chỉ số ô nhiễm:",
+    "max": "Mức độ ô nhiễm cao nhất (`max`) được ghi nhận trong khoảng thời gian đã chọn:",
+    "min": "Mức độ ô nhiễm thấp nhất (`min`) được ghi nhận trong khoảng thời gian đã chọn:",
+}
+
+PREDICT_ADVICE = [
+    "Chất lượng không khí tốt là một ngày tuyệt vời để ra ngoài.",
+    "Chất lượng không khí ổn định, nhưng hãy quan tâm bản thân khi ra ngoài.",
+    "Chất lượng không khí kém, nên hạn chế ra ngoài và đeo khẩu trang.",
+    "Chất lượng không khí rất kém, hạn chế ra ngoài và tuân thủ hướng dẫn bảo vệ sức khỏe.",
+    "Cảnh báo ô nhiễm cực cao, hãy ở nhà và thực hiện các biện pháp an toàn.",
+]
+
+INSERT_MESSAGE = ("Dữ liệu đã được thêm vào cơ sở dữ liệu. "
+                  "Bạn có thể thử truy vấn lại thời điểm này để kiểm tra thông tin vừa thêm.")
+
+
+def _field(record, name):
+    # Cassandra trả tên cột chữ thường (aqi_label), DataFrame từ CSV giữ nguyên (AQI_Label).
+    return record.get(name, record.get(name.lower()))
+
+
+def _format_number(value):
+    value = float(value)
+    return f"{value:.0f}" if value.is_integer() else f"{value:.2f}"
+
+
+def render_query(records):
+    """Giờ trong ngày nhóm theo mức ô nhiễm, mỗi ngày một khối, theo thứ tự thời gian."""
+    days = {}
+    for record in records:
+        hour, label = _field(record, "hour"), _field(record, "AQI_Label")
+        if hour is None or label is None or (isinstance(label, float) and math.isnan(label)):
+            continue
+        key = (int(_field(record, "year")), int(_field(record, "month")), int(_field(record, "day")))
+        days.setdefault(key, {}).setdefault(int(label), set()).add(int(hour))
+
+    if not days:
+        return "Không có dữ liệu phù hợp với truy vấn."
+
+    blocks = []
+    for (year, month, day), levels in sorted(days.items()):
+        lines = [f"Ngày {day} tháng {month} năm {year}:"]
+        for level, hours in sorted(levels.items()):
+            name = QUERY_LEVEL_NAMES[level] if 0 <= level < len(QUERY_LEVEL_NAMES) else str(level)
+            lines.append(f"- {','.join(f'{hour}h' for hour in sorted(hours))}: Ô nhiễm {name} ({level})")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def _render_stat(stat_type, stats_data):
+    if stat_type == "count":
+        return f"Tổng số bản ghi dữ liệu (`count`): {stats_data.get('Total Records', 0)}"
+    if stat_type not in STATS_TITLES or "error" in stats_data:
+        return "Dữ liệu không hợp lệ hoặc không thể diễn giải."
+    lines = [STATS_TITLES[stat_type]]
+    lines.extend(f"- {key} : {_format_number(value)}" for key, value in stats_data.items())
+    return "\n".join(lines)
+
+
+def render_stats(result):
+    """Một khối cho mỗi loại thống kê; kết quả nhiều loại ("mean,std") có dạng {loại: {cột: giá trị}}."""
+    stat_type = result.get("stat_type") or ""
+    stats_data = result.get("result", {})
+    if "," not in stat_type:
+        return _render_stat(stat_type, stats_data)
+    if "error" in stats_data:
+        return "Dữ liệu không hợp lệ hoặc không thể diễn giải."
+    return "\n\n".join(_render_stat(name, stats_data.get(name, {})) for name in stat_type.split(","))
+
+
+def render_predict(result):
+    level = int(result["pollution_level"])
+    description = result.get("description", level)
+    if not 0 <= level < len(PREDICT_ADVICE):
+        return f"{description} ({level})"
+    return f"{description} ({level}) - {PREDICT_ADVICE[level]}"
+
+
+def render_insert(result):
+    return INSERT_MESSAGE
+
+
+RENDERERS = {
+    "query": render_query,
+    "stats": render_stats,
+    "predict": render_predict,
+    "insert": render_insert,
+}
+
+
+def render(source, result):
+    """Câu trả lời đã định dạng cho ``source``; None nếu không có mẫu cho nguồn này."""
+    renderer = RENDERERS.get(source)
+    return renderer(result) if renderer is not None else None
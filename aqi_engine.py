@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+# Bảng điểm gãy (nồng độ, AQI) cho từng cột cảm biến.
+CO_BREAKPOINTS = [(0, 0), (941, 50), (1075, 100), (1221, 150), (1407, 200), (1704, 300)]
+NO2_BREAKPOINTS = [(0, 0), (1242, 50), (1456, 100), (1662, 150), (1886, 200), (2349, 300)]
+O3_BREAKPOINTS = [(0, 0), (742, 50), (983, 100), (1255, 150), (1577, 200), (2086, 300)]
+
+DEFAULT_BREAKPOINTS = {
+    'PT08.S1(CO)': CO_BREAKPOINTS,
+    'PT08.S4(NO2)': NO2_BREAKPOINTS,
+    'PT08.S5(O3)': O3_BREAKPOINTS,
+}
+
+# Tên cột chỉ số phụ tương ứng với mỗi cột cảm biến.
+SUB_INDEX_COLUMNS = {
+    'PT08.S1(CO)': 'AQI_CO',
+    'PT08.S4(NO2)': 'AQI_NO2',
+    'PT08.S5(O3)': 'AQI_O3',
+}
+
+# Cận trên (bao gồm) của các mức 0-3; lớn hơn 200 là mức 4.
+AQI_LABEL_EDGES = np.array([50, 100, 150, 200], dtype=np.float64)
+
+
+def sub_index(values, breakpoints):
+    """Tính chỉ số AQI phụ cho cả một cột bằng nội suy tuyến tính từng đoạn.
+
+    Cho kết quả giống hệt ``AQIProcessor.calculate_aqi``: giá trị nằm ngoài bảng
+    (hoặc NaN) nhận AQI của điểm gãy cuối cùng.
+    """
+    conc = np.asarray(values, dtype=np.float64)
+    bp = np.asarray(breakpoints, dtype=np.float64)
+    x, y = bp[:, 0], bp[:, 1]
+
+    # side='left' chọn đoạn đầu tiên khi nồng độ nằm đúng trên điểm gãy,
+    # giống vòng lặp gốc.
+    seg = np.clip(np.searchsorted(x, conc, side='left') - 1, 0, len(bp) - 2)
+    x0, x1 = x[seg], x[seg + 1]
+    y0, y1 = y[seg], y[seg + 1]
+    aqi = np.round(((y1 - y0) / (x1 - x0)) * (conc - x0) + y0)
+
+    in_range = (conc >= x[0]) & (conc <= x[-1])
+    return np.where(in_range, aqi, y[-1]).astype(np.int64)
+
+
+def label_aqi(aqi):
+    """Gán nhãn 0-4 cho một mảng AQI (NaN được xếp vào mức 4 như bản gốc)."""
+    return np.searchsorted(AQI_LABEL_EDGES, np.asarray(aqi, dtype=np.float64), side='left')
+
+
+def compute_aqi_frame(df, breakpoints=None):
+    """Trả về DataFrame gồm các cột AQI phụ và cột ``AQI`` tổng hợp."""
+    breakpoints = breakpoints or DEFAULT_BREAKPOINTS
+    result = pd.DataFrame(index=df.index)
+    for column, table in breakpoints.items():
+        name = SUB_INDEX_COLUMNS.get(column, f'AQI_{column}')
+        result[name] = sub_index(df[column].to_numpy(), table)
+    result['AQI'] = result.to_numpy().max(axis=1)
+    return result
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+📦 Dự đoán hàng loạt cho file CSV đã xử lý hoặc một khoảng thời gian trong Cassandra.
+
+    python batch_predict.py csv --input Data/processed_AQI_data.csv --output Data/relabelled.csv
+    python batch_predict.py cassandra --start 2004-03-10 --end 2004-12-31 --write-back
+    python batch_predict.py cassandra --start 2004-03-10 --end 2004-12-31 --output range.csv
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import inference_engine
+import metrics
+import result_cache
+import timeseries_index
+from bulk_loader import BulkLoader
+from cassandra_CRUD import POLLUTION_TABLE
+from storage import parse_end_time
+
+logger = metrics.get_logger("batch_predict")
+
+# Cột đặc trưng trong CSV đã xử lý, theo đúng thứ tự đầu vào của mô hình.
+CSV_FEATURE_COLUMNS = ['Day', 'Month', 'Year', 'Hour', 'PT08.S1(CO)', 'C6H6(GT)', 'PT08.S5(O3)', 'PT08.S2(NMHC)',
+                       'PT08.S4(NO2)']
+CASSANDRA_COLUMNS = "year,month,day,hour,id,pt08_s1_co,c6h6_gt,pt08_s5_o3,pt08_s2_nmhc,pt08_s4_no2"
+CASSANDRA_FEATURE_COLUMNS = ['day', 'month', 'year', 'hour', 'pt08_s1_co', 'c6h6_gt', 'pt08_s5_o3', 'pt08_s2_nmhc',
+                             'pt08_s4_no2']
+UPDATE_LABEL = f"""
+UPDATE {POLLUTION_TABLE} SET aqi_label = ? WHERE year = ? AND month = ? AND day = ? AND hour = ? AND id = ?
+"""
+
+
+class BatchPredictor:
+    """Chạy mô hình trên dữ liệu lớn theo từng batch, bộ nhớ chỉ giữ một batch."""
+
+    def __init__(self, engine=None, batch_size=8192, label_column='AQI_Label'):
+        self.engine = engine or inference_engine.get_engine()
+        self.batch_size = batch_size
+        self.label_column = label_column
+        self.rows = 0
+        self.last_stats = None
+
+    def _report(self, start):
+        seconds = time.perf_counter() - start
+        rate = self.rows / seconds if seconds > 0 else 0.0
+        logger.info("Đã dự đoán %s dòng trong %.2fs (%.0f dòng/s)", self.rows, seconds, rate)
+        self.last_stats = {"rows": self.rows, "seconds": seconds, "rows_per_sec": rate}
+        return self.last_stats
+
+    def iter_csv(self, source):
+        """Đọc CSV theo chunk, ghi đè cột nhãn bằng kết quả dự đoán và trả về từng đoạn CSV."""
+        self.engine.load()
+        start = time.perf_counter()
+        self.rows = 0
+        for index, chunk in enumerate(pd.read_csv(source, chunksize=self.batch_size)):
+            chunk[self.label_column] = self.engine.predict_classes(chunk[CSV_FEATURE_COLUMNS].to_numpy())
+            self.rows += len(chunk)
+            yield chunk.to_csv(index=False, header=index == 0)
+        self._report(start)
+
+    def score_csv(self, input_path, output_path):
+        with open(output_path, 'w', newline='') as output:
+            for part in self.iter_csv(input_path):
+                output.write(part)
+        return self.last_stats
+
+    def _iter_range_frames(self, processor, start, end):
+        batch = []
+        for row in processor.iter_pollution_range(start, end, CASSANDRA_COLUMNS, fetch_size=self.batch_size):
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                yield pd.DataFrame(batch, columns=CASSANDRA_COLUMNS.split(','))
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=CASSANDRA_COLUMNS.split(','))
+
+    def score_cassandra(self, processor, start, end, write_back=False, output_path=None, concurrency=64):
+        """Dự đoán lại nhãn cho các dòng trong [start, end]; ghi lại vào bảng và/hoặc ra CSV."""
+        loader = None
+        if write_back:
+            processor.mark_rollups_dirty(span=(start, end))
+            loader = BulkLoader(processor.session, UPDATE_LABEL, concurrency=concurrency,
+                                partition_key=lambda params: (params[1], params[2]), progress_every=0)
+        output = open(output_path, 'w', newline='') if output_path else None
+
+        self.engine.load()
+        begin = time.perf_counter()
+        self.rows = 0
+        failed = 0
+        try:
+            for index, frame in enumerate(self._iter_range_frames(processor, start, end)):
+                labels = self.engine.predict_classes(frame[CASSANDRA_FEATURE_COLUMNS].to_numpy())
+                frame['aqi_label'] = labels
+                if loader is not None:
+                    result = loader.load(zip(labels.astype(float).tolist(), frame['year'].tolist(),
+                                             frame['month'].tolist(), frame['day'].tolist(),
+                                             frame['hour'].tolist(), frame['id'].tolist()))
+                    failed += result["failed"]
+                if output is not None:
+                    output.write(frame.drop(columns=['id']).to_csv(index=False, header=index == 0))
+                self.rows += len(frame)
+        finally:
+            if output is not None:
+                output.close()
+            if loader is not None:
+                processor.refresh_rollups(span=(start, end))
+                timeseries_index.reload_range(processor, start, end)
+                result_cache.get_cache().invalidate(start, end)
+        stats = self._report(begin)
+        stats["failed_updates"] = failed
+        return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=8192)
+    sources = parser.add_subparsers(dest="source", required=True)
+
+    csv_parser = sources.add_parser("csv", help="Dự đoán cho file CSV đã xử lý")
+    csv_parser.add_argument("--input", default="Data/processed_AQI_data.csv")
+    csv_parser.add_argument("--output", required=True)
+
+    db_parser = sources.add_parser("cassandra", help="Dự đoán cho một khoảng thời gian trong Cassandra")
+    db_parser.add_argument("--start", required=True, type=datetime.fromisoformat, help="Ví dụ 2004-03-10 hoặc 2004-03-10T06")
+    db_parser.add_argument("--end", required=True, type=parse_end_time)
+    db_parser.add_argument("--write-back", action="store_true", help="Cập nhật cột aqi_label trong bảng")
+    db_parser.add_argument("--output", default=None, help="Ghi kết quả ra CSV")
+    db_parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    predictor = BatchPredictor(batch_size=args.batch_size)
+    if args.source == "csv":
+        stats = predictor.score_csv(args.input, args.output)
+    else:
+        import db_pool
+
+        if not args.write_back and not args.output:
+            parser.error("cần --write-back và/hoặc --output")
+        try:
+            stats = predictor.score_cassandra(db_pool.get_processor(), args.start, args.end, args.write_back,
+                                              args.output, args.concurrency)
+        finally:
+            db_pool.shutdown_pool()
+    print(f"✅ Đã dự đoán {stats['rows']} dòng trong {stats['seconds']:.2f}s ({stats['rows_per_sec']:,.0f} dòng/s)")
@@ -0,0 +1,87 @@
+"""
+So sánh thời gian tính AQI giữa đường vô hướng cũ (Series.apply) và aqi_engine.
+
+    python benchmarks/bench_aqi.py --scale 100
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import aqi_engine
+from process_data_training import AQIProcessor
+
+
+def load_scaled(path, scale):
+    processor = AQIProcessor(path, None)
+    processor.load_data()
+    processor.process_time()
+    processor.fill_missing_values()
+    return pd.concat([processor.df] * scale, ignore_index=True)
+
+
+def scalar_path(df):
+    processor = AQIProcessor(None, None)
+
+    def categorize_aqi(aqi):
+        if aqi <= 50:
+            return 0
+        elif aqi <= 100:
+            return 1
+        elif aqi <= 150:
+            return 2
+        elif aqi <= 200:
+            return 3
+        return 4
+
+    out = pd.DataFrame(index=df.index)
+    for column, table in aqi_engine.DEFAULT_BREAKPOINTS.items():
+        name = aqi_engine.SUB_INDEX_COLUMNS[column]
+        out[name] = df[column].apply(lambda x: processor.calculate_aqi(x, table))
+    out['AQI'] = out.max(axis=1)
+    out['AQI_Label'] = out['AQI'].apply(categorize_aqi)
+    return out
+
+
+def vector_path(df):
+    out = aqi_engine.compute_aqi_frame(df)
+    out['AQI_Label'] = aqi_engine.label_aqi(out['AQI'])
+    return out
+
+
+def timed(fn, df):
+    start = time.perf_counter()
+    result = fn(df)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--input", default=os.path.join(ROOT, "Data", "AirQuality1.csv"))
+    parser.add_argument("--scale", type=int, default=100)
+    args = parser.parse_args()
+
+    df = load_scaled(args.input, args.scale)
+    print(f"Số dòng: {len(df):,}")
+
+    vector, vector_time = timed(vector_path, df)
+    scalar, scalar_time = timed(scalar_path, df)
+
+    for column in scalar.columns:
+        if not np.array_equal(scalar[column].to_numpy(), vector[column].to_numpy()):
+            raise SystemExit(f"❌ Kết quả khác nhau ở cột {column}")
+
+    print(f"Vô hướng (apply): {scalar_time:.3f}s ({len(df) / scalar_time:,.0f} dòng/s)")
+    print(f"Vector hóa:       {vector_time:.3f}s ({len(df) / vector_time:,.0f} dòng/s)")
+    print(f"Tăng tốc: x{scalar_time / vector_time:.1f} — kết quả trùng khớp ✅")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+So sánh nạp dữ liệu từng dòng đồng bộ (cách cũ) với BulkLoader.
+
+Mặc định chạy trên session giả lập có độ trễ mạng; truyền --hosts để đo trên Cassandra thật.
+
+    python benchmarks/bench_bulk_load.py --latency 0.002 --concurrency 64
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+from bulk_loader import BulkLoader
+from cassandra_CRUD import PollutionDataProcessor
+from fakes import FakeSession
+
+INSERT = """
+INSERT INTO pollution_data (id, Day, Month, Year, Hour, PT08_S1_CO, C6H6_GT, PT08_S5_O3, PT08_S2_NMHC, PT08_S4_NO2, AQI_Label)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def legacy_insert(session, rows):
+    query = INSERT.replace("?", "%s")
+    start = time.perf_counter()
+    for params in rows:
+        try:
+            session.execute(query, params)
+        except Exception:
+            pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default=os.path.join(os.path.dirname(ROOT), "Data", "processed_AQI_data.csv"))
+    parser.add_argument("--rows", type=int, default=2000, help="Số dòng dùng để đo (0 = toàn bộ)")
+    parser.add_argument("--latency", type=float, default=0.002, help="Độ trễ giả lập mỗi request (giây)")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--hosts", default=None, help="Ví dụ 127.0.0.1 để đo trên cluster thật")
+    parser.add_argument("--keyspace", default="pollution_db")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv)
+    if args.rows:
+        df = df.head(args.rows)
+    rows = list(PollutionDataProcessor.rows_from_frame(df))
+
+    if args.hosts:
+        from cassandra.cluster import Cluster
+        cluster = Cluster(args.hosts.split(","))
+        session = cluster.connect(args.keyspace)
+    else:
+        session = FakeSession(latency=args.latency, failure_rate=args.failure_rate)
+
+    legacy_time = legacy_insert(session, rows)
+    print(f"Từng dòng đồng bộ: {legacy_time:.2f}s ({len(rows) / legacy_time:,.0f} dòng/s)")
+
+    loader = BulkLoader(session, INSERT, concurrency=args.concurrency, progress_every=0)
+    result = loader.load(rows)
+    print(f"BulkLoader:        {result['seconds']:.2f}s ({result['rows_per_sec']:,.0f} dòng/s), "
+          f"lỗi còn lại: {result['failed']}")
+    if isinstance(session, FakeSession):
+        print(f"Request song song tối đa: {session.max_in_flight}, số lần prepare: {session.prepare_calls}")
+        session.shutdown()
+    else:
+        cluster.shutdown()
+
+
+if __name__ == "__main__":
+    main()
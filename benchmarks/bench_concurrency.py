@@ -0,0 +1,111 @@
+"""
+Đo thông lượng /api/query và /api/stats khi nhiều client gọi đồng thời: cách cũ
+(client Anthropic và driver Cassandra đồng bộ gọi thẳng trong handler async) so
+với đường async mới. Claude và Cassandra đều là bản giả lập có độ trễ cố định.
+
+    python benchmarks/bench_concurrency.py --concurrency 1 8 32 --requests 64
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import namedtuple
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+os.chdir(os.path.dirname(ROOT))
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark-key")
+
+import httpx
+
+import db_pool
+import web_app
+from db_pool import ConnectionPool
+from fakes import FakeAnthropic, FakeAsyncAnthropic, FakeCluster, FakeSession
+from result_cache import ResultCache
+from tool_cache import ToolSelectionCache
+
+QueryRow = namedtuple("QueryRow", ["hour", "aqi_label", "day", "month", "year"])
+STATS_PARAMS = {"start_day": 1, "start_month": 3, "end_day": 31, "end_month": 5, "year": 2004}
+QUERY_TOOL = ("query_pollution_data_openai", {"year": 2004, "month": 3, "day": 10})
+
+
+def respond(query, values):
+    """Trả dữ liệu giả cho các câu SELECT trên bảng phân vùng theo tháng."""
+    if not query.lstrip().upper().startswith("SELECT"):
+        return None
+    year, month = values[0], values[1]
+    if query.lstrip().lower().startswith("select hour"):
+        return [QueryRow(hour, hour % 5, 10, month, year) for hour in range(24)]
+    return [(1000.0 + i, 10.0, 900.0, 950.0, 1500.0, float(i % 5)) for i in range(24 * 30)]
+
+
+@web_app.app.post("/bench/query-blocking")
+async def blocking_query(request: web_app.QueryRequest):
+    """Bản sao handler cũ: gọi client đồng bộ ngay trên event loop."""
+    result = web_app.ai_handler.call_claude_function(request.message)
+    return {"success": True, "response": web_app.ai_handler.rewrite_result_with_advice(result)}
+
+
+@web_app.app.get("/bench/stats-blocking/{stat_type}")
+async def blocking_stats(stat_type: str, start_day: int, start_month: int, end_day: int, end_month: int,
+                         year: int):
+    return {"success": True, "statistics": web_app.ai_handler.statistical_analysis(
+        stat_type, start_day, start_month, end_day, end_month, year)}
+
+
+async def run_level(client, method, url, concurrency, requests, **kwargs):
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            response = await client.request(method, url, **kwargs)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Độ trễ một lần gọi Claude (giây)")
+    parser.add_argument("--db-latency", type=float, default=0.005, help="Độ trễ một câu CQL (giây)")
+    args = parser.parse_args()
+
+    handler = web_app.ai_handler
+    # Tắt các cache và rollup để mọi request đều thực sự gọi Claude và quét Cassandra.
+    handler.tool_cache = ToolSelectionCache(max_entries=0, rules=None)
+    handler.result_cache = ResultCache(max_entries=0)
+    handler.use_rollups = False
+    handler.client = FakeAnthropic(args.llm_latency, tool_call=lambda prompt: QUERY_TOOL)
+    handler.async_client = FakeAsyncAnthropic(args.llm_latency, tool_call=lambda prompt: QUERY_TOOL)
+    db_pool._pool = ConnectionPool(cluster_factory=lambda hosts: FakeCluster(
+        hosts, session_factory=lambda: FakeSession(latency=args.db_latency, responder=respond)))
+
+    cases = [
+        ("/api/query", "POST", "/bench/query-blocking", "/api/query", {"json": {"message": "10/3/2004"}}),
+        ("/api/stats", "GET", "/bench/stats-blocking/mean", "/api/stats/mean", {"params": STATS_PARAMS}),
+    ]
+    transport = httpx.ASGITransport(app=web_app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, method, blocking_url, async_url, kwargs in cases:
+            print(f"{name} ({args.requests} request mỗi mức)")
+            for concurrency in args.concurrency:
+                blocking = await run_level(client, method, blocking_url, concurrency, args.requests, **kwargs)
+                non_blocking = await run_level(client, method, async_url, concurrency, args.requests, **kwargs)
+                print(f"  {concurrency:>3} client: đồng bộ {blocking:7.1f} req/s | async {non_blocking:7.1f} req/s "
+                      f"(x{non_blocking / blocking:.1f})")
+    db_pool.shutdown_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""
+Đo thời gian import khi khởi động bằng ``python -X importtime`` cho các module mà
+worker và CLI nạp đầu tiên, và báo lỗi (exit code 1) khi vượt ngưỡng hoặc khi một
+phụ thuộc nặng (TensorFlow, anthropic, driver Cassandra, pandas) bị import ngay lúc
+khởi động thay vì ở lần dùng đầu tiên.
+
+    python benchmarks/bench_import_time.py --runs 5 --max-ms 1500
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Module khởi động -> ngưỡng mặc định (ms, thời gian import tích lũy, lấy lần nhanh nhất).
+TARGETS = {"web_app": 1500, "function_calling": 600, "start": 100}
+HEAVY = ["tensorflow", "tensorboard", "keras", "anthropic", "cassandra", "pandas"]
+
+
+def import_times(module):
+    """Danh sách (tên module, độ sâu, self µs, tích lũy µs) theo thứ tự trong stderr của
+    ``-X importtime`` (module con được in trước module cha)."""
+    env = dict(os.environ, ANTHROPIC_API_KEY=os.environ.get("ANTHROPIC_API_KEY") or "benchmark-key",
+               PREWARM="false")
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stderr
+    times = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        times.append((name.strip(), depth, int(own.rsplit(":", 1)[1]), int(cumulative)))
+    return times
+
+
+def breakdown(times, module):
+    """(tổng µs, các module con trực tiếp [(tích lũy µs, tên)]) của lần import ``module`` ở mức ngoài cùng."""
+    position = next(index for index, entry in enumerate(times) if entry[0] == module and entry[1] == 0)
+    children = []
+    for name, depth, _, cumulative in reversed(times[:position]):
+        if depth == 0:
+            break
+        if depth == 1:
+            children.append((cumulative, name))
+    return times[position][3], sorted(children, reverse=True)
+
+
+def measure(module, runs):
+    best = None
+    for _ in range(runs):
+        times = import_times(module)
+        if best is None or breakdown(times, module)[0] < breakdown(best, module)[0]:
+            best = times
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="Ngưỡng chung cho mọi module (mặc định theo từng module: "
+                             + ", ".join(f"{name} {limit} ms" for name, limit in TARGETS.items()) + ")")
+    parser.add_argument("--top", type=int, default=5, help="Số module con chậm nhất cần liệt kê")
+    args = parser.parse_args()
+
+    failures = []
+    for module, limit in TARGETS.items():
+        limit = args.max_ms or limit
+        times = measure(module, args.runs)
+        total, children = breakdown(times, module)
+        total_ms = total / 1000
+        heavy = sorted({entry[0].split(".")[0] for entry in times} & set(HEAVY))
+        status = "✅" if total_ms <= limit and not heavy else "❌"
+        print(f"{status} import {module}: {total_ms:7.1f} ms (ngưỡng {limit:.0f} ms); "
+              f"phụ thuộc nặng: {', '.join(heavy) or 'không'}")
+        print("     chậm nhất: " + ", ".join(f"{name} {cumulative / 1000:.0f} ms" for cumulative, name in children[:args.top]))
+        if total_ms > limit:
+            failures.append(f"{module} mất {total_ms:.0f} ms > {limit:.0f} ms")
+        if heavy:
+            failures.append(f"{module} import ngay {', '.join(heavy)}")
+
+    if failures:
+        raise SystemExit("❌ " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Đẩy lại toàn bộ Data/AirQuality1.csv qua /api/ingest (mỗi request một ngày, nhiều
+client song song) vào Cassandra giả (bảng trong bộ nhớ, độ trễ cố định mỗi câu CQL).
+So sánh ghi ngay từng request với ghi theo lô, đo thời gian, số lần ghi, độ trễ từ lúc
+nhận tới lúc ghi; kiểm tra nhãn AQI tính trên server khớp processed_AQI_data.csv và
+kho lưu trữ chậm làm request bị từ chối bằng 429 (kèm Retry-After) thay vì đệm vô hạn,
+còn ?wait=true trả 202 kèm ticket sau ``wait_seconds`` thay vì chờ mãi.
+
+    python benchmarks/bench_ingest.py --clients 16 --db-latency 0.002
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+os.chdir(os.path.dirname(ROOT))
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark-key")
+os.environ.setdefault("PREWARM", "false")
+
+import httpx
+import pandas as pd
+
+import db_pool
+import ingest
+import web_app
+from config import Config
+from db_pool import ConnectionPool
+from fakes import FakeCluster, FakeSession, FakeTables
+
+
+def day_bodies(path):
+    """Thân CSV (dòng tiêu đề + số đo) của từng ngày trong file, theo thứ tự."""
+    with open(path, encoding="utf-8-sig") as f:
+        lines = f.read().splitlines()
+    header, days = lines[0], {}
+    for line in lines[1:]:
+        if line.strip(";, "):
+            days.setdefault(line.split(";", 1)[0], []).append(line)
+    return ["\n".join([header] + rows) + "\n" for rows in days.values()]
+
+
+async def run(bodies, clients, ingestor, wait_last):
+    """Gửi các ngày qua /api/ingest; trả về (mã trạng thái, thời gian, độ trễ tối đa, header 429)."""
+    web_app.ingestor = ingestor
+    ingestor.start()
+    statuses, retry_after, max_lag = [], set(), 0.0
+    queue = asyncio.Queue()
+    for body in bodies:
+        queue.put_nowait(body)
+
+    async def client_loop(client):
+        while not queue.empty():
+            response = await client.post("/api/ingest", content=queue.get_nowait(),
+                                         headers={"Content-Type": "text/csv"})
+            statuses.append(response.status_code)
+            if response.status_code == 429:
+                retry_after.add(response.headers.get("retry-after"))
+
+    async def watch_lag():
+        nonlocal max_lag
+        while True:
+            max_lag = max(max_lag, ingestor.lag())
+            await asyncio.sleep(0.005)
+
+    transport = httpx.ASGITransport(app=web_app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        watcher = asyncio.create_task(watch_lag())
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(clients)))
+        if wait_last:
+            # ?wait=true chỉ trả lời khi mọi dòng (kể cả của request trước) đã được ghi.
+            response = await client.post("/api/ingest?wait=true", content=bodies[-1],
+                                         headers={"Content-Type": "text/csv"})
+            if response.status_code != 200 or ingestor.buffered or ingestor.written != ingestor.accepted:
+                raise SystemExit(f"❌ ?wait=true trả lời khi còn {ingestor.buffered} dòng chưa ghi")
+        elapsed = time.perf_counter() - start
+        watcher.cancel()
+    await ingestor.stop()
+    return statuses, elapsed, max_lag, retry_after
+
+
+def scenario(bodies, clients, db_latency, **options):
+    """Chạy một cấu hình trên Cassandra giả mới; trả về (kết quả run, Ingestor, bảng, số câu CQL)."""
+    tables = FakeTables()
+    db_pool._pool = ConnectionPool(cluster_factory=lambda hosts: FakeCluster(
+        hosts, session_factory=lambda: FakeSession(latency=db_latency, responder=tables)))
+    processor = db_pool.get_processor()
+    processor.create_schema()
+    session = processor.session
+    requests_before = session.requests
+    # Ghi từng request có thể lâu hơn INGEST_WAIT_SECONDS mặc định; ?wait=true ở đây phải chờ tới khi ghi xong.
+    ingestor = ingest.Ingestor(**{"wait_seconds": 120, **options})
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = asyncio.run(run(bodies, clients, ingestor, wait_last=options.get("max_buffered_rows") is None))
+        return result, ingestor, tables, session.requests - requests_before
+    finally:
+        db_pool.shutdown_pool()
+
+
+async def post_waiting(body, ingestor):
+    """Một request ?wait=true; trả về (mã trạng thái, JSON, flushed_seq sau khi dừng Ingestor)."""
+    web_app.ingestor = ingestor
+    ingestor.start()
+    transport = httpx.ASGITransport(app=web_app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        response = await client.post("/api/ingest?wait=true", content=body, headers={"Content-Type": "text/csv"})
+    await ingestor.stop()
+    return response.status_code, response.json(), ingestor.stats()["flushed_seq"]
+
+
+async def post_oversized(body, ingestor):
+    """Mã trạng thái khi gửi ``body`` kèm Content-Length và khi gửi chunked (không có Content-Length)."""
+    web_app.ingestor = ingestor
+
+    async def chunks():
+        for start in range(0, len(body), 1024):
+            yield body[start:start + 1024]
+
+    transport = httpx.ASGITransport(app=web_app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        sized = await client.post("/api/ingest", content=body, headers={"Content-Type": "text/csv"})
+        chunked = await client.post("/api/ingest", content=chunks(), headers={"Content-Type": "text/csv"})
+    return sized.status_code, chunked.status_code
+
+
+def check_labels(tables, raw_path, processed_path):
+    """Số dòng đủ số đo đã so sánh; báo lỗi nếu nhãn/số đo khác processed_AQI_data.csv."""
+    raw = ingest.read_readings(open(raw_path, "rb").read(), "text/csv")
+    complete = ~(raw[ingest.SENSOR_COLUMNS].apply(pd.to_numeric, errors="coerce") == -200).any(axis=1).to_numpy()
+    expected = pd.read_csv(processed_path)[complete]
+    key = ["Year", "Month", "Day", "Hour"]
+    stored = pd.DataFrame([row for partition in tables.tables[FakeTables.POLLUTION_TABLE].values()
+                           for row in partition.values()])
+    stored = stored.rename(columns={"year": "Year", "month": "Month", "day": "Day", "hour": "Hour",
+                                    "aqi_label": "AQI_Label", "c6h6_gt": "C6H6(GT)"})
+    merged = expected.merge(stored.drop_duplicates(key), on=key, suffixes=("", "_stored"))
+    if len(merged) != len(expected):
+        raise SystemExit(f"❌ Thiếu {len(expected) - len(merged)} dòng đủ số đo trong kho lưu trữ")
+    wrong = merged[(merged["AQI_Label"] != merged["AQI_Label_stored"])
+                   | ((merged["C6H6(GT)"] - merged["C6H6(GT)_stored"]).abs() > 1e-9)]
+    if len(wrong):
+        raise SystemExit(f"❌ {len(wrong)} dòng có nhãn/số đo khác processed_AQI_data.csv:\n{wrong.head()}")
+    return len(merged)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="Data/AirQuality1.csv")
+    parser.add_argument("--processed", default="Data/processed_AQI_data.csv")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--db-latency", type=float, default=0.002, help="Độ trễ một câu CQL (giây)")
+    parser.add_argument("--slow-db-latency", type=float, default=0.2, help="Độ trễ khi kho lưu trữ chậm (giây)")
+    args = parser.parse_args()
+
+    bodies = day_bodies(args.csv)
+    rows = sum(body.count("\n") - 1 for body in bodies)
+    print(f"{len(bodies)} request (mỗi request một ngày, {rows} dòng), {args.clients} client; "
+          f"CQL giả lập {args.db_latency * 1000:.0f} ms")
+
+    results = {}
+    for name, options in [("ghi từng request", {"batch_rows": 1, "flush_seconds": 0.0}),
+                          ("theo lô (mặc định)", {})]:
+        (statuses, elapsed, max_lag, _), ingestor, tables, cql = scenario(
+            bodies, args.clients, args.db_latency, **options)
+        if set(statuses) != {200}:
+            raise SystemExit(f"❌ {name}: mã trạng thái {sorted(set(statuses))}")
+        # Ngày cuối được gửi lại với ?wait=true: khóa dòng xác định nên chỉ ghi đè, bảng vẫn có đúng ``rows`` dòng.
+        if len(tables) != rows or ingestor.failed:
+            raise SystemExit(f"❌ {name}: ghi {ingestor.written} dòng, bảng có {len(tables)} thay vì {rows}")
+        results[name] = elapsed
+        print(f"{name:<20} {elapsed:6.2f}s | {ingestor.written / elapsed:8.0f} dòng/s | {ingestor.batches:4d} lần ghi | "
+              f"{cql:5d} câu CQL | độ trễ tới lúc ghi tối đa {max_lag * 1000:5.0f} ms")
+    compared = check_labels(tables, args.csv, args.processed)
+    print(f"Nhãn AQI của {compared} dòng đủ số đo khớp processed_AQI_data.csv; "
+          f"ghi theo lô nhanh hơn x{results['ghi từng request'] / results['theo lô (mặc định)']:.1f}")
+
+    (statuses, elapsed, max_lag, retry_after), ingestor, tables, _ = scenario(
+        bodies[:120], args.clients, args.slow_db_latency, max_buffered_rows=500, backpressure_seconds=0.05)
+    throttled = statuses.count(429)
+    print(f"Kho chậm ({args.slow_db_latency * 1000:.0f} ms/CQL, đệm tối đa 500 dòng): {statuses.count(200)} nhận, "
+          f"{throttled} bị từ chối 429 (Retry-After {', '.join(sorted(retry_after)) or '-'}), "
+          f"bộ đệm cao nhất ≤ {ingestor.max_buffered_rows} dòng")
+    if not throttled or retry_after != {"1"}:
+        raise SystemExit("❌ Kho lưu trữ chậm nhưng không có request nào bị từ chối bằng 429 kèm Retry-After")
+    if len(tables) != ingestor.written or ingestor.written != ingestor.accepted:
+        raise SystemExit(f"❌ Nhận {ingestor.accepted} dòng, ghi {ingestor.written}, bảng có {len(tables)} sau khi dừng")
+
+    tables = FakeTables()
+    db_pool._pool = ConnectionPool(cluster_factory=lambda hosts: FakeCluster(
+        hosts, session_factory=lambda: FakeSession(latency=args.slow_db_latency, responder=tables)))
+    db_pool.get_processor().create_schema()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            status, body, flushed = asyncio.run(post_waiting(
+                bodies[0], ingest.Ingestor(flush_seconds=0.0, wait_seconds=0.05)))
+    finally:
+        db_pool.shutdown_pool()
+    print(f"?wait=true với kho chậm (chờ tối đa 50 ms): {status}, ticket {body.get('ticket')}, "
+          f"flushed_seq {flushed} sau khi dừng")
+    if status != 202 or body.get("written") is not False or flushed < body.get("ticket", 0):
+        raise SystemExit(f"❌ ?wait=true quá hạn phải trả 202 kèm ticket rồi vẫn ghi lô: {status} {body}")
+
+    # Thân request vượt INGEST_MAX_BODY_BYTES: 413 trước khi đọc hết hay phân tích dòng nào.
+    body = "".join(bodies[:200]).encode()
+    limit, Config.INGEST_MAX_BODY_BYTES = Config.INGEST_MAX_BODY_BYTES, len(body) // 2
+    ingestor = ingest.Ingestor()
+    try:
+        statuses = asyncio.run(post_oversized(body, ingestor))
+    finally:
+        Config.INGEST_MAX_BODY_BYTES = limit
+    print(f"Thân request {len(body) // 1024} KiB > giới hạn {len(body) // 2048} KiB: "
+          f"Content-Length {statuses[0]}, chunked {statuses[1]}")
+    if statuses != (413, 413) or ingestor.accepted:
+        raise SystemExit(f"❌ Thân request quá lớn phải bị từ chối 413: {statuses}, nhận {ingestor.accepted} dòng")
+
+
+if __name__ == "__main__":
+    main()
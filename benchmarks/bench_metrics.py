@@ -0,0 +1,182 @@
+"""
+Chạy một loạt request /api/query, /api/stats và /api/predict (Claude và Cassandra là
+bản giả lập có độ trễ cố định), đọc /metrics rồi in thời gian theo từng giai đoạn để
+thấy giai đoạn nào chiếm phần lớn độ trễ. Kiểm tra /metrics đúng định dạng văn bản
+Prometheus, có đủ các giai đoạn chính, và đo chi phí của một span so với print cũ.
+
+    python benchmarks/bench_metrics.py --requests 40 --llm-latency 0.05 --db-latency 0.005
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+os.chdir(os.path.dirname(ROOT))
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark-key")
+os.environ.setdefault("PREWARM", "false")
+
+import httpx
+
+import db_pool
+import metrics
+import web_app
+from db_pool import ConnectionPool
+from fakes import FakeAnthropic, FakeAsyncAnthropic, FakeCluster, FakeSession
+from result_cache import ResultCache
+from tool_cache import ToolSelectionCache
+
+QueryRow = namedtuple("QueryRow", ["hour", "aqi_label", "day", "month", "year"])
+STATS_PARAMS = {"start_day": 1, "start_month": 3, "end_day": 31, "end_month": 5, "year": 2004}
+PREDICT = {"day": 10, "month": 3, "year": 2004, "hour": 18, "pt08_s1_co": 1360, "c6h6_gt": 11.9,
+           "pt08_s5_o3": 1268, "pt08_s2_nmhc": 1046, "pt08_s4_no2": 1692}
+TOOLS = {
+    "query": ("query_pollution_data_openai", {"year": 2004, "month": 3, "day": 10}),
+    "predict": ("predict_pollution_level", {"Day": 10, "Month": 3, "Year": 2004, "Hour": 18, "PT08_S1_CO": 1360,
+                                            "C6H6_GT": 11.9, "PT08_S5_O3": 1268, "PT08_S2_NMHC": 1046,
+                                            "PT08_S4_NO2": 1692}),
+}
+# Các chuỗi (stage, name) phải có trong /metrics sau khi chạy.
+EXPECTED = [("tool_selection", "cache"), ("tool_selection", "llm"), ("tool", "query_pollution_data_openai"),
+            ("tool", "predict_pollution_level"), ("db", "query"), ("db", "scan_stats"), ("rewrite", "local:query"),
+            ("rewrite", "llm:predict"), ("inference", "predict"), ("inference", "predict_batch")]
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="([^"\\]|\\.)*",?)*\})? \S+$')
+
+
+def respond(query, values):
+    """Trả dữ liệu giả cho các câu SELECT trên bảng phân vùng theo tháng."""
+    if not query.lstrip().upper().startswith("SELECT"):
+        return None
+    year, month = values[0], values[1]
+    if query.lstrip().lower().startswith("select hour"):
+        return [QueryRow(hour, hour % 5, 10, month, year) for hour in range(24)]
+    return [(1000.0 + i, 10.0, 900.0, 950.0, 1500.0, float(i % 5)) for i in range(24 * 30)]
+
+
+def pick_tool(prompt):
+    return TOOLS["predict" if "dự đoán" in prompt else "query"]
+
+
+def parse(text):
+    """{tên sample: {chuỗi nhãn: giá trị}}; báo lỗi nếu có dòng sai định dạng."""
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith("#") or not line:
+            continue
+        if not SAMPLE.match(line):
+            raise SystemExit(f"❌ Dòng /metrics sai định dạng: {line}")
+        name_labels, value = line.rsplit(" ", 1)
+        name, _, labels = name_labels.partition("{")
+        samples.setdefault(name, {})[labels.rstrip("}")] = float(value)
+    return samples
+
+
+def per_call_us(function, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        function()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def overhead(rounds):
+    """(µs mỗi span, µs mỗi print kết quả truy vấn cũ, µs mỗi log debug bị tắt)."""
+    result = [{"hour": hour, "aqi_label": hour % 5, "day": 10, "month": 3, "year": 2004} for hour in range(24)]
+    logger = metrics.get_logger("bench")
+
+    def with_span():
+        with metrics.span("bench", "noop"):
+            pass
+
+    def with_print():
+        print(f'Kết quả từ hàm "query_pollution_data_openai": {result}, với tham số: {TOOLS["query"][1]}')
+
+    def with_log():
+        logger.debug('Kết quả từ hàm "%s": %s', "query_pollution_data_openai", result)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        printed = per_call_us(with_print, rounds)
+    return per_call_us(with_span, rounds), printed, per_call_us(with_log, rounds)
+
+
+async def run(client, requests):
+    for index in range(requests):
+        responses = await asyncio.gather(
+            client.post("/api/query", json={"message": f"ngày 10/3/2004 #{index}"}),
+            client.post("/api/query", json={"message": f"dự đoán ô nhiễm #{index}"}),
+            client.get("/api/stats/mean", params=STATS_PARAMS),
+            client.post("/api/predict", json=PREDICT),
+        )
+        for response in responses:
+            response.raise_for_status()
+    # Lặp lại đúng một câu hỏi: lần thứ hai lấy tool từ cache.
+    for _ in range(2):
+        (await client.post("/api/query", json={"message": "ngày 10/3/2004"})).raise_for_status()
+    return await client.get("/metrics")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Độ trễ một lần gọi Claude (giây)")
+    parser.add_argument("--db-latency", type=float, default=0.005, help="Độ trễ một câu CQL (giây)")
+    parser.add_argument("--rounds", type=int, default=20000, help="Số lần lặp khi đo chi phí span/log")
+    args = parser.parse_args()
+
+    handler = web_app.ai_handler
+    # Không dùng bộ luật và cache kết quả để mọi request đều đi qua Claude và Cassandra.
+    handler.tool_cache = ToolSelectionCache(max_entries=1024, rules=None)
+    handler.result_cache = ResultCache(max_entries=0)
+    handler.use_rollups = False
+    handler.client = FakeAnthropic(args.llm_latency, tool_call=pick_tool)
+    handler.async_client = FakeAsyncAnthropic(args.llm_latency, tool_call=pick_tool)
+    db_pool._pool = ConnectionPool(cluster_factory=lambda hosts: FakeCluster(
+        hosts, session_factory=lambda: FakeSession(latency=args.db_latency, responder=respond)))
+
+    async def go():
+        transport = httpx.ASGITransport(app=web_app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await run(client, args.requests)
+
+    try:
+        response = asyncio.run(go())
+    finally:
+        db_pool.shutdown_pool()
+    response.raise_for_status()
+    if not response.headers["content-type"].startswith("text/plain; version=0.0.4"):
+        raise SystemExit(f"❌ Content-Type của /metrics sai: {response.headers['content-type']}")
+    samples = parse(response.text)
+
+    counts = samples.get("aqm_stage_duration_seconds_count", {})
+    sums = samples.get("aqm_stage_duration_seconds_sum", {})
+    missing = [f"{stage}/{name}" for stage, name in EXPECTED if f'stage="{stage}",name="{name}"' not in counts]
+    if missing:
+        raise SystemExit(f"❌ /metrics thiếu giai đoạn: {', '.join(missing)}")
+
+    print(f"{args.requests} lượt x 4 request; Claude giả lập {args.llm_latency * 1000:.0f} ms, "
+          f"CQL {args.db_latency * 1000:.0f} ms")
+    print(f"{'Giai đoạn':<44}{'Số lần':>8}{'TB (ms)':>10}{'≈p50':>9}{'≈p95':>9}")
+    for labels in sorted(counts, key=lambda key: -sums[key]):
+        stage, name = re.findall(r'"([^"]*)"', labels)
+        p50 = metrics.STAGE_SECONDS.quantile(0.5, stage=stage, name=name) * 1000
+        p95 = metrics.STAGE_SECONDS.quantile(0.95, stage=stage, name=name) * 1000
+        print(f"{stage + '/' + name:<44}{counts[labels]:>8.0f}{sums[labels] / counts[labels] * 1000:>10.2f}"
+              f"{p50:>9.2f}{p95:>9.2f}")
+    http = samples.get("aqm_http_request_duration_seconds_count", {})
+    print("HTTP: " + ", ".join(f"{key} = {value:.0f}" for key, value in sorted(http.items())))
+    tool_calls = samples.get("aqm_tool_calls_total", {})
+    print("Tool: " + ", ".join(f"{key} = {value:.0f}" for key, value in sorted(tool_calls.items())))
+
+    span_us, print_us, log_us = overhead(args.rounds)
+    print(f"Chi phí: 1 span {span_us:.2f} µs | print kết quả cũ {print_us:.2f} µs | log debug (đang tắt) {log_us:.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Đo chi phí kết nối Cassandra cho mỗi request: tạo Cluster mới mỗi lần (cách cũ)
+so với ConnectionPool dùng chung, và đếm số lần kết nối thực sự được mở.
+
+    python benchmarks/bench_pool.py --requests 50 --threads 8 --connect-latency 0.2
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+from cassandra_CRUD import PollutionDataProcessor
+from db_pool import ConnectionPool
+from fakes import FakeCluster
+
+
+def run(requests, threads, handle):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda _: handle(), range(requests)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--connect-latency", type=float, default=0.2,
+                        help="Thời gian giả lập cho một lần connect/khám phá node (giây)")
+    args = parser.parse_args()
+
+    def cluster_factory(hosts):
+        return FakeCluster(hosts, connect_latency=args.connect_latency)
+
+    def per_request():
+        cluster = cluster_factory(["127.0.0.1"])
+        processor = PollutionDataProcessor(None, "pollution_db", session=cluster.connect("pollution_db"))
+        cluster.shutdown()
+        return processor
+
+    FakeCluster.connects = 0
+    legacy = run(args.requests, args.threads, per_request)
+    legacy_connects = FakeCluster.connects
+
+    pool = ConnectionPool(["127.0.0.1"], "pollution_db", cluster_factory=cluster_factory)
+    FakeCluster.connects = 0
+    pooled = run(args.requests, args.threads, pool.get_processor)
+    pooled_connects = FakeCluster.connects
+    pool.shutdown()
+
+    print(f"Cluster mới mỗi request: {legacy:.2f}s, {legacy_connects} lần kết nối, "
+          f"{legacy / args.requests * 1000:.1f} ms/request")
+    print(f"Pool dùng chung:         {pooled:.2f}s, {pooled_connects} lần kết nối, "
+          f"{pooled / args.requests * 1000:.1f} ms/request")
+    if pooled_connects != 1:
+        raise SystemExit(f"❌ Pool mở {pooled_connects} kết nối, mong đợi 1")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Đo p50/p99 của /api/predict: cách cũ (nạp mô hình và model.predict mỗi request)
+so với InferenceEngine được nạp và warm sẵn.
+
+    python benchmarks/bench_predict.py --requests 200 --legacy-requests 10
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark-key")
+
+from fastapi.testclient import TestClient
+
+import inference_engine
+import web_app
+
+PAYLOAD = {
+    "day": 10, "month": 3, "year": 2004, "hour": 18,
+    "pt08_s1_co": 1360, "c6h6_gt": 11.9, "pt08_s5_o3": 1268, "pt08_s2_nmhc": 1046, "pt08_s4_no2": 1692,
+}
+
+
+def legacy_predict(features):
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(inference_engine.get_engine().model_path)
+    return np.argmax(model.predict(features, verbose=0), axis=1)
+
+
+def measure(client, requests):
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.post("/api/predict", json=PAYLOAD)
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    p50, p99 = np.percentile(latencies, [50, 99])
+    return p50, p99, response.json()["prediction"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--legacy-requests", type=int, default=10)
+    args = parser.parse_args()
+
+    batcher = web_app.predict_batcher
+    with TestClient(web_app.app) as client:
+        engine_predict = batcher.predict_fn
+        batcher.predict_fn = legacy_predict
+        legacy = measure(client, args.legacy_requests)
+        batcher.predict_fn = engine_predict
+
+        start = time.perf_counter()
+        inference_engine.get_engine().load()
+        load_time = time.perf_counter() - start
+        engine = measure(client, args.requests)
+
+    if legacy[2] != engine[2]:
+        raise SystemExit(f"❌ Kết quả khác nhau: {legacy[2]} != {engine[2]}")
+    print(f"Nạp mô hình mỗi request: p50 {legacy[0]:.1f} ms, p99 {legacy[1]:.1f} ms ({args.legacy_requests} request)")
+    print(f"InferenceEngine (warm):  p50 {engine[0]:.2f} ms, p99 {engine[1]:.2f} ms ({args.requests} request), "
+          f"nạp một lần {load_time:.2f}s")
+    print("Phân vị đo trong engine:", inference_engine.get_engine().latency_percentiles())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Đo thời gian các tool query/stats khi đọc lặp lại cùng các ngày lịch sử: không cache
+so với ResultCache (bộ nhớ hoặc SQLite), và kiểm tra việc thêm dữ liệu chỉ xóa đúng
+các mục của ngày/tháng bị ảnh hưởng. Cassandra là bảng giả trong bộ nhớ nạp từ CSV.
+Thêm hai kiểm tra: hai "worker" dùng chung một file SQLite (worker A đọc trước khi B ghi
+và xóa cache thì A không lưu được kết quả cũ), và mục hết hạn sau ``ttl``.
+
+    python benchmarks/bench_result_cache.py --rounds 5 --db-latency 0.005
+    python benchmarks/bench_result_cache.py --sqlite /tmp/result_cache.sqlite
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+import db_pool
+import result_cache
+from db_pool import ConnectionPool
+from fakes import FakeCluster, FakeTables, FakeSession
+from function_calling import PollutionQueryHandler
+from result_cache import ResultCache
+
+DAYS = [(2004, 3, day) for day in range(10, 31)] + [(2004, 4, day) for day in range(1, 31)]
+STATS = [("mean", 3), ("median", 4), ("max", 5), ("count", 6)]
+
+
+def workload(handler):
+    results = []
+    for year, month, day in DAYS:
+        results.append(handler.query_pollution_data_openai(year=year, month=month, day=day))
+    for stat_type, month in STATS:
+        results.append(handler.statistical_analysis(stat_type, 1, month, 28, month, 2004))
+    return results
+
+
+def timed_rounds(handler, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        results = workload(handler)
+    return (time.perf_counter() - start) / rounds, results
+
+
+def check_shared_generation_and_ttl():
+    """(mục cũ bị chặn giữa hai worker, mục hết hạn) trên hai ResultCache cùng một file SQLite."""
+    directory = tempfile.mkdtemp(prefix="result_cache_bench_")
+    try:
+        path = os.path.join(directory, "cache.sqlite")
+        worker_a, worker_b = ResultCache(path=path), ResultCache(path=path)
+        day = (datetime(2004, 3, 10), datetime(2004, 3, 10, 23))
+        epoch = worker_a.epoch  # A bắt đầu đọc cơ sở dữ liệu
+        worker_b.invalidate_day(2004, 3, 10)  # B ghi ngày này và xóa cache
+        worker_a.put("query", *day, ["dữ liệu cũ"], epoch=epoch)
+        blocked = worker_b.get("query", *day) is None
+
+        short = ResultCache(path=os.path.join(directory, "ttl.sqlite"), ttl=0.05)
+        short.put("query", *day, ["x"], epoch=short.epoch)
+        cached = short.get("query", *day) is not None
+        time.sleep(0.1)
+        expired = cached and short.get("query", *day) is None
+        return blocked, expired
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="Data/processed_AQI_data.csv")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--db-latency", type=float, default=0.005, help="Độ trễ một câu CQL (giây)")
+    parser.add_argument("--sqlite", default=None, help="Dùng backend SQLite tại đường dẫn này")
+    args = parser.parse_args()
+
+    table = FakeTables()
+    table.load_frame(pd.read_csv(os.path.join(os.path.dirname(ROOT), args.csv)))
+    db_pool._pool = ConnectionPool(cluster_factory=lambda hosts: FakeCluster(
+        hosts, session_factory=lambda: FakeSession(latency=args.db_latency, responder=table)))
+    if args.sqlite and os.path.exists(args.sqlite):
+        os.remove(args.sqlite)
+
+    handler = PollutionQueryHandler("benchmark-key")
+    with contextlib.redirect_stdout(io.StringIO()):
+        handler.result_cache = ResultCache(max_entries=0)
+        uncached_seconds, expected = timed_rounds(handler, args.rounds)
+
+        # Processor xóa cache qua result_cache.get_cache() khi ghi, nên dùng chung một đối tượng.
+        cache = handler.result_cache = result_cache._cache = ResultCache(max_entries=512, path=args.sqlite)
+        workload(handler)
+        cached_seconds, actual = timed_rounds(handler, args.rounds)
+        if actual != expected:
+            raise SystemExit("❌ Kết quả từ cache khác kết quả đọc trực tiếp")
+
+        # Thêm giờ 5h ngày 10/3/2004 (dữ liệu bắt đầu từ 18h): chỉ các mục chứa ngày này bị xóa.
+        before = len(handler.query_pollution_data_openai(year=2004, month=3, day=10))
+        entries = cache.stats()["entries"]
+        handler.insert_data_to_database(10, 3, 2004, 5, 1000.0, 5.0, 900.0, 800.0, 1500.0, 1)
+        removed = entries - cache.stats()["entries"]
+        after = len(handler.query_pollution_data_openai(year=2004, month=3, day=10))
+
+    if after != before + 1:
+        raise SystemExit(f"❌ Dữ liệu cũ sau khi chèn: {before} -> {after} dòng")
+    print(f"{len(DAYS)} truy vấn ngày + {len(STATS)} thống kê tháng mỗi vòng, độ trễ CQL {args.db_latency * 1000:.0f} ms")
+    print(f"Không cache:  {uncached_seconds * 1000:8.1f} ms/vòng")
+    print(f"Có cache:     {cached_seconds * 1000:8.1f} ms/vòng (x{uncached_seconds / cached_seconds:.0f}, "
+          f"backend {cache.stats()['backend']})")
+    print(f"Chèn 1 dòng ngày 10/3/2004 xóa {removed}/{entries} mục cache; truy vấn lại thấy {after} dòng")
+    blocked, expired = check_shared_generation_and_ttl()
+    print(f"SQLite dùng chung: kết quả đọc trước khi worker khác xóa cache "
+          f"{'không được lưu' if blocked else 'VẪN LƯU'}; mục hết hạn sau ttl: {'có' if expired else 'KHÔNG'}")
+    if not (blocked and expired):
+        raise SystemExit("❌ Cache SQLite lưu kết quả cũ giữa các worker hoặc không hết hạn")
+    print("Thống kê cache:", cache.stats())
+    db_pool.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
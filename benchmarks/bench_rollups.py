@@ -0,0 +1,187 @@
+"""
+Đo thời gian statistical_analysis cho khoảng một năm: quét toàn bộ dữ liệu theo giờ
+so với gộp các dòng rollup ngày/tháng, kiểm tra kết quả hai cách khớp nhau (trung vị
+lấy từ sketch nên chỉ xấp xỉ) và rollup được cập nhật khi chèn dữ liệu mới; khi lần
+tính lại rollup sau khi ghi bị lỗi, thống kê phải quét dữ liệu gốc thay vì trả rollup cũ.
+Trước khi dựng rollup, một lần chèn vào tháng chưa có rollup phải tính lại cả tháng, và
+khoảng có ngày chưa có rollup phải quét dữ liệu gốc thay vì gộp phần rollup đang có.
+Cassandra là bảng giả trong bộ nhớ nạp từ CSV; trung vị được so thêm với np.median.
+
+    python benchmarks/bench_rollups.py --rounds 3 --db-latency 0.005
+"""
+
+import argparse
+import contextlib
+import io
+import math
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+import db_pool
+import rollups
+from db_pool import ConnectionPool
+from fakes import FakeCluster, FakeSession, FakeTables
+from function_calling import STATS_COLUMNS as COLUMNS, PollutionQueryHandler
+from result_cache import ResultCache
+
+STAT_TYPES = ["count", "mean", "std", "min", "max", "median"]
+# 1/4/2004 - 31/3/2005: hai tháng lẻ đầu/cuối không có, cả năm đọc từ rollup tháng.
+YEAR_RANGE = {"start_day": 1, "start_month": 4, "end_day": 31, "end_month": 3, "year": 2004, "end_year": 2005}
+# Khoảng lệch tháng: rollup ngày ở hai đầu, rollup tháng ở giữa.
+RAGGED_RANGE = {"start_day": 15, "start_month": 3, "end_day": 10, "end_month": 12, "year": 2004}
+
+
+def run_stats(handler, time_range):
+    return {stat_type: handler.statistical_analysis(stat_type, **time_range)["result"] for stat_type in STAT_TYPES}
+
+
+def timed(handler, time_range, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        results = run_stats(handler, time_range)
+    return (time.perf_counter() - start) / rounds, results
+
+
+def exact_medians(frame, time_range):
+    """Trung vị chính xác (np.median) trên CSV gốc, làm mốc cho trung vị xấp xỉ từ sketch."""
+    dates = pd.to_datetime(dict(year=frame["Year"], month=frame["Month"], day=frame["Day"]))
+    start = pd.Timestamp(time_range["year"], time_range["start_month"], time_range["start_day"])
+    end = pd.Timestamp(time_range.get("end_year") or time_range["year"], time_range["end_month"],
+                       time_range["end_day"])
+    values = frame.loc[(dates >= start) & (dates <= end), ["PT08.S1(CO)", "C6H6(GT)", "PT08.S5(O3)",
+                                                          "PT08.S2(NMHC)", "PT08.S4(NO2)", "AQI_Label"]]
+    return dict(zip(COLUMNS, np.median(values.to_numpy(np.float64), axis=0).tolist()))
+
+
+def max_relative_error(expected, actual, stat_types=STAT_TYPES):
+    worst = {}
+    for stat_type in stat_types:
+        worst[stat_type] = max(abs(actual[stat_type][column] - value) / max(abs(value), 1e-9)
+                               for column, value in expected[stat_type].items())
+    return worst
+
+
+def check(expected, actual, label):
+    errors = max_relative_error(expected, actual)
+    exact = {stat_type: error for stat_type, error in errors.items() if stat_type != "median"}
+    if max(exact.values()) > 1e-9 or errors["median"] > 0.01:
+        raise SystemExit(f"❌ Rollup lệch dữ liệu gốc ({label}): {errors}")
+    return errors
+
+
+def fail_refresh(*args, **kwargs):
+    raise RuntimeError("fake rollup write timeout")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="Data/processed_AQI_data.csv")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--db-latency", type=float, default=0.005, help="Độ trễ một câu CQL (giây)")
+    args = parser.parse_args()
+
+    tables = FakeTables()
+    frame = pd.read_csv(os.path.join(os.path.dirname(ROOT), args.csv))
+    tables.load_frame(frame)
+    db_pool._pool = ConnectionPool(cluster_factory=lambda hosts: FakeCluster(
+        hosts, session_factory=lambda: FakeSession(latency=args.db_latency, responder=tables)))
+
+    handler = PollutionQueryHandler("benchmark-key")
+    handler.result_cache = ResultCache(max_entries=0)
+    processor = db_pool.get_processor()
+    processor.create_schema()
+
+    march = {"start_day": 1, "start_month": 3, "end_day": 31, "end_month": 3, "year": 2004}
+    april = {"start_day": 1, "start_month": 4, "end_day": 30, "end_month": 4, "year": 2004}
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Dữ liệu gốc chưa có rollup; chèn 12h ngày 9/3/2004 qua tool: cả tháng 3 được tính lại.
+        handler.insert_data_to_database(9, 3, 2004, 12, 1200.0, 8.0, 1000.0, 900.0, 1600.0, 2)
+        uncovered_before = rollups.UNCOVERED_READS.value()
+        partial = {"march": run_stats(handler, march), "april": run_stats(handler, april)}
+        uncovered_reads = rollups.UNCOVERED_READS.value() - uncovered_before
+        handler.use_rollups = False
+        partial_raw = {"march": run_stats(handler, march), "april": run_stats(handler, april)}
+        handler.use_rollups = True
+
+        start = time.perf_counter()
+        months = sorted({(year, month) for year, month in tables.tables[FakeTables.POLLUTION_TABLE]})
+        for year, month in months:
+            processor.rollups.refresh_month(year, month)
+        build_seconds = time.perf_counter() - start
+
+        handler.use_rollups = False
+        raw_seconds, raw = timed(handler, YEAR_RANGE, args.rounds)
+        raw_ragged = run_stats(handler, RAGGED_RANGE)
+        handler.use_rollups = True
+        rollup_seconds, rolled = timed(handler, YEAR_RANGE, args.rounds)
+        rolled_ragged = run_stats(handler, RAGGED_RANGE)
+
+        # Chèn một giờ mới (5h ngày 10/3/2004): rollup ngày/tháng phải được tính lại.
+        stale_before = rollups.STALE_READS.value()
+        handler.insert_data_to_database(10, 3, 2004, 5, 1000.0, 5.0, 900.0, 800.0, 1500.0, 1)
+        rolled_march = run_stats(handler, march)
+        fresh_stale_reads = rollups.STALE_READS.value() - stale_before
+        handler.use_rollups = False
+        raw_march = run_stats(handler, march)
+
+        # Chèn 6h cùng ngày nhưng tính lại rollup lỗi: thống kê tháng 3 phải quét dữ liệu gốc.
+        processor.rollups.refresh_days, refresh_days = fail_refresh, processor.rollups.refresh_days
+        handler.insert_data_to_database(10, 3, 2004, 6, 5000.0, 50.0, 2500.0, 2000.0, 2500.0, 4)
+        processor.rollups.refresh_days = refresh_days
+        raw_failed = run_stats(handler, march)
+        handler.use_rollups = True
+        stale_before = rollups.STALE_READS.value()
+        served_failed = run_stats(handler, march)
+        failed_stale_reads = rollups.STALE_READS.value() - stale_before
+        # Lần tính lại sau đó thành công thì rollup được dùng lại.
+        processor.refresh_rollups(days=[(2004, 3, 10)])
+        stale_before = rollups.STALE_READS.value()
+        rolled_repaired = run_stats(handler, march)
+        repaired_stale_reads = rollups.STALE_READS.value() - stale_before
+
+    check(partial_raw["march"], partial["march"], "chèn vào tháng chưa có rollup")
+    if partial["april"] != partial_raw["april"] or uncovered_reads != len(STAT_TYPES):
+        raise SystemExit("❌ Khoảng chưa có rollup không quét dữ liệu gốc")
+    print(f"Chèn 1 dòng vào tháng chưa có rollup: count tháng 3 = {partial['march']['count']['Total Records']} "
+          f"(dữ liệu gốc {partial_raw['march']['count']['Total Records']}); tháng 4 chưa có rollup: "
+          f"{uncovered_reads}/{len(STAT_TYPES)} thống kê quét dữ liệu gốc")
+    year_errors = check(raw, rolled, "cả năm")
+    median_error = max_relative_error({"median": exact_medians(frame, YEAR_RANGE)}, rolled, ["median"])["median"]
+    if median_error > 0.011:
+        raise SystemExit(f"❌ Trung vị lệch {median_error * 100:.2f}% so với np.median")
+    check(raw_ragged, rolled_ragged, "khoảng lệch tháng")
+    check(raw_march, rolled_march, "sau khi chèn")
+    if fresh_stale_reads:
+        raise SystemExit(f"❌ Rollup vừa tính lại thành công nhưng {fresh_stale_reads} lần thống kê bị coi là cũ")
+    if served_failed != raw_failed or failed_stale_reads != len(STAT_TYPES):
+        raise SystemExit("❌ Tính lại rollup lỗi nhưng thống kê vẫn đọc rollup cũ")
+    check(raw_failed, rolled_repaired, "sau khi tính lại")
+    if repaired_stale_reads:
+        raise SystemExit("❌ Đã tính lại rollup thành công nhưng thống kê vẫn quét dữ liệu gốc")
+    print(f"Tính lại rollup lỗi sau khi ghi: {failed_stale_reads}/{len(STAT_TYPES)} thống kê quét dữ liệu gốc "
+          f"(khớp), dùng lại rollup sau lần tính lại thành công")
+
+    print(f"{len(tables)} dòng theo giờ, {len(months)} tháng; dựng rollup {build_seconds:.2f}s "
+          f"({tables.count('pollution_rollup_daily')} dòng ngày, {tables.count('pollution_rollup_monthly')} dòng tháng)")
+    print(f"{len(STAT_TYPES)} thống kê cả năm (1/4/2004 - 31/3/2005), độ trễ CQL {args.db_latency * 1000:.0f} ms")
+    print(f"Quét dữ liệu gốc: {raw_seconds * 1000:8.1f} ms")
+    print(f"Rollup:           {rollup_seconds * 1000:8.1f} ms (x{raw_seconds / rollup_seconds:.0f})")
+    print(f"Trung vị từ sketch lệch tối đa {median_error * 100:.3f}% so với np.median; "
+          f"các thống kê khác khớp quét dữ liệu gốc đến {max(v for k, v in year_errors.items() if k != 'median'):.1e}")
+    print(f"Sau khi chèn 1 dòng ngày 10/3/2004: count tháng 3 = {rolled_march['count']['Total Records']} "
+          f"(dữ liệu gốc {raw_march['count']['Total Records']})")
+    if any(math.isnan(value) for value in rolled["median"].values()):
+        raise SystemExit("❌ Trung vị rỗng")
+    db_pool.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
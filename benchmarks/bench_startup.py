@@ -0,0 +1,58 @@
+"""
+Đo thời gian khởi động và RSS tối đa của một tiến trình mới cho tới khi trả về
+dự đoán đầu tiên, với backend NumPy và backend Keras/TensorFlow.
+
+    python benchmarks/bench_startup.py --runs 3
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, resource, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+from function_calling import PollutionQueryHandler
+handler = PollutionQueryHandler("benchmark-key")
+result = handler.predict_pollution_level(10, 3, 2004, 18, 1360, 11.9, 1268, 1046, 1692)
+print(json.dumps({{
+    "seconds": time.perf_counter() - start,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "tensorflow_imported": "tensorflow" in sys.modules,
+    "result": result,
+}}))
+"""
+
+
+def run_once(backend):
+    env = dict(os.environ, MODEL_BACKEND=backend, TF_CPP_MIN_LOG_LEVEL="3")
+    output = subprocess.run([sys.executable, "-c", CHILD.format(root=ROOT)], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    results = {}
+    for backend in ("numpy", "keras"):
+        runs = [run_once(backend) for _ in range(args.runs)]
+        results[backend] = runs
+        best = min(run["seconds"] for run in runs)
+        rss = max(run["rss_mb"] for run in runs)
+        print(f"{backend:>6}: khởi động + dự đoán đầu tiên {best:.2f}s, RSS tối đa {rss:.0f} MB, "
+              f"import TensorFlow: {runs[0]['tensorflow_imported']}, kết quả: {runs[0]['result']}")
+
+    if results["numpy"][0]["result"] != results["keras"][0]["result"]:
+        raise SystemExit("❌ Hai backend cho kết quả khác nhau")
+
+
+if __name__ == "__main__":
+    main()
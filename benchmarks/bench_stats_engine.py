@@ -0,0 +1,97 @@
+"""
+So sánh cách tính thống kê cũ (gom mọi dòng thành một mảng rồi gọi NumPy, mỗi loại
+thống kê một lượt đọc) với StreamingStats (nạp từng trang, mọi loại trong một lượt):
+thời gian và bộ nhớ đỉnh (tracemalloc) trên các trang dòng giả lập như driver trả về.
+
+    python benchmarks/bench_stats_engine.py --rows 500000 --page-size 1000
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+
+from stats_engine import STAT_TYPES, StreamingStats
+
+COLUMNS = ["PT08_S1_CO", "C6H6_GT", "PT08_S5_O3", "PT08_S2_NMHC", "PT08_S4_NO2", "AQI_Label"]
+Row = namedtuple("Row", ["pt08_s1_co", "c6h6_gt", "pt08_s5_o3", "pt08_s2_nmhc", "pt08_s4_no2", "aqi_label"])
+REDUCERS = {"mean": np.mean, "median": np.median, "std": np.std, "min": np.min, "max": np.max}
+
+
+def make_pages(rows, page_size, seed=0):
+    rng = np.random.default_rng(seed)
+    data = np.column_stack([rng.normal(1100, 200, rows), rng.gamma(2, 5, rows), rng.normal(1000, 400, rows),
+                            rng.normal(950, 250, rows), rng.normal(1450, 350, rows), rng.integers(0, 5, rows)])
+    pages = [[Row(*values) for values in data[i:i + page_size].tolist()] for i in range(0, rows, page_size)]
+    return pages, data
+
+
+def baseline(pages):
+    """Một lượt đọc cho mỗi loại thống kê, như API cũ (một stat_type mỗi lần gọi)."""
+    results = {}
+    for stat_type in STAT_TYPES:
+        data = np.fromiter((value for page in pages for row in page for value in row), dtype=np.float64)
+        data = data.reshape(-1, len(COLUMNS))
+        results[stat_type] = ({"Total Records": len(data)} if stat_type == "count"
+                              else dict(zip(COLUMNS, REDUCERS[stat_type](data, axis=0).tolist())))
+    return results
+
+
+def streaming(pages, page_size):
+    stats = StreamingStats(COLUMNS, STAT_TYPES, page_size=page_size)
+    for page in pages:
+        stats.add_rows(page)
+    return stats.summary("all")["result"]
+
+
+def measure(function, *args):
+    # tracemalloc làm chậm mọi lần cấp phát nên thời gian và bộ nhớ được đo ở hai lần chạy riêng.
+    start = time.perf_counter()
+    result = function(*args)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--page-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    pages, data = make_pages(args.rows, args.page_size)
+    old_seconds, old_peak, expected = measure(baseline, pages)
+    new_seconds, new_peak, actual = measure(streaming, pages, args.page_size)
+
+    # Trung vị từ sketch: sai số tương đối tối đa 1% (cộng chênh lệch nhỏ vì np.median lấy
+    # trung bình hai phần tử giữa khi số dòng chẵn).
+    worst = {}
+    for stat_type in STAT_TYPES[1:]:
+        exp = np.array(list(expected[stat_type].values()))
+        got = np.array(list(actual[stat_type].values()))
+        worst[stat_type] = float(np.max(np.abs(got - exp) / np.maximum(np.abs(exp), 1e-9)))
+    if actual["count"] != expected["count"] or max(v for k, v in worst.items() if k != "median") > 1e-9 \
+            or worst["median"] > 0.011:
+        raise SystemExit(f"❌ Kết quả lệch: {worst}")
+
+    print(f"{args.rows} dòng, trang {args.page_size} dòng, {len(STAT_TYPES)} loại thống kê")
+    print(f"Cũ (mảng đầy đủ, {len(STAT_TYPES)} lượt): {old_seconds * 1000:8.1f} ms, "
+          f"bộ nhớ đỉnh {old_peak / 2 ** 20:6.1f} MiB")
+    print(f"StreamingStats (1 lượt):      {new_seconds * 1000:8.1f} ms, "
+          f"bộ nhớ đỉnh {new_peak / 2 ** 20:6.1f} MiB (x{old_seconds / new_seconds:.1f} nhanh hơn)")
+    print(f"Sai số tương đối lớn nhất: trung vị {worst['median'] * 100:.3f}%, "
+          f"các loại khác {max(v for k, v in worst.items() if k != 'median'):.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+So sánh độ trễ quét theo khoảng thời gian giữa hai backend lưu trữ: Cassandra (bảng
+giả trong bộ nhớ, có độ trễ cố định cho mỗi request) và ColumnarStore (file NumPy
+theo cột trong một thư mục tạm). Mỗi phép đo đọc các cột thống kê của khoảng và gộp
+vào StreamingStats, cùng một truy vấn theo ngày như tool query.
+
+    python benchmarks/bench_storage.py --scale 4 --rounds 5 --db-latency 0.002
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+import db_pool
+from columnar_store import ColumnarStore
+from db_pool import ConnectionPool
+from fakes import FakeCluster, FakeSession, FakeTables
+from stats_engine import STAT_TYPES, StreamingStats
+from storage import STATS_COLUMNS
+
+COLUMNS = ["PT08_S1_CO", "C6H6_GT", "PT08_S5_O3", "PT08_S2_NMHC", "PT08_S4_NO2", "AQI_Label"]
+
+
+def scaled_frame(csv_path, scale):
+    """Lặp lại dữ liệu ``scale`` lần, mỗi bản lùi 2 năm (dữ liệu gốc 3/2004 - 4/2005)."""
+    frame = pd.read_csv(csv_path)
+    copies = [frame.assign(Year=frame["Year"] + 2 * copy) for copy in range(scale)]
+    return pd.concat(copies, ignore_index=True)
+
+
+def range_scan(store, start, end):
+    stats = StreamingStats(COLUMNS, STAT_TYPES)
+    for page in store.iter_pollution_pages(start, end, STATS_COLUMNS):
+        stats.add_rows(page)
+    return stats.summary("all")
+
+
+def timed(function, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = function()
+    return (time.perf_counter() - start) / rounds, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="Data/processed_AQI_data.csv")
+    parser.add_argument("--scale", type=int, default=4, help="Số bản sao dữ liệu (mỗi bản 14 tháng)")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--db-latency", type=float, default=0.002, help="Độ trễ một request CQL (giây)")
+    args = parser.parse_args()
+
+    frame = scaled_frame(os.path.join(os.path.dirname(ROOT), args.csv), args.scale)
+    last_year = int(frame["Year"].max())
+    ranges = [
+        ("1 ngày", datetime(2004, 3, 15), datetime(2004, 3, 15, 23)),
+        ("1 tháng", datetime(2004, 6, 1), datetime(2004, 6, 30, 23)),
+        ("1 năm", datetime(2004, 4, 1), datetime(2005, 3, 31, 23)),
+        ("toàn bộ", datetime(2004, 1, 1), datetime(last_year, 12, 31, 23)),
+    ]
+
+    tables = FakeTables()
+    tables.load_frame(frame)
+    db_pool._pool = ConnectionPool(cluster_factory=lambda hosts: FakeCluster(
+        hosts, session_factory=lambda: FakeSession(latency=args.db_latency, responder=tables)))
+    cassandra = db_pool.get_processor()
+
+    directory = tempfile.mkdtemp(prefix="columnar_bench_")
+    try:
+        columnar = ColumnarStore(directory)
+        with contextlib.redirect_stdout(io.StringIO()):
+            load_seconds = columnar.insert_data(frame)["seconds"]
+
+        print(f"{len(frame)} dòng, {len(columnar.partitions())} phân vùng tháng; nạp vào kho cột {load_seconds:.2f}s; "
+              f"độ trễ CQL giả lập {args.db_latency * 1000:.0f} ms")
+        print(f"{'Khoảng':<10}{'Số dòng':>9}{'Cassandra':>14}{'Kho cột':>12}{'Nhanh hơn':>11}")
+        for label, start, end in ranges:
+            cassandra_seconds, expected = timed(lambda: range_scan(cassandra, start, end), args.rounds)
+            columnar_seconds, actual = timed(lambda: range_scan(columnar, start, end), args.rounds)
+            if actual != expected:
+                raise SystemExit(f"❌ Hai backend cho kết quả khác nhau ({label})")
+            print(f"{label:<10}{expected['result']['count']['Total Records']:>9}"
+                  f"{cassandra_seconds * 1000:>11.1f} ms{columnar_seconds * 1000:>9.1f} ms"
+                  f"{cassandra_seconds / columnar_seconds:>10.0f}x")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            cassandra_seconds, expected = timed(lambda: cassandra.query_pollution_data(2004, 5, 20), args.rounds)
+            columnar_seconds, actual = timed(lambda: columnar.query_pollution_data(2004, 5, 20), args.rounds)
+        if not actual.equals(expected):
+            raise SystemExit("❌ query_pollution_data khác nhau giữa hai backend")
+        print(f"{'query 1 ngày':<19}{cassandra_seconds * 1000:>11.1f} ms{columnar_seconds * 1000:>9.1f} ms"
+              f"{cassandra_seconds / columnar_seconds:>10.0f}x")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+        db_pool.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
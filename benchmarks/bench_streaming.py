@@ -0,0 +1,148 @@
+"""
+So sánh thời gian tới byte/sự kiện đầu tiên của /api/query (chờ cả hai lần gọi Claude
+và truy vấn dữ liệu) với /api/query/stream (server-sent events). Server uvicorn chạy
+thật trong một luồng để đo được thời điểm từng sự kiện tới client; Claude là client
+giả có độ trễ cố định và trả câu trả lời viết lại từng từ. Kiểm tra thứ tự sự kiện và
+câu trả lời ghép từ các đoạn stream khớp với /api/query.
+
+    python benchmarks/bench_streaming.py --requests 5 --llm-latency 0.8 --token-latency 0.03
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+os.chdir(os.path.dirname(ROOT))
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark-key")
+os.environ.setdefault("PREWARM", "false")
+
+import httpx
+import uvicorn
+
+import db_pool
+import web_app
+from db_pool import ConnectionPool
+from fakes import FakeAnthropic, FakeAsyncAnthropic, FakeCluster, FakeSession
+from result_cache import ResultCache
+from tool_cache import ToolSelectionCache
+
+PREDICT = ("predict_pollution_level", {"Day": 10, "Month": 3, "Year": 2004, "Hour": 18, "PT08_S1_CO": 1360,
+                                       "C6H6_GT": 11.9, "PT08_S5_O3": 1268, "PT08_S2_NMHC": 1046,
+                                       "PT08_S4_NO2": 1692})
+ANSWER = ("Rất nguy hại - Cảnh báo ô nhiễm cực cao, hãy ở nhà, đóng cửa sổ, hạn chế vận động mạnh và "
+          "đeo khẩu trang đạt chuẩn nếu buộc phải ra ngoài; theo dõi thông báo của cơ quan môi trường.")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port):
+    server = uvicorn.Server(uvicorn.Config(web_app.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread
+
+
+def blocking(client, message):
+    start = time.perf_counter()
+    response = client.post("/api/query", json={"message": message})
+    response.raise_for_status()
+    return time.perf_counter() - start, response.json()["response"]
+
+
+def streaming(client, message):
+    """({sự kiện: thời điểm đầu tiên tới}, thời gian tổng, danh sách sự kiện)."""
+    start = time.perf_counter()
+    first, events = {}, []
+    with client.stream("POST", "/api/query/stream", json={"message": message}) as response:
+        response.raise_for_status()
+        if not response.headers["content-type"].startswith("text/event-stream"):
+            raise SystemExit(f"❌ Content-Type sai: {response.headers['content-type']}")
+        event = None
+        for line in response.iter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+                first.setdefault(event, time.perf_counter() - start)
+            elif line.startswith("data: "):
+                events.append((event, json.loads(line[len("data: "):])))
+    return first, time.perf_counter() - start, events
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.8,
+                        help="Độ trễ chọn tool / tới token đầu tiên của Claude (giây)")
+    parser.add_argument("--token-latency", type=float, default=0.03, help="Thời gian giữa hai token (giây)")
+    args = parser.parse_args()
+
+    handler = web_app.ai_handler
+    # Không cache tool để mọi câu hỏi đều chờ Claude chọn tool.
+    handler.tool_cache = ToolSelectionCache(max_entries=0, rules=None)
+    handler.result_cache = ResultCache(max_entries=0)
+    handler.client = FakeAnthropic(args.llm_latency, tool_call=lambda prompt: PREDICT,
+                                   token_latency=args.token_latency, answer=lambda prompt: ANSWER)
+    handler.async_client = FakeAsyncAnthropic(args.llm_latency, tool_call=lambda prompt: PREDICT,
+                                              token_latency=args.token_latency, answer=lambda prompt: ANSWER)
+    db_pool._pool = ConnectionPool(cluster_factory=lambda hosts: FakeCluster(
+        hosts, session_factory=lambda: FakeSession(latency=0.005)))
+
+    port = free_port()
+    server, thread = start_server(port)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            blocking(client, "khởi động")  # nạp mô hình trước khi đo
+            totals, firsts, totals_stream, tokens = [], {}, [], 0
+            for index in range(args.requests):
+                message = f"dự đoán ô nhiễm #{index}"
+                seconds, expected = blocking(client, message)
+                totals.append(seconds)
+                first, seconds, events = streaming(client, message)
+                totals_stream.append(seconds)
+                for event, at in first.items():
+                    firsts.setdefault(event, []).append(at)
+
+                names = [event for event, _ in events]
+                order = [name for position, name in enumerate(names) if position == 0 or names[position - 1] != name]
+                if order != ["tool_selected", "tool_result", "answer", "done"]:
+                    raise SystemExit(f"❌ Thứ tự sự kiện sai: {order}")
+                answer = "".join(data["text"] for event, data in events if event == "answer")
+                if answer != expected or events[-1][1]["response"] != expected:
+                    raise SystemExit(f"❌ Câu trả lời stream khác /api/query: {answer!r} != {expected!r}")
+                tokens = names.count("answer")
+    finally:
+        server.should_exit = True
+        thread.join()
+        db_pool.shutdown_pool()
+
+    print(f"{args.requests} câu hỏi dự đoán; Claude giả lập {args.llm_latency * 1000:.0f} ms tới phản hồi/token đầu, "
+          f"{args.token_latency * 1000:.0f} ms mỗi token ({tokens} token)")
+    print(f"/api/query:         phản hồi sau {median(totals) * 1000:7.0f} ms")
+    print(f"/api/query/stream:  tool_selected {median(firsts['tool_selected']) * 1000:7.0f} ms | "
+          f"tool_result {median(firsts['tool_result']) * 1000:6.0f} ms | "
+          f"token đầu {median(firsts['answer']) * 1000:6.0f} ms | xong {median(totals_stream) * 1000:6.0f} ms")
+    speedup = median(totals) / median(firsts["tool_selected"])
+    print(f"Sự kiện đầu tiên tới sớm hơn x{speedup:.1f} so với chờ toàn bộ câu trả lời")
+    if median(firsts["tool_selected"]) > args.llm_latency * 1.5 + 0.1:
+        raise SystemExit("❌ Sự kiện đầu tiên tới chậm hơn độ trễ chọn tool")
+
+
+if __name__ == "__main__":
+    main()
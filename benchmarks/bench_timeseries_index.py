@@ -0,0 +1,172 @@
+"""
+Đo độ trễ query_pollution_data_openai (một ngày) và statistical_analysis (một năm)
+khi đọc từ chỉ mục thời gian theo giờ so với đọc Cassandra (bảng giả trong bộ nhớ,
+có độ trễ cố định mỗi request) và rollup. Kiểm tra kết quả khớp nhau, chỉ mục được
+cập nhật khi chèn dữ liệu và một tiến trình khác thấy ngay giờ vừa ghi qua memory-map.
+
+    python benchmarks/bench_timeseries_index.py --rounds 20 --db-latency 0.002
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+import db_pool
+import timeseries_index
+from config import Config
+from db_pool import ConnectionPool
+from fakes import FakeCluster, FakeSession, FakeTables
+from function_calling import PollutionQueryHandler
+from result_cache import ResultCache
+
+DAY = {"year": 2004, "month": 5, "day": 20}
+YEAR = {"stat_type": "all", "start_day": 1, "start_month": 4, "end_day": 31, "end_month": 3, "year": 2004,
+        "end_year": 2005}
+
+
+def timed(function, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = function()
+    return (time.perf_counter() - start) / rounds, result
+
+
+def use_index(path):
+    Config.TS_INDEX_PATH = path
+    timeseries_index._index = None
+
+
+def write_hour(path, moment, values):
+    """Chạy trong tiến trình con: ghi một giờ vào chỉ mục dùng chung."""
+    timeseries_index.TimeSeriesIndex(path).update(np.array([np.datetime64(moment, "h")]), np.array([values]))
+
+
+def close(expected, actual):
+    if expected.keys() != actual.keys():
+        return False
+    return all(abs(actual[key] - value) <= 1e-9 * max(abs(value), 1.0) for key, value in expected.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="Data/processed_AQI_data.csv")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--db-latency", type=float, default=0.002, help="Độ trễ một request CQL (giây)")
+    args = parser.parse_args()
+
+    csv_path = os.path.join(os.path.dirname(ROOT), args.csv)
+    tables = FakeTables()
+    tables.load_frame(pd.read_csv(csv_path))
+    db_pool._pool = ConnectionPool(cluster_factory=lambda hosts: FakeCluster(
+        hosts, session_factory=lambda: FakeSession(latency=args.db_latency, responder=tables)))
+    processor = db_pool.get_processor()
+    processor.create_schema()
+
+    handler = PollutionQueryHandler("benchmark-key")
+    handler.result_cache = ResultCache(max_entries=0)
+    directory = tempfile.mkdtemp(prefix="ts_index_bench_")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for year, month in processor.partitions():
+                processor.rollups.refresh_month(year, month)
+
+            use_index("")
+            query_db, expected_rows = timed(lambda: handler.query_pollution_data_openai(**DAY), args.rounds)
+            handler.use_rollups = False
+            stats_scan, expected_stats = timed(lambda: handler.statistical_analysis(**YEAR), max(args.rounds // 10, 1))
+            handler.use_rollups = True
+            stats_rollup, _ = timed(lambda: handler.statistical_analysis(**YEAR), args.rounds)
+
+            index = timeseries_index.TimeSeriesIndex(directory)
+            start = time.perf_counter()
+            index.build_from_store(processor)
+            build_db = time.perf_counter() - start
+            start = time.perf_counter()
+            index.build_from_csv(csv_path)
+            build_csv = time.perf_counter() - start
+
+            use_index(directory)
+            query_index, rows = timed(lambda: handler.query_pollution_data_openai(**DAY), args.rounds)
+            stats_index, result = timed(lambda: handler.statistical_analysis(**YEAR), args.rounds)
+            point_seconds, _ = timed(lambda: timeseries_index.get_index().point(datetime(2004, 5, 20, 8)),
+                                     args.rounds * 100)
+
+        if rows != expected_rows:
+            raise SystemExit("❌ Truy vấn từ chỉ mục khác Cassandra")
+        for stat_type, values in expected_stats["result"].items():
+            if not close(values, result["result"][stat_type]):
+                raise SystemExit(f"❌ Thống kê {stat_type} từ chỉ mục khác quét dữ liệu gốc")
+
+        # Chèn qua tool: Cassandra và chỉ mục cùng có giờ mới.
+        with contextlib.redirect_stdout(io.StringIO()):
+            handler.insert_data_to_database(10, 3, 2004, 5, 1000.0, 5.0, 900.0, 800.0, 1500.0, 1)
+        hour = timeseries_index.get_index().point(datetime(2004, 3, 10, 5))
+        if hour is None or hour["pt08_s1_co"] != 1000.0:
+            raise SystemExit("❌ Chỉ mục chưa có giờ vừa chèn")
+        # Dữ liệu năm mới: chỉ mục được mở rộng sang phiên bản mới; năm đó nằm ngoài phần CSV phủ
+        # nên truy vấn đọc Cassandra.
+        with contextlib.redirect_stdout(io.StringIO()):
+            handler.insert_data_to_database(2, 1, 2006, 0, 1100.0, 6.0, 950.0, 820.0, 1400.0, 2)
+        with contextlib.redirect_stdout(io.StringIO()):
+            grown = handler.query_pollution_data_openai(2006, 1, 2)
+        if grown != [{"hour": 0, "aqi_label": 2.0, "day": 2, "month": 1, "year": 2006}]:
+            raise SystemExit(f"❌ Truy vấn năm mới sai: {grown}")
+        hour = timeseries_index.get_index().point(datetime(2006, 1, 2, 0))
+        if hour is None or hour["aqi_label"] != 2.0:
+            raise SystemExit("❌ Chỉ mục không mở rộng sang năm mới")
+
+        # Dòng chỉ có trong Cassandra (ghi khi tắt chỉ mục), ngoài phần CSV phủ: vẫn trả lời được.
+        use_index("")
+        with contextlib.redirect_stdout(io.StringIO()):
+            handler.insert_data_to_database(20, 6, 2005, 7, 1200.0, 4.0, 910.0, 830.0, 1450.0, 1)
+        use_index(directory)
+        with contextlib.redirect_stdout(io.StringIO()):
+            unseen = handler.query_pollution_data_openai(2005, 6, 20)
+            unseen_stats = handler.statistical_analysis("mean", 20, 6, 20, 6, 2005)
+        if unseen != [{"hour": 7, "aqi_label": 1.0, "day": 20, "month": 6, "year": 2005}]:
+            raise SystemExit(f"❌ Khoảng ngoài phần chỉ mục phủ không đọc Cassandra: {unseen}")
+        if unseen_stats["result"].get("PT08_S1_CO") != 1200.0:
+            raise SystemExit(f"❌ Thống kê ngoài phần chỉ mục phủ sai: {unseen_stats}")
+
+        # Tiến trình khác ghi vào file: memory-map đang mở ở đây thấy ngay.
+        child = multiprocessing.get_context("spawn").Process(
+            target=write_hour, args=(directory, "2004-03-10T04", [1.0, 2.0, 3.0, 4.0, 5.0, 3.0]))
+        child.start()
+        child.join()
+        shared = timeseries_index.get_index().point(datetime(2004, 3, 10, 4))
+        if shared is None or shared["aqi_label"] != 3.0:
+            raise SystemExit("❌ Không thấy giờ do tiến trình khác ghi")
+
+        stats = timeseries_index.stats()
+        print(f"Chỉ mục {stats['hours']} giờ ({stats['hours_with_data']} giờ có dữ liệu); "
+              f"dựng từ CSV {build_csv * 1000:.0f} ms, từ Cassandra {build_db * 1000:.0f} ms; "
+              f"độ trễ CQL giả lập {args.db_latency * 1000:.0f} ms")
+        print(f"Tra một giờ (point):               {point_seconds * 1e6:9.1f} µs")
+        print(f"Truy vấn 1 ngày:  Cassandra {query_db * 1000:8.2f} ms | chỉ mục {query_index * 1000:7.2f} ms "
+              f"(x{query_db / query_index:.0f})")
+        print(f"Thống kê 1 năm:   quét {stats_scan * 1000:8.1f} ms | rollup {stats_rollup * 1000:6.1f} ms | "
+              f"chỉ mục {stats_index * 1000:6.2f} ms (x{stats_scan / stats_index:.0f} so với quét)")
+        print("Chèn dữ liệu cập nhật chỉ mục (kể cả năm mới); tiến trình khác thấy ngay giờ vừa ghi; "
+              "khoảng ngoài phần chỉ mục phủ đọc Cassandra")
+    finally:
+        use_index("")
+        shutil.rmtree(directory, ignore_errors=True)
+        db_pool.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Đo số lần gọi Claude để chọn tool khi người dùng hỏi lặp lại: không cache so với
+ToolSelectionCache (cache + bộ luật tiếng Việt). Dùng client Anthropic giả, các
+tool chỉ ghi nhận tham số nên không cần Cassandra hay mô hình.
+
+    python benchmarks/bench_tool_cache.py --requests 500 --llm-latency 0.05
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+import prompt_rules
+from fakes import FakeAnthropic
+from function_calling import PollutionQueryHandler
+from tool_cache import ToolSelectionCache
+
+# Câu hỏi mẫu và tool/tham số mà Claude được kỳ vọng chọn.
+WORKLOAD = {
+    "Tôi muốn biết chất lượng không khí vào ngày 20 tháng 5 năm 2004":
+        ("query_pollution_data_openai", {"year": 2004, "month": 5, "day": 20}),
+    "chất lượng không khí ngày 10/3/2004":
+        ("query_pollution_data_openai", {"year": 2004, "month": 3, "day": 10}),
+    "Tính trung bình dữ liệu ô nhiễm từ 17 tháng 3 năm 2004 đến 17 tháng 4 năm 2004":
+        ("statistical_analysis", {"stat_type": "mean", "start_day": 17, "start_month": 3, "end_day": 17,
+                                  "end_month": 4, "year": 2004}),
+    "Thống kê trung bình từ ngày 1 đến 30 tháng 5 năm 2004":
+        ("statistical_analysis", {"stat_type": "mean", "start_day": 1, "start_month": 5, "end_day": 30,
+                                  "end_month": 5, "year": 2004}),
+    "Dự đoán mức độ ô nhiễm vào ngày 15 tháng 3 năm 2025 lúc 10 giờ với PT08_S1_CO 120.5, C6H6_GT 5.3, "
+    "PT08_S5_O3 45.2, PT08_S2_NMHC 220.7, PT08_S4_NO2 34.1":
+        ("predict_pollution_level", {"Day": 15, "Month": 3, "Year": 2025, "Hour": 10, "PT08_S1_CO": 120.5,
+                                     "C6H6_GT": 5.3, "PT08_S5_O3": 45.2, "PT08_S2_NMHC": 220.7,
+                                     "PT08_S4_NO2": 34.1}),
+    # Không khớp bộ luật: lần đầu phải hỏi Claude, các lần sau lấy từ cache.
+    "Hôm 20 tháng 5 năm 2004 không khí ra sao?":
+        ("query_pollution_data_openai", {"year": 2004, "month": 5, "day": 20}),
+    "Mùa xuân năm 2004 ô nhiễm thế nào?":
+        ("statistical_analysis", {"stat_type": "mean", "start_day": 1, "start_month": 3, "end_day": 31,
+                                  "end_month": 5, "year": 2004}),
+}
+
+
+def expected_call(prompt):
+    key = prompt_rules.normalize(prompt)
+    return next(call for text, call in WORKLOAD.items() if prompt_rules.normalize(text) == key)
+
+
+def build_handler(llm_latency, cache):
+    handler = PollutionQueryHandler("benchmark-key")
+    handler.client = FakeAnthropic(llm_latency, tool_call=expected_call)
+    handler.tool_cache = cache
+    calls = []
+    for name in handler.function_map:
+        setattr(handler, name, lambda _name=name, **arguments: calls.append((_name, arguments)) or {"ok": True})
+    return handler, calls
+
+
+def run(handler, prompts):
+    start = time.perf_counter()
+    for prompt in prompts:
+        handler.call_claude_function(prompt)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Độ trễ một lần gọi Claude (giây)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # Thêm khoảng trắng/chữ hoa ngẫu nhiên: khóa đã chuẩn hóa vẫn phải trùng.
+    prompts = [rng.choice([str.lower, str.upper, str.strip])(prompt) + rng.choice(["", " ", "?"])
+               for prompt in rng.choices(list(WORKLOAD), k=args.requests)]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        plain, plain_calls = build_handler(args.llm_latency, ToolSelectionCache(max_entries=0, rules=None))
+        plain_seconds = run(plain, prompts)
+        cached, cached_calls = build_handler(args.llm_latency, ToolSelectionCache())
+        cached_seconds = run(cached, prompts)
+
+    if plain_calls != cached_calls:
+        mismatches = sum(a != b for a, b in zip(plain_calls, cached_calls))
+        raise SystemExit(f"❌ {mismatches} lần chọn tool khác với Claude")
+    print(f"Không cache:  {plain.client.calls} lần gọi Claude, {plain_seconds:.2f}s")
+    print(f"Có cache:     {cached.client.calls} lần gọi Claude, {cached_seconds:.2f}s "
+          f"(x{plain_seconds / cached_seconds:.1f})")
+    print("Thống kê cache:", cached.tool_cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Kiểm tra ghi idempotent với khóa dòng xác định và đo Bloom filter các giờ đã có dữ liệu.
+
+1. Nạp Data/processed_AQI_data.csv hai lần vào Cassandra giả (bảng trong bộ nhớ) và
+   vào ColumnarStore: số dòng phải không đổi sau lần nạp thứ hai (upsert, không trùng).
+   Bảng có sẵn dòng id ngẫu nhiên (uuid4, nạp trước khi có khóa xác định) được chuyển
+   khóa bằng ``migrate_time_buckets.rekey`` rồi nạp lại: số dòng cũng không đổi.
+2. Gọi tool thêm dữ liệu (``add_pollution_data_from_nlp``) cho các giờ mới và các giờ
+   đã có, đếm số câu đọc kiểm tra tồn tại và thời gian mỗi lần gọi khi tắt filter (luôn
+   đọc trước khi ghi) và khi bật filter.
+3. Tỉ lệ sai dương thực tế của filter so với ``EXISTS_FILTER_ERROR_RATE`` và thời gian
+   dựng filter.
+
+    python benchmarks/bench_upsert.py --db-latency 0.002 --calls 200
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+
+import db_pool
+import migrate_time_buckets
+import timestamp_filter
+from columnar_store import ColumnarStore
+from config import Config
+from db_pool import ConnectionPool
+from fakes import FakeCluster, FakeSession, FakeTables
+
+CHECK = "select id from pollution_data_by_month where year = ? and month = ? and day = ? and hour = ? limit 1"
+MEASURES = {"PT08_S1_CO": 1360.0, "C6H6_GT": 11.9, "PT08_S5_O3": 1268.0, "PT08_S2_NMHC": 1046.0,
+            "PT08_S4_NO2": 1692.0, "AQI_Label": 3.0}
+
+
+class CountingTables(FakeTables):
+    """FakeTables đếm số câu đọc kiểm tra một giờ đã có dữ liệu chưa."""
+
+    def __init__(self):
+        super().__init__()
+        self.checks = 0
+
+    def __call__(self, query, values):
+        if " ".join(query.split()).lower() == CHECK:
+            self.checks += 1
+        return super().__call__(query, values)
+
+
+def cassandra(db_latency):
+    tables = CountingTables()
+    db_pool._pool = ConnectionPool(cluster_factory=lambda hosts: FakeCluster(
+        hosts, session_factory=lambda: FakeSession(latency=db_latency, responder=tables)))
+    processor = db_pool.get_processor()
+    processor.create_schema()
+    return processor, tables
+
+
+def check_idempotent(frame, db_latency):
+    processor, tables = cassandra(db_latency)
+    counts = []
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(2):
+                processor.insert_data(frame)
+                counts.append(len(tables))
+    finally:
+        db_pool.shutdown_pool()
+    directory = tempfile.mkdtemp(prefix="upsert_bench_")
+    try:
+        store = ColumnarStore(directory)
+        for _ in range(2):
+            store.insert_data(frame)
+            counts.append(store.health()["rows"])
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print(f"Nạp {len(frame)} dòng hai lần: Cassandra {counts[0]} → {counts[1]} dòng, "
+          f"kho cột {counts[2]} → {counts[3]} dòng")
+    if counts != [len(frame)] * 4:
+        raise SystemExit("❌ Nạp lại cùng dữ liệu sinh bản ghi trùng")
+
+    processor, tables = cassandra(db_latency)
+    try:
+        tables.load_frame(frame.assign(id=[uuid.uuid4() for _ in range(len(frame))]))
+        with contextlib.redirect_stdout(io.StringIO()):
+            rewritten, deleted = migrate_time_buckets.rekey(processor)
+            processor.insert_data(frame)
+        moment = frame.iloc[0]
+        status = processor.add_pollution_data_from_nlp(**MEASURES, Year=moment["Year"], Month=moment["Month"],
+                                                       Day=moment["Day"], Hour=moment["Hour"])
+    finally:
+        db_pool.shutdown_pool()
+    print(f"Bảng id ngẫu nhiên cũ: chuyển khóa {rewritten} dòng, xóa {deleted} dòng cũ; "
+          f"nạp lại CSV → {len(tables)} dòng; thêm giờ đã có → {status}")
+    if len(tables) != len(frame) or deleted != len(frame) or status != "exists":
+        raise SystemExit("❌ Chuyển khóa dòng id ngẫu nhiên không loại được bản ghi trùng")
+
+
+def insert_calls(frame, hours, db_latency, use_filter):
+    """(thời gian TB mỗi lần gọi, số câu đọc kiểm tra, số lần trả "exists") cho các giờ ``hours``."""
+    processor, tables = cassandra(db_latency)
+    tables.load_frame(frame)
+    Config.EXISTS_FILTER = use_filter
+    timestamp_filter.reset()
+    try:
+        if use_filter:
+            timestamp_filter.get_filter(processor)
+        tables.checks = 0
+        exists = 0
+        start = time.perf_counter()
+        for year, month, day, hour in hours:
+            moment = {"Year": year, "Month": month, "Day": day, "Hour": hour}
+            exists += processor.add_pollution_data_from_nlp(**MEASURES, **moment) == "exists"
+        elapsed = time.perf_counter() - start
+        return elapsed / len(hours), tables.checks, exists
+    finally:
+        db_pool.shutdown_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--csv", default="Data/processed_AQI_data.csv")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="Độ trễ một câu CQL (giây)")
+    parser.add_argument("--calls", type=int, default=200, help="Số lần gọi tool mỗi loại (giờ mới / giờ đã có)")
+    parser.add_argument("--probes", type=int, default=200000, help="Số giờ không có dữ liệu để đo sai dương")
+    args = parser.parse_args()
+    os.chdir(os.path.dirname(ROOT))
+    logging.getLogger("aqm").setLevel("WARNING")  # bỏ log từng lần ghi
+
+    frame = pd.read_csv(args.csv)
+    check_idempotent(frame, args.db_latency)
+
+    # Giờ đã có: lấy đều trong dữ liệu; giờ mới: cùng ngày giờ nhưng năm 2010.
+    sample = frame.iloc[np.linspace(0, len(frame) - 1, args.calls).astype(int)]
+    existing = [tuple(map(int, row)) for row in sample[["Year", "Month", "Day", "Hour"]].itertuples(index=False)]
+    new = [(2010, month, day, hour) for _, month, day, hour in existing]
+    print(f"Tool thêm dữ liệu, {args.calls} giờ mới + {args.calls} giờ đã có, CQL giả lập "
+          f"{args.db_latency * 1000:.0f} ms (thời gian gồm cả cập nhật rollup sau khi ghi):")
+    print(f"{'':<26}{'giờ mới':>22}{'giờ đã có':>24}")
+    for name, options in [("tắt filter (đọc trước)", {"use_filter": False}),
+                          ("upsert + Bloom filter", {"use_filter": True})]:
+        with contextlib.redirect_stdout(io.StringIO()):
+            new_seconds, new_checks, new_exists = insert_calls(frame, new, args.db_latency, **options)
+            old_seconds, old_checks, old_exists = insert_calls(frame, existing, args.db_latency, **options)
+        print(f"{name:<26}{new_seconds * 1000:8.2f} ms, {new_checks:4d} đọc"
+              f"{old_seconds * 1000:10.2f} ms, {old_checks:4d} đọc, {old_exists:4d} exists")
+        if new_exists or old_exists != args.calls:
+            raise SystemExit(f"❌ {name}: {new_exists} giờ mới bị báo đã tồn tại, {old_exists}/{args.calls} giờ đã có")
+        if options["use_filter"] and new_checks > args.calls * 0.05:
+            raise SystemExit(f"❌ {name}: filter không bỏ được câu đọc hoặc báo sai giờ đã có")
+
+    # Sai dương: dựng filter với toàn bộ dữ liệu rồi hỏi các giờ sau giờ cuối cùng có dữ liệu.
+    keys = timestamp_filter.hour_keys(*frame[["Year", "Month", "Day", "Hour"]].to_numpy().T)
+    probes = keys.max() + 1 + np.arange(args.probes)
+    for capacity in (len(frame), Config.EXISTS_FILTER_CAPACITY):
+        bloom = timestamp_filter.BloomFilter(capacity, Config.EXISTS_FILTER_ERROR_RATE)
+        start = time.perf_counter()
+        bloom.add_many(keys)
+        build_ms = (time.perf_counter() - start) * 1000
+        rate = float(bloom.contains_many(probes).mean())
+        print(f"Filter {capacity:>9} giờ ({bloom.bits / 8 / 1024:8.1f} KiB, {bloom.hashes} hàm băm): thêm "
+              f"{len(frame)} giờ {build_ms:.1f} ms; sai dương {rate:.4%} "
+              f"(ước lượng {bloom.stats()['estimated_error_rate']:.4%})")
+        if capacity == len(frame) and rate > Config.EXISTS_FILTER_ERROR_RATE * 2:
+            raise SystemExit("❌ Tỉ lệ sai dương cao hơn nhiều so với cấu hình")
+
+
+if __name__ == "__main__":
+    main()
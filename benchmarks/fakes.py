@@ -0,0 +1,456 @@
+"""
+Các đối tượng giả lập Cassandra và Anthropic dùng cho benchmark và chạy thử không
+cần cluster hay API key thật.
+"""
+
+import asyncio
+import random
+import re
+import threading
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from cassandra.query import BatchStatement
+
+
+class FakePreparedStatement:
+    def __init__(self, query_string):
+        self.query_string = query_string
+
+    def bind(self, values):
+        return FakeBoundStatement(self, values)
+
+
+# BatchStatement chỉ giữ lại query_string của statement con, nên statement giả
+# nhúng một mã số vào query_string để session giả tìm lại tham số.
+_BOUND = {}
+_BOUND_LOCK = threading.Lock()
+_BOUND_IDS = iter(range(1, 1 << 62))
+
+
+class FakeBoundStatement:
+    routing_key = None
+    keyspace = None
+    custom_payload = None
+
+    def __init__(self, prepared, values):
+        self.prepared_statement = prepared
+        self.values = tuple(values)
+        with _BOUND_LOCK:
+            self.token = next(_BOUND_IDS)
+            _BOUND[self.token] = self
+        self.query_string = f"{prepared.query_string} /*{self.token}*/"
+
+    @staticmethod
+    def lookup(query_string):
+        token = int(query_string.rsplit("/*", 1)[1][:-2])
+        with _BOUND_LOCK:
+            return _BOUND.pop(token)
+
+
+class FakeResponseFuture:
+    """Mô phỏng ``ResponseFuture``: callback được gọi từ một luồng khác."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._result = None
+        self._error = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def _set(self, result=None, error=None):
+        with self._lock:
+            self._result, self._error = result, error
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback, errback in callbacks:
+            errback(error) if error is not None else callback(result)
+
+    def add_callbacks(self, callback, errback):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append((callback, errback))
+                return
+        errback(self._error) if self._error is not None else callback(self._result)
+
+    def result(self):
+        self._event.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class FakeSession:
+    """Session giả: ghi nhận số dòng đã ghi, có độ trễ và tỉ lệ lỗi cấu hình được.
+
+    ``responder(query, values)`` (nếu có) trả về các dòng cho câu SELECT; trả về
+    None để câu lệnh được xử lý như một lệnh ghi.
+    """
+
+    def __init__(self, latency=0.001, failure_rate=0.0, workers=256, seed=0, responder=None):
+        self.latency = latency
+        self.responder = responder
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.prepare_calls = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rows = []
+
+    def prepare(self, query):
+        self.prepare_calls += 1
+        return FakePreparedStatement(query)
+
+    def _calls(self, statement, parameters=None):
+        """Các cặp (câu lệnh, tham số) trong một request (nhiều cặp nếu là batch)."""
+        if isinstance(statement, BatchStatement):
+            bound = [FakeBoundStatement.lookup(query) for _, query, _ in statement._statements_and_parameters]
+            return [(child.prepared_statement.query_string, child.values) for child in bound]
+        if isinstance(statement, FakeBoundStatement):
+            with _BOUND_LOCK:
+                _BOUND.pop(statement.token, None)
+            return [(statement.prepared_statement.query_string, statement.values)]
+        return [(getattr(statement, "query_string", statement), tuple(parameters or ()))]
+
+    def _run(self, statement, parameters=None):
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            fail = self.random.random() < self.failure_rate
+        try:
+            calls = self._calls(statement, parameters)
+            if self.latency:
+                time.sleep(self.latency)
+            if fail:
+                raise RuntimeError("fake write timeout")
+            if self.responder is not None:
+                results = [self.responder(query, values) for query, values in calls]
+                if results and results[0] is not None:
+                    return results[0] if len(results) == 1 else []
+            with self.lock:
+                self.rows.extend(values for _, values in calls)
+            return []
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def execute(self, statement, parameters=None, **kwargs):
+        return self._run(statement, parameters)
+
+    def execute_async(self, statement, parameters=None, **kwargs):
+        future = FakeResponseFuture()
+
+        def work():
+            try:
+                future._set(result=self._run(statement, parameters))
+            except Exception as e:
+                future._set(error=e)
+
+        self.executor.submit(work)
+        return future
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class FakeResultSet(list):
+    def one(self):
+        return self[0] if self else None
+
+
+class _Checks(list):
+    def __init__(self):
+        super().__init__()
+        self.equal = {}
+
+
+class FakeTables:
+    """Keyspace giả trong bộ nhớ, dùng làm ``responder`` của FakeSession.
+
+    Hiểu các câu CREATE TABLE/SELECT/INSERT/UPDATE mà cassandra_CRUD và rollups sinh
+    ra: điều kiện ``=``, ``>=``, ``<=`` trên từng cột, lát cắt kiểu
+    ``(day, hour) >= (?, ?)`` và ``SELECT DISTINCT`` trên khóa phân vùng. Bảng ``pollution_data_by_month`` có sẵn; các bảng khác
+    được tạo từ câu CREATE TABLE (khóa chính lấy từ ``PRIMARY KEY``).
+    """
+
+    POLLUTION_TABLE = "pollution_data_by_month"
+    COLUMNS = ["year", "month", "day", "hour", "id", "pt08_s1_co", "c6h6_gt", "pt08_s5_o3", "pt08_s2_nmhc",
+               "pt08_s4_no2", "aqi_label"]
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.keys = {self.POLLUTION_TABLE: (("year", "month"), ("day", "hour", "id"))}
+        self.tables = defaultdict(lambda: defaultdict(dict))
+        self._row_types = {}
+
+    def load_frame(self, df):
+        """Nạp DataFrame dạng Data/processed_AQI_data.csv (kèm cột id nếu có)."""
+        from storage import row_ids
+
+        ids = row_ids(df)
+        for row_id, values in zip(ids, df[["Year", "Month", "Day", "Hour", "PT08.S1(CO)", "C6H6(GT)", "PT08.S5(O3)",
+                                          "PT08.S2(NMHC)", "PT08.S4(NO2)", "AQI_Label"]].itertuples(index=False)):
+            year, month, day, hour, *measures = values
+            self._upsert(self.POLLUTION_TABLE, {
+                "year": int(year), "month": int(month), "day": int(day), "hour": int(hour), "id": row_id,
+                **dict(zip(self.COLUMNS[5:], map(float, measures)))})
+
+    def __len__(self):
+        return self.count(self.POLLUTION_TABLE)
+
+    def count(self, table):
+        return sum(len(rows) for rows in self.tables[table].values())
+
+    def _upsert(self, table, row):
+        partition_key, clustering = self.keys[table]
+        with self.lock:
+            key = tuple(row[column] for column in clustering)
+            partition = self.tables[table][tuple(row[column] for column in partition_key)]
+            partition[key] = {**partition.get(key, {}), **row}
+
+    def _create(self, q):
+        match = re.search(r"create table (?:if not exists )?(\w+) \(.*primary key \(\((.+?)\)(?:, (.+?))?\)", q)
+        names = lambda text: tuple(name.strip() for name in text.split(",")) if text else ()
+        with self.lock:
+            self.keys.setdefault(match[1], (names(match[2]), names(match[3])))
+
+    @staticmethod
+    def _where(clause, params):
+        """Danh sách hàm lọc từ mệnh đề WHERE (thuộc tính ``equal``: các cột so sánh bằng)."""
+        compare = {"=": lambda a, b: a == b, ">=": lambda a, b: a >= b, "<=": lambda a, b: a <= b}
+        checks = _Checks()
+        for condition in re.split(r"\s+and\s+", clause.strip()):
+            tuple_match = re.fullmatch(r"\(([\w, ]+)\) (>=|<=|=) \(([?, ]+)\)", condition)
+            if tuple_match:
+                names = [name.strip() for name in tuple_match[1].split(",")]
+                bound, params = tuple(params[:len(names)]), params[len(names):]
+                checks.append(lambda row, n=names, b=bound, op=compare[tuple_match[2]]:
+                              op(tuple(row[name] for name in n), b))
+                continue
+            name, op = re.fullmatch(r"(\w+) (>=|<=|=) \?", condition).groups()
+            value, params = params[0], params[1:]
+            checks.append(lambda row, n=name, v=value, op=compare[op]: op(row[n], v))
+            if op == "=":
+                checks.equal[name] = value
+        return checks
+
+    def _row_type(self, columns):
+        if columns not in self._row_types:
+            self._row_types[columns] = namedtuple("Row", columns)
+        return self._row_types[columns]
+
+    def _matching(self, table, checks):
+        with self.lock:
+            return self._matching_unlocked(table, checks)
+
+    def _matching_unlocked(self, table, checks):
+        partition_key = self.keys[table][0]
+        equal = getattr(checks, "equal", {})
+        partitions = self.tables[table]
+        if all(column in equal for column in partition_key):
+            # Đủ khóa phân vùng: chỉ đọc một phân vùng như Cassandra.
+            keys = [tuple(equal[column] for column in partition_key)]
+            keys = [key for key in keys if key in partitions]
+        else:
+            keys = sorted(partitions)
+        return [row for key in keys for _, row in sorted(partitions[key].items())
+                if all(check(row) for check in checks)]
+
+    def __call__(self, query, values):
+        q = " ".join(query.split()).lower()
+        params = list(values)
+        if q.startswith("create table"):
+            self._create(q)
+            return FakeResultSet()
+        if q.startswith("select"):
+            match = re.match(r"select (.+?) from (\w+)(?: where (.+?))?(?: limit (\d+))?$", q)
+            if match is None or "allow filtering" in q or match[2] not in self.keys:
+                return FakeResultSet()
+            if match[1].startswith("distinct "):
+                # SELECT DISTINCT trên khóa phân vùng: mỗi phân vùng một dòng.
+                columns = tuple(column.strip() for column in match[1][len("distinct "):].split(","))
+                with self.lock:
+                    keys = sorted(key for key, rows in self.tables[match[2]].items() if rows)
+                return FakeResultSet(self._row_type(columns)(*key) for key in keys)
+            columns = tuple(column.strip() for column in match[1].split(","))
+            rows = self._matching(match[2], self._where(match[3], params) if match[3] else [])
+            if match[4]:
+                rows = rows[:int(match[4])]
+            row_type = self._row_type(columns)
+            # Cột chưa từng ghi trả về None như Cassandra.
+            return FakeResultSet(row_type(*(row.get(column) for column in columns)) for row in rows)
+        if q.startswith("insert"):
+            table = re.match(r"insert into (\w+)", q)[1]
+            columns = [column.strip() for column in q[q.index("(") + 1:q.index(")")].split(",")]
+            self._upsert(table, dict(zip(columns, params)))
+            return FakeResultSet()
+        if q.startswith("delete"):
+            match = re.match(r"delete from (\w+) where (.+)$", q)
+            partition_key, clustering = self.keys[match[1]]
+            with self.lock:
+                for row in self._matching_unlocked(match[1], self._where(match[2], params)):
+                    partition = self.tables[match[1]][tuple(row[column] for column in partition_key)]
+                    partition.pop(tuple(row[column] for column in clustering), None)
+            return FakeResultSet()
+        if q.startswith("update"):
+            match = re.match(r"update (\w+) set (\w+) = \? where (.+)$", q)
+            rows = self._matching(match[1], self._where(match[3], params[1:]))
+            with self.lock:
+                for row in rows:
+                    row[match[2]] = params[0]
+            return FakeResultSet()
+        return None
+
+
+class FakeHost:
+    def __init__(self, address):
+        self.address = address
+        self.is_up = True
+
+
+class FakeMetadata:
+    def __init__(self, hosts):
+        self.hosts = [FakeHost(address) for address in hosts]
+
+    def all_hosts(self):
+        return self.hosts
+
+
+class FakeCluster:
+    """Cluster giả: đếm số lần kết nối, mô phỏng thời gian bắt tay/khám phá node."""
+
+    instances = 0
+    connects = 0
+
+    def __init__(self, contact_points=None, connect_latency=0.0, session_factory=FakeSession):
+        FakeCluster.instances += 1
+        self.contact_points = contact_points or ["127.0.0.1"]
+        self.connect_latency = connect_latency
+        self.session_factory = session_factory
+        self.metadata = FakeMetadata(self.contact_points)
+        self.sessions = []
+        self.is_shutdown = False
+
+    def connect(self, keyspace=None):
+        FakeCluster.connects += 1
+        if self.connect_latency:
+            time.sleep(self.connect_latency)
+        session = self.session_factory()
+        self.sessions.append(session)
+        return session
+
+    def shutdown(self):
+        self.is_shutdown = True
+        for session in self.sessions:
+            session.shutdown()
+
+
+def _tool_response(name, arguments):
+    return SimpleNamespace(content=[SimpleNamespace(type="tool_use", name=name, input=arguments)])
+
+
+def _text_response(text):
+    return SimpleNamespace(content=[SimpleNamespace(type="text", text=text)])
+
+
+def _tokens(response):
+    """Chia khối text của phản hồi thành các đoạn nhỏ (mỗi từ kèm khoảng trắng) như text_stream."""
+    return re.findall(r"\S+\s*|\s+", "".join(block.text for block in response.content if block.type == "text"))
+
+
+class _FakeStream:
+    """Giống ``MessageStream`` của anthropic: dùng trong ``with``, đọc ``text_stream``."""
+
+    def __init__(self, client, kwargs):
+        self.client = client
+        self.kwargs = kwargs
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def text_stream(self):
+        time.sleep(self.client.latency)
+        for token in _tokens(self.client.respond(self.kwargs)):
+            yield token
+            time.sleep(self.client.token_latency)
+
+
+class _FakeAsyncStream(_FakeStream):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @property
+    async def text_stream(self):
+        await asyncio.sleep(self.client.latency)
+        for token in _tokens(self.client.respond(self.kwargs)):
+            yield token
+            await asyncio.sleep(self.client.token_latency)
+
+
+class _FakeMessages:
+    stream_class = _FakeStream
+
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, **kwargs):
+        response = self.client.respond(kwargs)
+        time.sleep(self.client.latency + self.client.token_latency * len(_tokens(response)))
+        return response
+
+    def stream(self, **kwargs):
+        return self.stream_class(self.client, kwargs)
+
+
+class _FakeAsyncMessages(_FakeMessages):
+    stream_class = _FakeAsyncStream
+
+    async def create(self, **kwargs):
+        response = self.client.respond(kwargs)
+        await asyncio.sleep(self.client.latency + self.client.token_latency * len(_tokens(response)))
+        return response
+
+
+class FakeAnthropic:
+    """Client Anthropic giả: trả về khối ``tool_use`` khi request có ``tools``
+    (tool do ``tool_call(prompt)`` chọn), ngược lại trả về một khối text.
+    ``messages.stream`` trả khối text đó từng từ: từ đầu tiên sau ``latency``,
+    mỗi từ tiếp theo sau ``token_latency``; ``messages.create`` chờ đủ cả câu."""
+
+    messages_class = _FakeMessages
+
+    def __init__(self, latency=0.05, tool_call=None, token_latency=0.0, answer=None):
+        self.latency = latency
+        self.tool_call = tool_call
+        self.token_latency = token_latency
+        self.answer = answer
+        self.messages = self.messages_class(self)
+        self.calls = 0
+
+    def respond(self, kwargs):
+        self.calls += 1
+        prompt = kwargs["messages"][-1]["content"]
+        if kwargs.get("tools") and self.tool_call is not None:
+            return _tool_response(*self.tool_call(prompt))
+        if self.answer is not None:
+            return _text_response(self.answer(prompt))
+        return _text_response(f"[fake] {prompt.strip()[:80]}")
+
+
+class FakeAsyncAnthropic(FakeAnthropic):
+    """Như ``FakeAnthropic`` nhưng ``messages.create`` là coroutine (giống ``AsyncAnthropic``)."""
+
+    messages_class = _FakeAsyncMessages
@@ -0,0 +1,82 @@
+"""
+Load test cho /api/predict: đo throughput và độ trễ ở nhiều mức đồng thời.
+
+Mặc định chạy in-process qua ASGI; truyền --url để bắn vào server đang chạy.
+
+    python benchmarks/load_test_predict.py --concurrency 1 8 32 128 --requests 512
+    python benchmarks/load_test_predict.py --url http://127.0.0.1:7860 --concurrency 16 64
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark-key")
+
+PAYLOAD = {
+    "day": 10, "month": 3, "year": 2004, "hour": 18,
+    "pt08_s1_co": 1360, "c6h6_gt": 11.9, "pt08_s5_o3": 1268, "pt08_s2_nmhc": 1046, "pt08_s4_no2": 1692,
+}
+
+
+async def run_level(client, concurrency, requests):
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await client.post("/api/predict", json=PAYLOAD)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    p50, p99 = np.percentile(latencies, [50, 99])
+    return requests / elapsed, p50, p99
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--requests", type=int, default=512, help="Số request cho mỗi mức đồng thời")
+    parser.add_argument("--max-batch-size", type=int, default=None, help="Ghi đè cấu hình batcher (in-process)")
+    parser.add_argument("--max-wait-ms", type=float, default=None, help="Ghi đè cấu hình batcher (in-process)")
+    args = parser.parse_args()
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        import inference_engine
+        import web_app
+
+        if args.max_batch_size is not None:
+            web_app.predict_batcher.max_batch_size = args.max_batch_size
+        if args.max_wait_ms is not None:
+            web_app.predict_batcher.max_wait = args.max_wait_ms / 1000
+        inference_engine.get_engine().load()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=web_app.app), base_url="http://test",
+                                   timeout=60)
+
+    async with client:
+        await run_level(client, 1, 5)
+        print(f"{'đồng thời':>10} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+        for concurrency in args.concurrency:
+            throughput, p50, p99 = await run_level(client, concurrency, args.requests)
+            print(f"{concurrency:>10} {throughput:>10.1f} {p50:>10.2f} {p99:>10.2f}")
+        if not args.url:
+            print("Batcher:", web_app.predict_batcher.stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
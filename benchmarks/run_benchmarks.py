@@ -0,0 +1,401 @@
+"""
+Bộ benchmark đầu-cuối chạy offline: Claude và Cassandra đều là bản giả lập trong tiến
+trình (``fakes.FakeAsyncAnthropic``, ``FakeSession`` + ``FakeTables``), dữ liệu là bản
+nhân ``--scale`` lần của các file CSV đi kèm (mỗi bản lùi 2 năm).
+
+Các phép đo:
+
+- ``aqi_process*``: ``AQIProcessor.process`` / ``process_streaming`` trên AirQuality1.csv đã nhân bản;
+- ``cassandra_insert``, ``cassandra_query``, ``cassandra_stats_scan``: ``PollutionDataProcessor``;
+- ``handler_predict``, ``handler_stats_rollups``, ``handler_stats_scan``: ``PollutionQueryHandler``;
+- ``http_<endpoint>_c<N>``: các endpoint FastAPI với N client đồng thời (httpx trong tiến trình).
+
+Kết quả ghi ra JSON (mặc định ``benchmarks/results/<commit>.json``). Với ``--compare`` hai
+lần chạy được so sánh theo từng chỉ số: ``*_ms``, ``*_seconds``, ``*_requests``, ``errors``
+càng nhỏ càng tốt, ``*_per_s`` càng lớn càng tốt; chỉ số tệ đi quá ``--threshold`` làm
+lệnh thoát với mã lỗi.
+
+    python benchmarks/run_benchmarks.py --scale 4
+    python benchmarks/run_benchmarks.py --scale 4 --compare benchmarks/results/base.json   # chạy rồi so với base
+    python benchmarks/run_benchmarks.py --compare base.json new.json --threshold 0.25       # chỉ so sánh
+    python benchmarks/run_benchmarks.py --only cassandra handler                            # lọc theo tiền tố
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+os.chdir(os.path.dirname(ROOT))
+os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark-key")
+os.environ.setdefault("PREWARM", "false")
+
+import httpx
+import numpy as np
+import pandas as pd
+
+import db_pool
+import inference_engine
+import web_app
+from db_pool import ConnectionPool
+from fakes import FakeAnthropic, FakeAsyncAnthropic, FakeCluster, FakeSession, FakeTables
+from function_calling import PollutionQueryHandler
+from process_data_training import AQIProcessor
+from result_cache import ResultCache
+from tool_cache import ToolSelectionCache
+
+RESULTS_DIR = os.path.join(ROOT, "results")
+FEATURES = ["Day", "Month", "Year", "Hour", "PT08.S1(CO)", "C6H6(GT)", "PT08.S5(O3)", "PT08.S2(NMHC)", "PT08.S4(NO2)"]
+# Hướng tốt của chỉ số theo hậu tố tên: -1 càng nhỏ càng tốt, +1 càng lớn càng tốt.
+DIRECTIONS = [("_per_s", 1), ("_ms", -1), ("_seconds", -1), ("_requests", -1), ("errors", -1)]
+
+
+def direction(metric):
+    return next((sign for suffix, sign in DIRECTIONS if metric.endswith(suffix)), 0)
+
+
+def latency(samples):
+    """p50/p95/trung bình (ms) của danh sách thời gian (giây)."""
+    ms = np.asarray(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 3), "p95_ms": round(float(np.percentile(ms, 95)), 3),
+            "mean_ms": round(float(ms.mean()), 3)}
+
+
+def timed_calls(function, calls):
+    samples = []
+    for arguments in calls:
+        start = time.perf_counter()
+        function(**arguments)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def scaled_raw_csv(path, scale, directory):
+    """AirQuality1.csv nhân ``scale`` lần (mỗi bản lùi 2 năm) ghi vào ``directory``; trả về (đường dẫn, số dòng)."""
+    with open(path, encoding="utf-8-sig") as f:
+        header, *lines = f.read().splitlines()
+    lines = [line for line in lines if re.match(r"\d\d/\d\d/\d{4};", line)]
+    target = os.path.join(directory, f"AirQuality_x{scale}.csv")
+    with open(target, "w", encoding="utf-8") as f:
+        f.write(header + "\n")
+        for copy in range(scale):
+            for line in lines:
+                f.write(f"{line[:6]}{int(line[6:10]) + 2 * copy}{line[10:]}\n")
+    return target, len(lines) * scale
+
+
+def scaled_frame(path, scale):
+    """processed_AQI_data.csv nhân ``scale`` lần, mỗi bản lùi 2 năm (dữ liệu gốc 3/2004 - 4/2005)."""
+    frame = pd.read_csv(path)
+    return pd.concat([frame.assign(Year=frame["Year"] + 2 * copy) for copy in range(scale)], ignore_index=True)
+
+
+class Suite:
+    """Dữ liệu và Cassandra giả dùng chung giữa các phép đo; kho được nạp ở lần dùng đầu."""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = np.random.default_rng(args.seed)
+        self.frame = scaled_frame(args.processed, args.scale)
+        self.tables = None
+        self.processor = None
+        self.insert_result = None
+
+    def sample(self, count):
+        return self.frame.iloc[self.rng.integers(0, len(self.frame), count)]
+
+    def months(self, count):
+        months = self.frame[["Year", "Month"]].drop_duplicates().to_numpy()
+        return [tuple(map(int, months[i])) for i in self.rng.integers(0, len(months), count)]
+
+    def store(self):
+        if self.processor is None:
+            self.tables = FakeTables()
+            db_pool._pool = ConnectionPool(cluster_factory=lambda hosts: FakeCluster(
+                hosts, session_factory=lambda: FakeSession(latency=self.args.db_latency, responder=self.tables)))
+            self.processor = db_pool.get_processor()
+            self.processor.create_schema()
+            requests = self.processor.session.requests
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.processor.insert_data(self.frame)
+            seconds = time.perf_counter() - start
+            if len(self.tables) != len(self.frame):
+                raise SystemExit(f"❌ Ghi {len(self.frame)} dòng nhưng bảng có {len(self.tables)}")
+            self.insert_result = {"rows": len(self.frame), "seconds": round(seconds, 4),
+                                  "rows_per_s": round(len(self.frame) / seconds, 1),
+                                  "cql_requests": self.processor.session.requests - requests}
+        return self.processor
+
+    def handler(self, use_rollups=True):
+        """PollutionQueryHandler không cache, mọi câu hỏi đều qua Claude giả và kho lưu trữ."""
+        self.store()
+        handler = PollutionQueryHandler("benchmark-key")
+        handler.tool_cache = ToolSelectionCache(max_entries=0, rules=None)
+        handler.result_cache = ResultCache(max_entries=0)
+        handler.use_rollups = use_rollups
+        handler.client = FakeAnthropic(self.args.llm_latency, tool_call=tool_for)
+        handler.async_client = FakeAsyncAnthropic(self.args.llm_latency, tool_call=tool_for)
+        return handler
+
+    def close(self):
+        db_pool.shutdown_pool()
+
+
+def tool_for(prompt):
+    """Tool mà Claude giả chọn: câu hỏi có dạng "ngày d/m/y"."""
+    day, month, year = map(int, re.search(r"(\d+)/(\d+)/(\d+)", prompt).groups())
+    return "query_pollution_data_openai", {"year": year, "month": month, "day": day}
+
+
+def stats_calls(suite, count):
+    return [{"stat_type": "all", "start_day": 1, "start_month": month, "end_day": 28, "end_month": month,
+             "year": year} for year, month in suite.months(count)]
+
+
+def bench_aqi_process(suite):
+    directory = tempfile.mkdtemp(prefix="run_benchmarks_")
+    try:
+        source, rows = scaled_raw_csv(suite.args.raw, suite.args.scale, directory)
+        results = {}
+        for name, method in [("aqi_process", "process"), ("aqi_process_streaming", "process_streaming")]:
+            best = None
+            for _ in range(suite.args.repeat):
+                processor = AQIProcessor(source, os.path.join(directory, "processed.csv"))
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    getattr(processor, method)()
+                seconds = time.perf_counter() - start
+                best = seconds if best is None else min(best, seconds)
+            results[name] = {"rows": rows, "seconds": round(best, 4), "rows_per_s": round(rows / best, 1)}
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def bench_cassandra(suite):
+    processor = suite.store()
+    days = suite.sample(suite.args.calls)[["Year", "Month", "Day"]].to_numpy()
+    requests = processor.session.requests
+    samples = timed_calls(processor.query_pollution_data,
+                          [{"year": int(y), "month": int(m), "day": int(d)} for y, m, d in days])
+    query = {**latency(samples), "cql_requests": processor.session.requests - requests}
+
+    ranges = [{"start_day": 1, "start_month": month, "end_day": 28, "end_month": month, "year": year,
+               "end_year": None} for year, month in suite.months(suite.args.stats_calls)]
+    rows, samples = 0, []
+    for time_range in ranges:
+        start = time.perf_counter()
+        rows += sum(1 for _ in processor.query_pollution_data_for_stats(time_range))
+        samples.append(time.perf_counter() - start)
+    scan = {**latency(samples), "rows_per_s": round(rows / sum(samples), 1)}
+    return {"cassandra_insert": suite.insert_result, "cassandra_query": query, "cassandra_stats_scan": scan}
+
+
+def bench_handler(suite):
+    handler = suite.handler()
+    engine = inference_engine.get_engine()
+    start = time.perf_counter()
+    engine.load()
+    load_seconds = time.perf_counter() - start
+    rows = suite.sample(suite.args.calls)
+    calls = [dict(zip(["Day", "Month", "Year", "Hour", "PT08_S1_CO", "C6H6_GT", "PT08_S5_O3", "PT08_S2_NMHC",
+                       "PT08_S4_NO2"], map(float, values))) for values in rows[FEATURES].to_numpy()]
+    results = {"handler_predict": {**latency(timed_calls(handler.predict_pollution_level, calls)),
+                                   "load_seconds": round(load_seconds, 4), "backend": engine.resolved_backend()}}
+    calls = stats_calls(suite, suite.args.stats_calls)
+    for name, use_rollups in [("handler_stats_rollups", True), ("handler_stats_scan", False)]:
+        handler.use_rollups = use_rollups
+        results[name] = latency(timed_calls(handler.statistical_analysis, calls))
+    return results
+
+
+async def http_load(client, concurrency, requests):
+    """Gửi ``requests`` request (mỗi phần tử là (method, url, kwargs)) với ``concurrency`` client."""
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+    samples, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            method, url, kwargs = queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            samples.append(time.perf_counter() - start)
+            errors += response.status_code != 200 or response.json().get("success") is False
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"req_per_s": round(len(requests) / elapsed, 1), **latency(samples), "errors": errors}
+
+
+def bench_http(suite):
+    web_app.ai_handler = suite.handler()
+    rows = suite.sample(suite.args.requests)
+    predict = [("POST", "/api/predict", {"json": dict(zip(
+        ["day", "month", "year", "hour", "pt08_s1_co", "c6h6_gt", "pt08_s5_o3", "pt08_s2_nmhc", "pt08_s4_no2"],
+        map(float, values)))}) for values in rows[FEATURES].to_numpy()]
+    query = [("POST", "/api/query", {"json": {"message": f"Dữ liệu ngày {d}/{m}/{y}"}})
+             for y, m, d in rows[["Year", "Month", "Day"]].to_numpy()]
+    stats = [("GET", "/api/stats/all", {"params": {key: value for key, value in call.items() if key != "stat_type"}})
+             for call in stats_calls(suite, suite.args.requests)]
+    health = [("GET", "/health", {})] * suite.args.requests
+    endpoints = [("health", health), ("predict", predict), ("query", query), ("stats", stats)]
+
+    async def run():
+        results = {}
+        transport = httpx.ASGITransport(app=web_app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for name, requests in endpoints:
+                for concurrency in suite.args.concurrency:
+                    results[f"http_{name}_c{concurrency}"] = await http_load(client, concurrency, requests)
+        await web_app.predict_batcher.stop()
+        return results
+
+    return asyncio.run(run())
+
+
+BENCHMARKS = [("aqi", bench_aqi_process), ("cassandra", bench_cassandra), ("handler", bench_handler),
+              ("http", bench_http)]
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+
+
+def run_suite(args):
+    commit, dirty = git_revision()
+    suite = Suite(args)
+    results = {}
+    try:
+        for prefix, function in BENCHMARKS:
+            if args.only and not any(prefix.startswith(name) or name.startswith(prefix) for name in args.only):
+                continue
+            start = time.perf_counter()
+            cases = {name: value for name, value in function(suite).items()
+                     if not args.only or any(name.startswith(only) for only in args.only)}
+            results.update(cases)
+            print(f"✅ {prefix:<10} {time.perf_counter() - start:6.1f}s")
+            for name, value in cases.items():
+                print(f"   {name:<24} " + ", ".join(f"{key}={value}" for key, value in value.items()))
+    finally:
+        suite.close()
+    return {
+        "meta": {
+            "commit": commit, "dirty": dirty, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "cpu_count": os.cpu_count(),
+            "params": {key: getattr(args, key) for key in ("scale", "calls", "stats_calls", "requests", "concurrency",
+                                                           "repeat", "llm_latency", "db_latency", "seed")},
+        },
+        "results": results,
+    }
+
+
+def compare(base, new, threshold, min_delta_ms):
+    """In bảng so sánh; trả về danh sách chỉ số tệ đi quá ngưỡng."""
+    if base["meta"]["params"] != new["meta"]["params"]:
+        print(f"⚠️ Tham số khác nhau, so sánh có thể không có ý nghĩa:\n   base {base['meta']['params']}\n"
+              f"   new  {new['meta']['params']}")
+    dirty = " (có thay đổi chưa commit)" if new["meta"]["dirty"] else ""
+    print(f"So sánh {base['meta']['commit']} → {new['meta']['commit']}{dirty}, ngưỡng {threshold:.0%}")
+    regressions = []
+    for case, metrics in new["results"].items():
+        if case not in base["results"]:
+            print(f"   {case:<24} (mới)")
+            continue
+        for metric, value in metrics.items():
+            sign = direction(metric)
+            old = base["results"][case].get(metric)
+            if not sign or not isinstance(value, (int, float)) or not isinstance(old, (int, float)):
+                continue
+            worse = (value - old) * -sign  # > 0 là tệ đi
+            change = (value - old) / old if old else (0.0 if value == old else float("inf"))
+            if worse > 0 and metric.endswith("_ms") and value - old < min_delta_ms:
+                status = "  "  # chênh lệch dưới độ phân giải có ý nghĩa
+            elif worse > 0 and (abs(change) > threshold or not old):
+                status = "❌"
+                regressions.append(f"{case}.{metric}")
+            elif worse < 0 and abs(change) > threshold:
+                status = "✅"
+            else:
+                status = "  "
+            print(f"{status} {case:<24} {metric:<14} {old:>12} → {value:<12} {change:+8.1%}")
+    missing = sorted(set(base["results"]) - set(new["results"]))
+    if missing:
+        print(f"⚠️ Không có trong lần chạy mới: {', '.join(missing)}")
+    return regressions
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--raw", default="Data/AirQuality1.csv")
+    parser.add_argument("--processed", default="Data/processed_AQI_data.csv")
+    parser.add_argument("--scale", type=int, default=2, help="Số bản sao của dữ liệu gốc")
+    parser.add_argument("--calls", type=int, default=200, help="Số lần gọi truy vấn/dự đoán")
+    parser.add_argument("--stats-calls", type=int, default=20, help="Số lần gọi thống kê (mỗi lần một tháng)")
+    parser.add_argument("--requests", type=int, default=100, help="Số request HTTP mỗi endpoint và mức đồng thời")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần chạy AQIProcessor (lấy lần nhanh nhất)")
+    parser.add_argument("--llm-latency", type=float, default=0.02, help="Độ trễ một lần gọi Claude giả (giây)")
+    parser.add_argument("--db-latency", type=float, default=0.001, help="Độ trễ một câu CQL giả (giây)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", help="Chỉ chạy các phép đo có tên bắt đầu bằng các tiền tố này")
+    parser.add_argument("--output", help="File JSON kết quả (mặc định benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs="+", metavar="JSON",
+                        help="BASE: chạy rồi so với BASE; BASE NEW: chỉ so sánh hai file")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Mức tệ đi tương đối cho phép")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5,
+                        help="Bỏ qua chỉ số *_ms tăng ít hơn mức này (nhiễu đo)")
+    args = parser.parse_args()
+    logging.getLogger("aqm").setLevel("WARNING")  # bỏ log từng request
+
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare nhận BASE hoặc BASE NEW")
+    if args.compare and len(args.compare) == 2:
+        new = load(args.compare[1])
+    else:
+        new = run_suite(args)
+        output = args.output or os.path.join(RESULTS_DIR, f"{new['meta']['commit'] or 'run'}"
+                                                          f"{'-dirty' if new['meta']['dirty'] else ''}.json")
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(new, f, ensure_ascii=False, indent=2)
+        print(f"📁 {output}")
+    if args.compare:
+        regressions = compare(load(args.compare[0]), new, args.threshold, args.min_delta_ms)
+        if regressions:
+            raise SystemExit(f"❌ {len(regressions)} chỉ số tệ đi quá {args.threshold:.0%}: {', '.join(regressions)}")
+        print("✅ Không có chỉ số nào tệ đi quá ngưỡng")
+
+
+if __name__ == "__main__":
+    main()
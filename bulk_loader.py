@@ -0,0 +1,124 @@
+import threading
+import time
+
+from cassandra.query import BatchStatement, BatchType
+
+import metrics
+
+logger = metrics.get_logger("bulk_loader")
+
+
+class BulkLoader:
+    """Nạp hàng loạt dữ liệu vào Cassandra.
+
+    Dùng prepared statement, giới hạn số request đang chạy song song
+    (``concurrency``), gom các dòng cùng partition thành UNLOGGED batch và
+    thử lại các dòng bị lỗi. Chỉ cần session có ``prepare`` và
+    ``execute_async`` nên có thể chạy với session giả lập khi kiểm thử.
+    """
+
+    def __init__(self, session, query, concurrency=64, batch_size=20, partition_key=None,
+                 max_retries=3, progress_every=1000):
+        self.session = session
+        self.statement = session.prepare(query)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.partition_key = partition_key
+        self.max_retries = max_retries
+        self.progress_every = progress_every
+
+        self._slots = threading.Semaphore(concurrency)
+        self._lock = threading.Condition()
+        self._pending = 0
+        self._done = 0
+        self._total = 0
+        self._failed = []
+
+    def _units(self, rows):
+        """Chia các dòng thành đơn vị gửi: một dòng, hoặc một batch cùng partition."""
+        if self.partition_key is None or self.batch_size <= 1:
+            for params in rows:
+                yield [params]
+            return
+
+        groups = {}
+        for params in rows:
+            group = groups.setdefault(self.partition_key(params), [])
+            group.append(params)
+            if len(group) >= self.batch_size:
+                yield groups.pop(self.partition_key(params))
+        yield from groups.values()
+
+    def _statement_for(self, unit):
+        if len(unit) == 1:
+            return self.statement.bind(unit[0])
+        batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+        for params in unit:
+            batch.add(self.statement.bind(params))
+        return batch
+
+    def _finish(self, unit, error=None):
+        with self._lock:
+            if error is not None:
+                self._failed.append((unit, error))
+            else:
+                before = self._done
+                self._done += len(unit)
+                if self.progress_every and self._done // self.progress_every > before // self.progress_every:
+                    logger.info("Đã nạp %s/%s dòng", self._done, self._total)
+            self._pending -= 1
+            self._lock.notify_all()
+        self._slots.release()
+
+    def _submit(self, unit):
+        self._slots.acquire()
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self.session.execute_async(self._statement_for(unit))
+        except Exception as e:
+            self._finish(unit, e)
+            return
+        future.add_callbacks(callback=lambda _: self._finish(unit),
+                             errback=lambda e: self._finish(unit, e))
+
+    def _run(self, units):
+        for unit in units:
+            self._submit(unit)
+        with self._lock:
+            while self._pending:
+                self._lock.wait()
+
+    def load(self, rows):
+        """Nạp một dãy tuple tham số; trả về thống kê số dòng, lỗi và tốc độ."""
+        rows = list(rows)
+        self._total = len(rows)
+        self._done = 0
+        self._failed = []
+        start = time.perf_counter()
+
+        self._run(self._units(rows))
+
+        for attempt in range(1, self.max_retries + 1):
+            if not self._failed:
+                break
+            # Thử lại từng dòng riêng lẻ để một dòng lỗi không kéo theo cả batch.
+            retry_rows = [params for unit, _ in self._failed for params in unit]
+            logger.warning("Thử lại %s dòng lỗi (lần %s)", len(retry_rows), attempt)
+            self._failed = []
+            self._run([params] for params in retry_rows)
+
+        elapsed = time.perf_counter() - start
+        failed_rows = [params for unit, _ in self._failed for params in unit]
+        errors = [str(error) for _, error in self._failed]
+        rate = self._done / elapsed if elapsed > 0 else 0.0
+        logger.info("Hoàn tất: %s/%s dòng trong %.2fs (%.0f dòng/s), %s dòng lỗi",
+                    self._done, self._total, elapsed, rate, len(failed_rows))
+        return {
+            "rows": self._done,
+            "failed": len(failed_rows),
+            "failed_rows": failed_rows,
+            "errors": errors[:10],
+            "seconds": elapsed,
+            "rows_per_sec": rate,
+        }
@@ -1,134 +1,408 @@
 from cassandra.cluster import Cluster
 import pandas as pd
 
-import uuid
+import asyncio
 
-from tensorboard.compat.tensorflow_stub.dtypes import double
+import metrics
+import result_cache
+import rollups
+import timeseries_index
+import timestamp_filter
+from bulk_loader import BulkLoader
+from storage import (INSERT_COLUMNS, QUERY_COLUMNS, STATS_COLUMNS, PollutionStore, plan_partition_reads, row_id,
+                     row_ids, stats_time_range)
 
+logger = metrics.get_logger("cassandra")
 
-class PollutionDataProcessor:
-    def __init__(self, cluster_ips, keyspace, csv_path=None):
-        self.cluster = Cluster(cluster_ips)
-        self.session = self.cluster.connect(keyspace)
+# Bảng cũ: khóa phân vùng là id, mọi truy vấn theo thời gian đều phải ALLOW FILTERING.
+LEGACY_TABLE = "pollution_data"
+# Bảng mới: phân vùng theo (year, month), sắp xếp theo (day, hour) trong phân vùng.
+POLLUTION_TABLE = "pollution_data_by_month"
+
+CREATE_POLLUTION_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {POLLUTION_TABLE} (
+    year int,
+    month int,
+    day int,
+    hour int,
+    id uuid,
+    pt08_s1_co double,
+    c6h6_gt double,
+    pt08_s5_o3 double,
+    pt08_s2_nmhc double,
+    pt08_s4_no2 double,
+    aqi_label double,
+    PRIMARY KEY ((year, month), day, hour, id)
+) WITH CLUSTERING ORDER BY (day ASC, hour ASC, id ASC)
+"""
+
+
+def _settle(future, rows=None, error=None):
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(rows)
+
+
+async def execute_aio(session, statement, parameters=None):
+    """Chạy câu lệnh qua ``execute_async`` của driver và chờ kết quả mà không chặn
+    event loop. Callback của driver chạy trên luồng I/O nên kết quả được chuyển về
+    loop bằng ``call_soon_threadsafe``; các trang tiếp theo (nếu có) được lấy nối tiếp.
+    """
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+    rows = []
+
+    def on_page(page):
+        rows.extend(page)
+        if getattr(response, "has_more_pages", False):
+            response.start_fetching_next_page()
+        else:
+            loop.call_soon_threadsafe(_settle, done, rows)
+
+    def on_error(error):
+        loop.call_soon_threadsafe(_settle, done, None, error)
+
+    response = session.execute_async(statement, parameters)
+    response.add_callbacks(callback=on_page, errback=on_error)
+    return await done
+
+
+async def aiter_pages(session, statement, parameters=None):
+    """Duyệt từng trang kết quả của ``execute_async`` mà không chặn event loop. Trang
+    kế tiếp chỉ được yêu cầu khi bên gọi lấy tiếp, nên bộ nhớ giữ tối đa một trang."""
+    loop = asyncio.get_running_loop()
+    pages = asyncio.Queue()
+
+    def on_page(page):
+        loop.call_soon_threadsafe(pages.put_nowait, (list(page), None))
+
+    def on_error(error):
+        loop.call_soon_threadsafe(pages.put_nowait, (None, error))
+
+    response = session.execute_async(statement, parameters)
+    response.add_callbacks(callback=on_page, errback=on_error)
+    while True:
+        page, error = await pages.get()
+        if error is not None:
+            raise error
+        yield page
+        if not getattr(response, "has_more_pages", False):
+            return
+        response.start_fetching_next_page()
+
+
+class PollutionDataProcessor(PollutionStore):
+    backend = "cassandra"
+
+    def __init__(self, cluster_ips, keyspace, csv_path=None, session=None):
+        # Khi nhận session dùng chung (xem db_pool), processor không sở hữu cluster
+        # và close_connection() không đóng kết nối.
+        self.cluster = None if session is not None else Cluster(cluster_ips)
+        self.session = session if session is not None else self.cluster.connect(keyspace)
         self.csv_path = csv_path
         self.keyspace = keyspace
+        self._prepared = {}
+        self.rollups = rollups.RollupStore(self)
+
+    def _prepare(self, query):
+        if query not in self._prepared:
+            self._prepared[query] = self.session.prepare(query)
+        return self._prepared[query]
+
+    def create_schema(self):
+        self.session.execute(CREATE_POLLUTION_TABLE)
+        self.rollups.create_schema()
+
+    @staticmethod
+    def _rollup_days(days=None, months=None, span=None):
+        affected = list(days or ())
+        for year, month in months or ():
+            affected.extend(rollups.month_days(year, month))
+        if span is not None:
+            affected.extend(rollups.days_between(*span))
+        return affected
+
+    def mark_rollups_dirty(self, days=None, months=None, span=None):
+        """Đánh dấu rollup các ngày sắp ghi là cũ (gọi trước khi ghi dữ liệu gốc), để thống kê
+        quét dữ liệu gốc nếu lần tính lại sau đó lỗi."""
+        try:
+            self.rollups.mark_dirty(self._rollup_days(days, months, span))
+        except Exception as e:
+            logger.warning("Không đánh dấu được rollup cũ: %s", e)
+
+    @metrics.timed("db", "refresh_rollups")
+    def refresh_rollups(self, days=None, months=None, span=None):
+        """Cập nhật bảng rollup sau khi ghi (theo ngày, theo tháng hoặc theo khoảng [start, end]);
+        lỗi rollup không làm hỏng lần ghi dữ liệu gốc: các ngày vẫn mang dấu cũ và thống kê
+        trên chúng quét dữ liệu gốc cho tới lần tính lại thành công."""
+        try:
+            # Đánh dấu lại sau khi ghi: lần tính lại nào bắt đầu trước khi dữ liệu ghi xong
+            # (của một tiến trình khác) sẽ không xóa được dấu này.
+            self.rollups.mark_dirty(self._rollup_days(days, months, span))
+            if days:
+                self.rollups.refresh_days(days)
+            for year, month in months or ():
+                self.rollups.refresh_month(year, month)
+            if span is not None:
+                self.rollups.refresh_range(*span)
+        except Exception as e:
+            rollups.REFRESH_FAILURES.inc()
+            logger.warning("Không cập nhật được rollup: %s", e)
+
+    @staticmethod
+    def record_index(rows):
+        """Cập nhật chỉ mục thời gian và Bloom filter giờ (nếu có) từ các tuple tham số INSERT
+        đã ghi thành công."""
+        rows = list(rows)
+        if rows:
+            days, months, years, hours = list(zip(*rows))[1:5]
+            timestamp_filter.record_hours(years, months, days, hours)
+        if timeseries_index.get_index() is None:
+            return
+        frame = pd.DataFrame(rows, columns=[column.strip() for column in INSERT_COLUMNS.split(",")])
+        timeseries_index.record_frame(frame.rename(columns={
+            "PT08_S1_CO": "PT08.S1(CO)", "C6H6_GT": "C6H6(GT)", "PT08_S5_O3": "PT08.S5(O3)",
+            "PT08_S2_NMHC": "PT08.S2(NMHC)", "PT08_S4_NO2": "PT08.S4(NO2)"}))
+
+    def partitions(self):
+        """Các (year, month) đã có dữ liệu; SELECT DISTINCT chỉ đọc khóa phân vùng."""
+        rows = self.session.execute(f"SELECT DISTINCT year, month FROM {POLLUTION_TABLE}")
+        return sorted((row.year, row.month) for row in rows)
 
     def read_csv(self):
         if self.csv_path:
             return pd.read_csv(self.csv_path)
         raise ValueError("CSV path is not provided.")
 
-    def insert_data(self, df):
-        query = """
-        INSERT INTO pollution_data (id, Day, Month, Year, Hour, PT08_S1_CO, C6H6_GT, PT08_S5_O3, PT08_S2_NMHC, PT08_S4_NO2, AQI_Label)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    @staticmethod
+    def rows_from_frame(df):
+        """Chuyển DataFrame đã xử lý thành các tuple tham số cho câu INSERT (id xác định theo giờ đo,
+        nên nạp lại cùng dữ liệu là upsert)."""
+        return zip(
+            row_ids(df),
+            df["Day"].astype(int).tolist(), df["Month"].astype(int).tolist(),
+            df["Year"].astype(int).tolist(), df["Hour"].astype(int).tolist(),
+            df["PT08.S1(CO)"].astype(float).tolist(), df["C6H6(GT)"].astype(float).tolist(),
+            df["PT08.S5(O3)"].astype(float).tolist(), df["PT08.S2(NMHC)"].astype(float).tolist(),
+            df["PT08.S4(NO2)"].astype(float).tolist(), df["AQI_Label"].astype(float).tolist(),
+        )
+
+    def insert_data(self, df, concurrency=64, batch_size=20, max_retries=3):
+        query = f"""
+        INSERT INTO {POLLUTION_TABLE} ({INSERT_COLUMNS})
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """
+        # Các dòng cùng (year, month) thuộc một phân vùng nên được gom thành UNLOGGED batch.
+        loader = BulkLoader(self.session, query, concurrency=concurrency, batch_size=batch_size,
+                            partition_key=lambda params: (params[3], params[2]), max_retries=max_retries)
+        rows = list(self.rows_from_frame(df))
+        # Rollup chỉ tính lại cho các ngày vừa ghi: lô nhỏ từ /api/ingest không phải đọc lại cả tháng.
+        days = [tuple(day) for day in
+                df[["Year", "Month", "Day"]].drop_duplicates().astype(int).itertuples(index=False)]
+        self.mark_rollups_dirty(days=days)
+        result = loader.load(rows)
+        months = sorted({(year, month) for year, month, _ in days})
+        self.refresh_rollups(days=days)
+        failed = {params[0] for params in result["failed_rows"]}
+        self.record_index(row for row in rows if row[0] not in failed)
+        cache = result_cache.get_cache()
+        for year, month in months:
+            cache.invalidate_month(year, month)
+        return result
 
-        for index, row in df.iterrows():
-            try:
-                self.session.execute(query, (
-                    uuid.uuid4(),int(row["Day"]),int(row["Month"]),
-                    int(row["Year"]),int(row["Hour"]), float(row["PT08.S1(CO)"]),
-                    float(row["C6H6(GT)"]),float(row["PT08.S5(O3)"]),float(row["PT08.S2(NMHC)"]),
-                    float(row["PT08.S4(NO2)"]),float(row["AQI_Label"])
-                ))
-            except Exception as e:
-                print(f"Lỗi khi thêm dòng {index}: {e}")
+    def _partition_query(self, columns, read):
+        query = f"SELECT {columns} FROM {POLLUTION_TABLE} WHERE year = ? AND month = ?"
+        params = [read.year, read.month]
+        if read.first is not None:
+            query += " AND (day, hour) >= (?, ?)"
+            params.extend(read.first)
+        if read.last is not None:
+            query += " AND (day, hour) <= (?, ?)"
+            params.extend(read.last)
+        return self._prepare(query), params
 
+    def read_partitions(self, reads, columns):
+        """Đọc song song các phân vùng theo kế hoạch và ghép kết quả theo thứ tự thời gian."""
+        futures = [self.session.execute_async(*self._partition_query(columns, read)) for read in reads]
+        rows = []
+        for future in futures:
+            rows.extend(future.result())
+        return rows
 
     def query_pollution_data(self, year=None, month=None, day=None, hour=None):
-        query = 'SELECT hour,AQI_Label,day,month,year FROM pollution_db.pollution_data'
-        conditions = []
-        params = []
-        if year is not None:
-            conditions.append('year = %s')
-            params.append(year)
-        if month is not None:
-            conditions.append('month = %s')
-            params.append(month)
-        if day is not None:
-            conditions.append('day = %s')
-            params.append(day)
-        if hour is not None:
-            conditions.append('hour = %s')
-            params.append(hour)
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions) + " ALLOW FILTERING"
+        columns = QUERY_COLUMNS
+        try:
+            if year is None:
+                # Không có năm thì không xác định được phân vùng: buộc phải quét bảng.
+                conditions = [f'{name} = %s' for name, value in
+                              (('month', month), ('day', day), ('hour', hour)) if value is not None]
+                params = [value for value in (month, day, hour) if value is not None]
+                query = f'SELECT {columns} FROM {POLLUTION_TABLE}'
+                if conditions:
+                    query += " WHERE " + " AND ".join(conditions) + " ALLOW FILTERING"
+                rows = self.session.execute(query, params) if params else self.session.execute(query)
+                return pd.DataFrame(rows)
+
+            reads, filters = self._plan_query(year, month, day, hour)
+            return self._apply_filters(pd.DataFrame(self.read_partitions(reads, columns)), filters)
+        except Exception as e:
+            logger.error("Lỗi khi truy vấn dữ liệu: %s", e)
+            return pd.DataFrame()
+
+    async def aread_partitions(self, reads, columns, fetch_size=None):
+        """Bản async của ``read_partitions``: chờ các phân vùng song song trên event loop."""
+        statements = []
+        for read in reads:
+            statement, params = self._partition_query(columns, read)
+            bound = statement.bind(params)
+            if fetch_size:
+                bound.fetch_size = fetch_size
+            statements.append(bound)
+        pages = await asyncio.gather(*(execute_aio(self.session, bound) for bound in statements))
+        return [row for page in pages for row in page]
+
+    async def aquery_pollution_data(self, year=None, month=None, day=None, hour=None):
+        if year is None:
+            # Quét toàn bảng hiếm khi dùng: chạy bản đồng bộ trong thread pool.
+            return await asyncio.to_thread(self.query_pollution_data, year, month, day, hour)
         try:
-            rows = self.session.execute(query, params) if params else self.session.execute(query)
-            return pd.DataFrame(rows)
+            reads, filters = self._plan_query(year, month, day, hour)
+            rows = await self.aread_partitions(reads, QUERY_COLUMNS)
+            return self._apply_filters(pd.DataFrame(rows), filters)
         except Exception as e:
-            print(f"Lỗi khi truy vấn dữ liệu: {e}")
+            logger.error("Lỗi khi truy vấn dữ liệu: %s", e)
             return pd.DataFrame()
 
     def insert_data_row_by_one(self, df):
-        query = """
-        INSERT INTO pollution_data (id, Day, Month, Year, Hour, PT08_S1_CO, C6H6_GT, PT08_S5_O3, PT08_S2_NMHC, PT08_S4_NO2, AQI_Label)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
+        query = self._prepare(f"""
+        INSERT INTO {POLLUTION_TABLE} ({INSERT_COLUMNS})
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """)
 
+        written = set()
+        inserted = []
+        self.mark_rollups_dirty(days=[tuple(day) for day in df[["Year", "Month", "Day"]].drop_duplicates()
+                                      .astype(int).itertuples(index=False)])
         for index, row in df.iterrows():
             try:
-                self.session.execute(query, (
-                    uuid.uuid4(),int(row["Day"]),int(row["Month"]),
+                params = (
+                    row_id(row["Year"], row["Month"], row["Day"], row["Hour"]),int(row["Day"]),int(row["Month"]),
                     int(row["Year"]),  int(row["Hour"]), float(row["PT08.S1(CO)"]),
                     float(row["C6H6(GT)"]),float(row["PT08.S5(O3)"]),float(row["PT08.S2(NMHC)"]),
                     float(row["PT08.S4(NO2)"]),float(row["AQI_Label"])
-                ))
-                print(f"Dữ liệu {row['Year']}-{row['Month']}-{row['Day']} {row['Hour']}h đã được chèn!")
+                )
+                self.session.execute(query, params)
+                inserted.append(params)
+                written.add((int(row["Year"]), int(row["Month"]), int(row["Day"])))
+                logger.debug("Dữ liệu %s-%s-%s %sh đã được chèn!", row['Year'], row['Month'], row['Day'], row['Hour'])
             except Exception as e:
-                print(f"Lỗi khi thêm dòng {index}: {e}")
+                logger.error("Lỗi khi thêm dòng %s: %s", index, e)
+
+        self.refresh_rollups(days=written)
+        self.record_index(inserted)
+        cache = result_cache.get_cache()
+        for year, month, day in written:
+            cache.invalidate_day(year, month, day)
 
     def add_pollution_data_from_nlp(self, PT08_S1_CO, C6H6_GT, PT08_S5_O3, PT08_S2_NMHC, PT08_S4_NO2, AQI_Label,
                                     Year, Month, Day, Hour):
         data = {
-            "pt08_s1_co": float(PT08_S1_CO),
-            "c6h6_gt": float(C6H6_GT),
-            "pt08_s5_o3": float(PT08_S5_O3),
-            "pt08_s2_nmhc": float(PT08_S2_NMHC),
-            "pt08_s4_no2": float(PT08_S4_NO2),
-            "aqi_label": float(AQI_Label),
-            "year": int(Year),
-            "month": int(Month),
-            "day": int(Day),
-            "hour": int(Hour)
+            "PT08.S1(CO)": float(PT08_S1_CO),
+            "C6H6(GT)": float(C6H6_GT),
+            "PT08.S5(O3)": float(PT08_S5_O3),
+            "PT08.S2(NMHC)": float(PT08_S2_NMHC),
+            "PT08.S4(NO2)": float(PT08_S4_NO2),
+            "AQI_Label": float(AQI_Label),
+            "Year": int(Year),
+            "Month": int(Month),
+            "Day": int(Day),
+            "Hour": int(Hour)
         }
 
-        check_query = """
-        SELECT id FROM pollution_data WHERE Year=%s AND Month=%s AND Day=%s AND Hour=%s LIMIT 1 ALLOW FILTERING
-        """
-        existing = self.session.execute(check_query, (data["year"], data["month"], data["day"], data["hour"]))
-
-        if existing.one() is None:
-            df = pd.DataFrame([data])
-            self.insert_data_row_by_one(df)
-            print(" Dữ liệu từ NLP đã được thêm thành công!")
-            return "inserted"
-        else:
-            print(f" Dữ liệu tại {data['year']}-{data['month']}-{data['day']} {data['hour']}h đã tồn tại, bỏ qua.")
+        moment = (data["Year"], data["Month"], data["Day"], data["Hour"])
+        # Bloom filter (nếu bật và đã dựng) trả lời "chưa có" không cần đọc; "có thể có" mới đọc một
+        # dòng để xác nhận. Không có filter thì đọc kiểm tra như trước, không ghi đè số đo đã có.
+        exists = timestamp_filter.lookup(self, *moment, confirm=lambda: self._hour_exists(*moment))
+        if exists is None:
+            exists = self._hour_exists(*moment)
+        if exists:
+            logger.info("Dữ liệu tại %s-%s-%s %sh đã tồn tại, bỏ qua.", data['Year'], data['Month'], data['Day'],
+                        data['Hour'])
             return "exists"
+        self.insert_data_row_by_one(pd.DataFrame([data]))
+        logger.info("Dữ liệu từ NLP đã được thêm thành công!")
+        return "inserted"
+
+    def _hour_exists(self, year, month, day, hour):
+        """Giờ đã có dòng nào chưa (đọc một dòng trong đúng phân vùng, kể cả dòng id ngẫu nhiên cũ)."""
+        check_query = self._prepare(f"""
+        SELECT id FROM {POLLUTION_TABLE} WHERE year = ? AND month = ? AND day = ? AND hour = ? LIMIT 1
+        """)
+        return self.session.execute(check_query, (year, month, day, hour)).one() is not None
 
-    def query_pollution_data_for_stats(self, time_range):
-        session = self.cluster.connect(self.keyspace)
+    def iter_pollution_pages(self, start, end, columns=STATS_COLUMNS, fetch_size=1000):
+        """Duyệt các trang kết quả (danh sách dòng) trong khoảng [start, end] (datetime,
+        bao gồm hai đầu, có thể qua nhiều năm) theo thứ tự thời gian.
 
-        query = """
-            SELECT pt08_s1_co,c6h6_gt,pt08_s5_o3,pt08_s2_nmhc,pt08_s4_no2,aqi_label FROM pollution_data 
-            WHERE year = %s 
-            AND month >= %s AND month <= %s 
-            AND day >= %s AND day <= %s
-            ALLOW FILTERING
+        Chỉ đọc các phân vùng tháng liên quan, lần lượt từng phân vùng, và để driver
+        phân trang theo ``fetch_size`` nên bộ nhớ chỉ giữ một trang tại một thời điểm.
         """
-        rows = session.execute(query, (time_range['year'], time_range['start_month'],
-                                       time_range['end_month'], time_range['start_day'],
-                                       time_range['end_day']))
-        return list(rows)
+        for read in plan_partition_reads(start, end):
+            statement, params = self._partition_query(columns, read)
+            bound = statement.bind(params)
+            bound.fetch_size = fetch_size
+            result = self.session.execute(bound)
+            while True:
+                yield getattr(result, "current_rows", result)
+                if not getattr(result, "has_more_pages", False):
+                    break
+                result.fetch_next_page()
+
+    async def aconsume_pollution_range(self, start, end, on_page, columns=STATS_COLUMNS, fetch_size=1000):
+        """Đọc song song các phân vùng trong [start, end] và gọi ``on_page(rows)`` cho từng
+        trang ngay khi trang về, trên event loop (không cần khóa). Mỗi phân vùng chỉ lấy
+        trang kế tiếp sau khi trang hiện tại đã được xử lý."""
+        async def consume(read):
+            statement, params = self._partition_query(columns, read)
+            bound = statement.bind(params)
+            bound.fetch_size = fetch_size
+            async for page in aiter_pages(self.session, bound):
+                on_page(page)
+
+        await asyncio.gather(*(consume(read) for read in plan_partition_reads(start, end)))
+
+    def query_pollution_data_for_stats(self, time_range, fetch_size=1000):
+        start, end = stats_time_range(time_range)
+        return self.iter_pollution_range(start, end, STATS_COLUMNS, fetch_size)
+
+    async def aquery_pollution_data_for_stats(self, time_range, fetch_size=1000):
+        """Bản async của ``query_pollution_data_for_stats``; trả về danh sách dòng."""
+        start, end = stats_time_range(time_range)
+        return await self.aread_partitions(plan_partition_reads(start, end), STATS_COLUMNS, fetch_size)
 
     def close_connection(self):
-        self.cluster.shutdown()
-
-#if __name__ == "__main__":
-    #processor = PollutionDataProcessor(["127.0.0.1"], "pollution_db", "Data/processed_AQI_data.csv")
-    #data = processor.read_csv()
-    #processor.insert_data(data)
-    #print("Dữ liệu đã thêm thành công!")
-    #processor.close_connection()
+        if self.cluster is not None:
+            self.cluster.shutdown()
+
+if __name__ == "__main__":
+    import argparse
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Nạp dữ liệu AQI đã xử lý vào Cassandra")
+    parser.add_argument("--csv", default="Data/processed_AQI_data.csv")
+    parser.add_argument("--concurrency", type=int, default=64, help="Số request chạy song song tối đa")
+    parser.add_argument("--batch-size", type=int, default=20, help="Số dòng tối đa trong một UNLOGGED batch")
+    parser.add_argument("--retries", type=int, default=3)
+    args = parser.parse_args()
+
+    processor = PollutionDataProcessor(Config.CASSANDRA_HOSTS, Config.CASSANDRA_KEYSPACE, args.csv)
+    processor.create_schema()
+    data = processor.read_csv()
+    result = processor.insert_data(data, concurrency=args.concurrency, batch_size=args.batch_size,
+                                   max_retries=args.retries)
+    print(f"✅ Đã nạp {result['rows']} dòng trong {result['seconds']:.2f}s ({result['rows_per_sec']:,.0f} dòng/s), "
+          f"{result['failed']} dòng lỗi")
+    processor.close_connection()
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+🗂️ Backend lưu trữ dạng cột trên file, chạy không cần Cassandra.
+
+Dữ liệu chia theo năm/tháng giống bảng pollution_data_by_month, mỗi cột là một file
+.npy sắp theo (day, hour):
+
+    <root>/2004/03/manifest.json          {"version": 3, "rows": 744}
+    <root>/2004/03/v3/pt08_s1_co.npy      ...
+
+Khi đọc chỉ mở các phân vùng tháng nằm trong khoảng thời gian (lọc theo thời gian
+ngay ở tầng lưu trữ) và chỉ các cột được yêu cầu, dưới dạng memory-map; trong
+phân vùng, lát cắt (day, hour) được tìm bằng tìm kiếm nhị phân. Mỗi lần ghi tạo
+một phiên bản mới của phân vùng rồi thay manifest.json bằng os.replace, nên người
+đọc luôn thấy một phiên bản trọn vẹn. Chỉ nên có một tiến trình ghi tại một thời điểm.
+
+Lần ghi giữ lại phiên bản liền trước và chỉ xóa các phiên bản cũ hơn, nên người đọc vừa
+đọc manifest trước lần ghi vẫn mở được file; nếu phiên bản đó đã bị dọn (nhiều lần ghi
+xen giữa) thì lượt đọc đọc lại manifest và thử thêm một lần.
+
+    python columnar_store.py import --csv Data/processed_AQI_data.csv
+    python columnar_store.py import --from-cassandra --start 2004-03-01 --end 2005-04-30
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import metrics
+import result_cache
+import timeseries_index
+import timestamp_filter
+from storage import (QUERY_COLUMNS, STATS_COLUMNS, PartitionRead, PollutionStore, column_names, plan_partition_reads,
+                     row_ids)
+
+logger = metrics.get_logger("columnar_store")
+
+SCHEMA = {
+    "id": np.uint8,  # 16 byte của UUID, mảng (n, 16)
+    "year": np.int16,
+    "month": np.int8,
+    "day": np.int8,
+    "hour": np.int8,
+    "pt08_s1_co": np.float64,
+    "c6h6_gt": np.float64,
+    "pt08_s5_o3": np.float64,
+    "pt08_s2_nmhc": np.float64,
+    "pt08_s4_no2": np.float64,
+    "aqi_label": np.float64,
+}
+# Cột tương ứng trong Data/processed_AQI_data.csv.
+CSV_COLUMNS = {
+    "year": "Year", "month": "Month", "day": "Day", "hour": "Hour",
+    "pt08_s1_co": "PT08.S1(CO)", "c6h6_gt": "C6H6(GT)", "pt08_s5_o3": "PT08.S5(O3)",
+    "pt08_s2_nmhc": "PT08.S2(NMHC)", "pt08_s4_no2": "PT08.S4(NO2)", "aqi_label": "AQI_Label",
+}
+MANIFEST = "manifest.json"
+
+
+def frame_to_columns(df):
+    """{cột: mảng} theo SCHEMA từ DataFrame dạng processed_AQI_data.csv; id lấy từ cột id hoặc
+    sinh theo giờ đo (``storage.row_id``) nếu không có."""
+    columns = {name: df[source].to_numpy().astype(SCHEMA[name]) for name, source in CSV_COLUMNS.items()}
+    ids = [value.bytes for value in row_ids(df)]
+    columns["id"] = np.frombuffer(b"".join(ids), dtype=np.uint8).reshape(-1, 16)
+    return columns
+
+
+def _latest_by_id(ids):
+    """Chỉ số (tăng dần) của lần xuất hiện cuối cùng của mỗi id trong mảng (n, 16)."""
+    keys = np.ascontiguousarray(ids).view(np.dtype((np.void, 16))).ravel()
+    _, first_from_end = np.unique(keys[::-1], return_index=True)
+    return np.sort(len(keys) - 1 - first_from_end)
+
+
+class ColumnarStore(PollutionStore):
+    backend = "columnar"
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        # Memory-map đã mở, khóa (year, month, version, cột); ``_versions`` là phiên bản của
+        # mỗi phân vùng trong manifest đọc gần nhất, để bỏ memory-map của phiên bản cũ.
+        self._arrays = {}
+        self._versions = {}
+
+    def create_schema(self):
+        os.makedirs(self.root, exist_ok=True)
+
+    # --- Bố cục file ---
+
+    def _partition_path(self, year, month):
+        return os.path.join(self.root, f"{year:04d}", f"{month:02d}")
+
+    def _manifest(self, year, month):
+        try:
+            with open(os.path.join(self._partition_path(year, month), MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def partitions(self):
+        """Các (year, month) đã có dữ liệu, theo thứ tự thời gian."""
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for year in sorted(os.listdir(self.root)):
+            year_path = os.path.join(self.root, year)
+            if not year.isdigit() or not os.path.isdir(year_path):
+                continue
+            for month in sorted(os.listdir(year_path)):
+                if month.isdigit() and os.path.exists(os.path.join(year_path, month, MANIFEST)):
+                    found.append((int(year), int(month)))
+        return found
+
+    def _column(self, year, month, manifest, name):
+        key = (year, month, manifest["version"], name)
+        array = self._arrays.get(key)
+        if array is None:
+            path = os.path.join(self._partition_path(year, month), f"v{manifest['version']}", f"{name}.npy")
+            array = self._arrays[key] = np.load(path, mmap_mode="r")
+        return array
+
+    def _forget(self, year, month, keep=None):
+        """Bỏ các memory-map của phân vùng, trừ phiên bản ``keep``."""
+        for key in list(self._arrays):
+            if key[:2] == (year, month) and key[2] != keep:
+                self._arrays.pop(key, None)
+
+    def _current_manifest(self, year, month):
+        """Manifest của phân vùng; khi phiên bản đổi (do tiến trình này hay tiến trình khác ghi)
+        thì bỏ memory-map của các phiên bản khác để chúng không giữ file đã xóa."""
+        manifest = self._manifest(year, month)
+        version = manifest["version"] if manifest is not None else None
+        if self._versions.get((year, month)) != version:
+            self._versions[(year, month)] = version
+            self._forget(year, month, keep=version)
+        return manifest
+
+    # --- Đọc ---
+
+    def _slice(self, read):
+        """(manifest, đầu, cuối) của lượt đọc trong phân vùng; None nếu phân vùng chưa có dữ liệu."""
+        manifest = self._current_manifest(read.year, read.month)
+        if manifest is None:
+            return None
+        first, last = 0, manifest["rows"]
+        if read.first is not None or read.last is not None:
+            # (day, hour) đã sắp tăng dần nên day * 24 + hour cũng tăng dần.
+            slots = (self._column(read.year, read.month, manifest, "day").astype(np.int32) * 24
+                     + self._column(read.year, read.month, manifest, "hour"))
+            if read.first is not None:
+                first = int(np.searchsorted(slots, read.first[0] * 24 + read.first[1], side="left"))
+            if read.last is not None:
+                last = int(np.searchsorted(slots, read.last[0] * 24 + read.last[1], side="right"))
+        return manifest, first, last
+
+    def _read_partition(self, read, names):
+        """Danh sách mảng (theo ``names``) của lượt đọc; None nếu không có dòng nào."""
+        found = self._slice(read)
+        if found is None or found[1] >= found[2]:
+            return None
+        manifest, first, last = found
+        return [self._column(read.year, read.month, manifest, name)[first:last] for name in names]
+
+    def _read_retrying(self, read, names):
+        try:
+            return self._read_partition(read, names)
+        except FileNotFoundError:
+            # Phiên bản trong manifest vừa đọc đã bị một lần ghi sau dọn: đọc lại manifest một lần.
+            self._forget(read.year, read.month)
+            self._versions.pop((read.year, read.month), None)
+            return self._read_partition(read, names)
+
+    def _read(self, reads, names):
+        """Danh sách mảng (theo ``names``) cho từng lượt đọc có dữ liệu."""
+        for read in reads:
+            arrays = self._read_retrying(read, names)
+            if arrays is not None:
+                yield arrays
+
+    @staticmethod
+    def _rows(arrays, names):
+        """Trang dòng: mảng 2 chiều float64 nếu mọi cột là số, ngược lại danh sách tuple."""
+        if "id" not in names:
+            return np.column_stack(arrays).astype(np.float64, copy=False)
+        values = [[uuid.UUID(bytes=row.tobytes()) for row in array] if name == "id" else array.tolist()
+                  for name, array in zip(names, arrays)]
+        return list(zip(*values))
+
+    def iter_pollution_pages(self, start, end, columns=STATS_COLUMNS, fetch_size=1000):
+        names = column_names(columns)
+        for arrays in self._read(plan_partition_reads(start, end), names):
+            for offset in range(0, len(arrays[0]), fetch_size):
+                yield self._rows([array[offset:offset + fetch_size] for array in arrays], names)
+
+    def _frame(self, reads, names):
+        chunks = list(self._read(reads, names))
+        if not chunks:
+            return pd.DataFrame()
+        data = {}
+        for index, name in enumerate(names):
+            parts = [chunk[index] for chunk in chunks]
+            if name == "id":
+                data[name] = [uuid.UUID(bytes=row.tobytes()) for part in parts for row in part]
+            else:
+                # Cột số nguyên trả về int64 như giá trị int của driver Cassandra.
+                dtype = np.int64 if np.issubdtype(SCHEMA[name], np.integer) else np.float64
+                data[name] = np.concatenate(parts).astype(dtype)
+        return pd.DataFrame(data, columns=names)
+
+    def query_pollution_data(self, year=None, month=None, day=None, hour=None):
+        try:
+            if year is None:
+                reads = [PartitionRead(y, m, None, None) for y, m in self.partitions() if month in (None, m)]
+                filters = [(name, value) for name, value in (("day", day), ("hour", hour)) if value is not None]
+            else:
+                reads, filters = self._plan_query(year, month, day, hour)
+            return self._apply_filters(self._frame(reads, column_names(QUERY_COLUMNS)), filters)
+        except Exception as e:
+            logger.error("Lỗi khi truy vấn dữ liệu: %s", e)
+            return pd.DataFrame()
+
+    # --- Ghi ---
+
+    def _append(self, year, month, new):
+        """Ghi phiên bản mới của phân vùng (dữ liệu cũ + ``new``), sắp theo (day, hour). Dòng
+        trùng id được thay bằng dòng ghi sau, như upsert của Cassandra."""
+        path = self._partition_path(year, month)
+        manifest = self._manifest(year, month)
+        columns = new
+        if manifest is not None:
+            current = os.path.join(path, f"v{manifest['version']}")
+            columns = {name: np.concatenate([np.load(os.path.join(current, f"{name}.npy")), new[name]])
+                       for name in SCHEMA}
+        latest = _latest_by_id(columns["id"])
+        if len(latest) < len(columns["id"]):
+            columns = {name: array[latest] for name, array in columns.items()}
+        order = np.lexsort((columns["hour"], columns["day"]))
+        version = manifest["version"] + 1 if manifest is not None else 1
+
+        version_dir = os.path.join(path, f"v{version}")
+        os.makedirs(version_dir, exist_ok=True)
+        for name in SCHEMA:
+            np.save(os.path.join(version_dir, f"{name}.npy"), np.ascontiguousarray(columns[name][order]))
+        temporary = os.path.join(path, MANIFEST + ".tmp")
+        with open(temporary, "w") as f:
+            json.dump({"version": version, "rows": int(len(order))}, f)
+        os.replace(temporary, os.path.join(path, MANIFEST))
+
+        self._versions[(year, month)] = version
+        self._forget(year, month, keep=version)
+        # Giữ phiên bản liền trước cho người đọc vừa đọc manifest cũ, chỉ xóa từ N-2 trở về trước.
+        # Người đọc đang giữ memory-map phiên bản đã xóa vẫn đọc được trên Linux; trên Windows
+        # thư mục đang mở chưa xóa được thì để lần ghi sau dọn.
+        for entry in os.listdir(path):
+            if entry.startswith("v") and entry[1:].isdigit() and int(entry[1:]) < version - 1:
+                shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+
+    def insert_data(self, df, **kwargs):
+        """Ghi DataFrame dạng processed_AQI_data.csv; các tham số của bản Cassandra (concurrency...) bị bỏ qua."""
+        start = time.perf_counter()
+        columns = frame_to_columns(df)
+        months = sorted(set(zip(columns["year"].tolist(), columns["month"].tolist())))
+        with self._lock:
+            for year, month in months:
+                mask = (columns["year"] == year) & (columns["month"] == month)
+                self._append(year, month, {name: array[mask] for name, array in columns.items()})
+        timeseries_index.record_frame(df)
+        timestamp_filter.record_frame(df)
+        cache = result_cache.get_cache()
+        for year, month in months:
+            cache.invalidate_month(year, month)
+        elapsed = time.perf_counter() - start
+        return {"rows": len(df), "failed": 0, "failed_rows": [], "errors": [], "seconds": elapsed,
+                "rows_per_sec": len(df) / elapsed if elapsed else 0.0}
+
+    def add_pollution_data_from_nlp(self, PT08_S1_CO, C6H6_GT, PT08_S5_O3, PT08_S2_NMHC, PT08_S4_NO2, AQI_Label,
+                                    Year, Month, Day, Hour):
+        data = {
+            "PT08.S1(CO)": float(PT08_S1_CO),
+            "C6H6(GT)": float(C6H6_GT),
+            "PT08.S5(O3)": float(PT08_S5_O3),
+            "PT08.S2(NMHC)": float(PT08_S2_NMHC),
+            "PT08.S4(NO2)": float(PT08_S4_NO2),
+            "AQI_Label": float(AQI_Label),
+            "Year": int(Year),
+            "Month": int(Month),
+            "Day": int(Day),
+            "Hour": int(Hour)
+        }
+        moment = (data["Day"], data["Hour"])
+
+        def hour_exists():
+            return self._read_retrying(PartitionRead(data["Year"], data["Month"], moment, moment), ["hour"]) is not None
+
+        # Như bản Cassandra: Bloom filter (nếu bật và đã dựng) báo giờ đã có; không có filter thì đọc kiểm tra.
+        exists = timestamp_filter.lookup(self, data["Year"], data["Month"], *moment, confirm=hour_exists)
+        if exists is None:
+            exists = hour_exists()
+        if exists:
+            logger.info("Dữ liệu tại %s-%s-%s %sh đã tồn tại, bỏ qua.", data['Year'], data['Month'], data['Day'],
+                        data['Hour'])
+            return "exists"
+        frame = pd.DataFrame([data])
+        with self._lock:
+            self._append(data["Year"], data["Month"], frame_to_columns(frame))
+        timeseries_index.record_frame(frame)
+        timestamp_filter.record_frame(frame)
+        result_cache.get_cache().invalidate_day(data["Year"], data["Month"], data["Day"])
+        logger.info("Dữ liệu từ NLP đã được thêm thành công!")
+        return "inserted"
+
+    def health(self):
+        partitions = self.partitions()
+        return {
+            "backend": self.backend,
+            "path": self.root,
+            "partitions": len(partitions),
+            "rows": sum(self._manifest(year, month)["rows"] for year, month in partitions),
+        }
+
+
+def import_from_cassandra(store, start, end, chunk_rows=50000):
+    """Chép các dòng trong [start, end] từ Cassandra sang ``store`` (giữ nguyên id)."""
+    import db_pool
+
+    names = ["id", *CSV_COLUMNS]
+    rename = {name: CSV_COLUMNS.get(name, name) for name in names}
+    copied = 0
+    batch = []
+    try:
+        for row in db_pool.get_processor().iter_pollution_range(start, end, ",".join(names), fetch_size=5000):
+            batch.append(tuple(row))
+            if len(batch) >= chunk_rows:
+                copied += store.insert_data(pd.DataFrame(batch, columns=names).rename(columns=rename))["rows"]
+                batch = []
+        if batch:
+            copied += store.insert_data(pd.DataFrame(batch, columns=names).rename(columns=rename))["rows"]
+    finally:
+        db_pool.shutdown_pool()
+    return copied
+
+
+if __name__ == "__main__":
+    import argparse
+    from datetime import datetime
+
+    from config import Config
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    load = sub.add_parser("import", help="Nạp dữ liệu vào kho dạng cột")
+    load.add_argument("--path", default=Config.COLUMNAR_PATH)
+    load.add_argument("--csv", help="File CSV đã xử lý (Data/processed_AQI_data.csv)")
+    load.add_argument("--from-cassandra", action="store_true", help="Chép từ bảng pollution_data_by_month")
+    load.add_argument("--start", help="Ngày bắt đầu khi chép từ Cassandra, YYYY-MM-DD")
+    load.add_argument("--end", help="Ngày kết thúc khi chép từ Cassandra, YYYY-MM-DD")
+    load.add_argument("--replace", action="store_true", help="Xóa dữ liệu cũ trong --path trước khi nạp")
+    args = parser.parse_args()
+
+    if args.replace and os.path.isdir(args.path):
+        shutil.rmtree(args.path)
+    store = ColumnarStore(args.path)
+    store.create_schema()
+    begin = time.perf_counter()
+    if args.from_cassandra:
+        if not (args.start and args.end):
+            parser.error("--from-cassandra cần --start và --end")
+        rows = import_from_cassandra(store, datetime.fromisoformat(args.start),
+                                     datetime.fromisoformat(args.end).replace(hour=23))
+    elif args.csv:
+        rows = store.insert_data(pd.read_csv(args.csv))["rows"]
+    else:
+        parser.error("cần --csv hoặc --from-cassandra")
+    print(f"✅ Đã nạp {rows} dòng vào {args.path} trong {time.perf_counter() - begin:.1f}s: {store.health()}")
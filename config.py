@@ -11,8 +11,68 @@ class Config:
     ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
     
     # Database Configuration
-    CASSANDRA_HOSTS = os.getenv('CASSANDRA_HOSTS', '127.0.0.1').split(',')
+    CASSANDRA_HOSTS = [host.strip() for host in os.getenv('CASSANDRA_HOSTS', '127.0.0.1').split(',')]
     CASSANDRA_KEYSPACE = os.getenv('CASSANDRA_KEYSPACE', 'pollution_db')
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'cassandra').lower()  # cassandra or columnar
+    COLUMNAR_PATH = os.getenv('COLUMNAR_PATH', 'Data/columnar')  # root of the columnar store files
+    # Rows are keyed by uuid5(STATION_ID, hour) (storage.row_id), so re-writing an hour is an upsert
+    STATION_ID = os.getenv('STATION_ID', 'default')
+    # In-memory Bloom filter of stored hours (see timestamp_filter.py): the insert tool skips the existence
+    # read for new hours. Sized for EXISTS_FILTER_CAPACITY hours at EXISTS_FILTER_ERROR_RATE false positives
+    EXISTS_FILTER = os.getenv('EXISTS_FILTER', 'true').lower() in ('1', 'true', 'yes')
+    EXISTS_FILTER_CAPACITY = int(os.getenv('EXISTS_FILTER_CAPACITY', 1000000))
+    EXISTS_FILTER_ERROR_RATE = float(os.getenv('EXISTS_FILTER_ERROR_RATE', 0.01))
+    # Hourly time-series index shared by workers through a memory-mapped file (see timeseries_index.py);
+    # empty disables it. Built at startup from TS_INDEX_SOURCE (database or csv) when missing; ranges outside
+    # what the source covered are read from the storage backend.
+    TS_INDEX_PATH = os.getenv('TS_INDEX_PATH', '')
+    TS_INDEX_SOURCE = os.getenv('TS_INDEX_SOURCE', 'database').lower()
+    TS_INDEX_CSV = os.getenv('TS_INDEX_CSV', 'Data/processed_AQI_data.csv')
+    
+    # Model Configuration
+    MODEL_PATH = os.getenv('MODEL_PATH', 'model_ML/air_quality_model.h5')
+    NUMPY_MODEL_PATH = os.getenv('NUMPY_MODEL_PATH', 'model_ML/air_quality_model.npz')
+    MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'auto')  # auto, numpy or keras
+    PRELOAD_MODEL = os.getenv('PRELOAD_MODEL', 'false').lower() in ('1', 'true', 'yes')
+    PREDICT_BATCH_MAX_SIZE = int(os.getenv('PREDICT_BATCH_MAX_SIZE', 64))
+    PREDICT_BATCH_MAX_WAIT_MS = float(os.getenv('PREDICT_BATCH_MAX_WAIT_MS', 2))
+    # CSV uploads to /api/predict/batch are kept in memory up to this size, then spooled to a temp file
+    BATCH_UPLOAD_MEMORY_BYTES = int(os.getenv('BATCH_UPLOAD_MEMORY_BYTES', 8 * 1024 * 1024))
+    # Result types still rewritten by Claude; the others (query, stats, insert) are
+    # formatted locally by answer_templates. Use "predict,query,stats,insert" for the old behaviour.
+    LLM_REWRITE_SOURCES = [s.strip() for s in os.getenv('LLM_REWRITE_SOURCES', 'predict').split(',') if s.strip()]
+    TOOL_CACHE_SIZE = int(os.getenv('TOOL_CACHE_SIZE', 1024))  # 0 disables the tool-selection cache
+    TOOL_CACHE_TTL_SECONDS = float(os.getenv('TOOL_CACHE_TTL_SECONDS', 86400))
+    TOOL_RULES_ENABLED = os.getenv('TOOL_RULES_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', 512))  # 0 disables the query/stats result cache
+    RESULT_CACHE_PATH = os.getenv('RESULT_CACHE_PATH', '')  # SQLite file shared by workers; empty = in-process
+    # Upper bound on how long a cached result lives; the in-process cache never sees writes made by
+    # other workers or CLI loaders, so this is also its worst-case staleness
+    RESULT_CACHE_TTL_SECONDS = float(os.getenv('RESULT_CACHE_TTL_SECONDS', 300))
+    # Serve statistical_analysis from the daily/monthly rollup tables (see rollups.py);
+    # falls back to scanning raw rows when the rollups are missing.
+    STATS_USE_ROLLUPS = os.getenv('STATS_USE_ROLLUPS', 'true').lower() in ('1', 'true', 'yes')
+    MODEL_WORKERS = int(os.getenv('MODEL_WORKERS', 2))  # threads for CPU-bound model work
+    # Load anthropic, the Cassandra driver and the model in a background thread after startup
+    # (they are otherwise imported on first use)
+    PREWARM = os.getenv('PREWARM', 'true').lower() in ('1', 'true', 'yes')
+
+    # Logging and metrics (see metrics.py)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')  # DEBUG also logs raw Claude responses and tool results
+    LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 1.0))  # share of DEBUG/INFO records kept; warnings always kept
+    SLOW_SPAN_MS = float(os.getenv('SLOW_SPAN_MS', 2000))  # stages slower than this are logged as warnings
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')  # serve /metrics
+
+    # Live ingest (/api/ingest, see ingest.py): rows are written in batches of INGEST_BATCH_ROWS or after
+    # INGEST_FLUSH_SECONDS; requests wait up to INGEST_BACKPRESSURE_SECONDS for buffer room, then get 429
+    INGEST_BATCH_ROWS = int(os.getenv('INGEST_BATCH_ROWS', 2000))
+    INGEST_FLUSH_SECONDS = float(os.getenv('INGEST_FLUSH_SECONDS', 1.0))
+    INGEST_MAX_BUFFERED_ROWS = int(os.getenv('INGEST_MAX_BUFFERED_ROWS', 50000))
+    INGEST_BACKPRESSURE_SECONDS = float(os.getenv('INGEST_BACKPRESSURE_SECONDS', 2.0))
+    # ?wait=true gives up after INGEST_WAIT_SECONDS and answers 202 with a ticket (rows are still written)
+    INGEST_WAIT_SECONDS = float(os.getenv('INGEST_WAIT_SECONDS', 10.0))
+    # Larger request bodies are refused with 413 before they are parsed
+    INGEST_MAX_BODY_BYTES = int(os.getenv('INGEST_MAX_BODY_BYTES', 4 * 1024 * 1024))
     
     # Web Interface Configuration
     WEB_PORT = int(os.getenv('WEB_PORT', 7860))
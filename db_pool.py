@@ -0,0 +1,102 @@
+import threading
+
+from config import Config
+
+
+def _connect_cluster(hosts):
+    # Driver Cassandra chỉ được import khi mở kết nối đầu tiên, không phải lúc khởi động.
+    from cassandra.cluster import Cluster
+
+    return Cluster(hosts)
+
+
+class ConnectionPool:
+    """Một Cluster/Session dùng chung cho cả tiến trình, tạo lười ở lần dùng đầu tiên.
+
+    Session của driver Cassandra an toàn khi dùng từ nhiều luồng và tự quản lý
+    pool kết nối tới từng node, nên không cần tạo lại cho mỗi request.
+    """
+
+    def __init__(self, hosts=None, keyspace=None, cluster_factory=_connect_cluster):
+        self.hosts = hosts or Config.CASSANDRA_HOSTS
+        self.keyspace = keyspace or Config.CASSANDRA_KEYSPACE
+        self.cluster_factory = cluster_factory
+        self.cluster = None
+        self.session = None
+        self.processor = None
+        self.clusters_opened = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def get_session(self):
+        if self.session is None:
+            with self._lock:
+                if self.session is None:
+                    try:
+                        cluster = self.cluster_factory(self.hosts)
+                        self.clusters_opened += 1
+                        self.session = cluster.connect(self.keyspace)
+                        self.cluster = cluster
+                        self.last_error = None
+                    except Exception as e:
+                        self.last_error = str(e)
+                        raise
+        return self.session
+
+    def get_processor(self):
+        if self.processor is None:
+            from cassandra_CRUD import PollutionDataProcessor
+
+            session = self.get_session()
+            with self._lock:
+                if self.processor is None:
+                    self.processor = PollutionDataProcessor(self.hosts, self.keyspace, session=session)
+        return self.processor
+
+    def health(self):
+        status = {
+            "connected": self.session is not None,
+            "hosts": self.hosts,
+            "keyspace": self.keyspace,
+            "clusters_opened": self.clusters_opened,
+        }
+        if self.cluster is not None:
+            hosts = self.cluster.metadata.all_hosts()
+            status["hosts_up"] = sum(1 for host in hosts if host.is_up)
+            status["hosts_total"] = len(hosts)
+        if self.last_error:
+            status["last_error"] = self.last_error
+        return status
+
+    def shutdown(self):
+        with self._lock:
+            if self.cluster is not None:
+                self.cluster.shutdown()
+            self.cluster = None
+            self.session = None
+            self.processor = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def get_processor():
+    return get_pool().get_processor()
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = None
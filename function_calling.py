@@ -1,12 +1,44 @@
-import anthropic
-from cassandra_CRUD import PollutionDataProcessor
-import tensorflow as tf
-import numpy as np
+import answer_templates
+import asyncio
+import db_pool
+import inference_engine
+import metrics
+import prompt_rules
+import result_cache
+import rollups
+import stats_engine
+import storage
+import time
+import timeseries_index
 from config import Config
+from stats_engine import StreamingStats
+from storage import stats_time_range, time_bounds
+from tool_cache import ToolSelectionCache
+
+CLAUDE_MODEL = "claude-3-5-haiku-20241022"
+STATS_COLUMNS = ['PT08_S1_CO', 'C6H6_GT', 'PT08_S5_O3', 'PT08_S2_NMHC', 'PT08_S4_NO2', 'AQI_Label']
+
+logger = metrics.get_logger("function_calling")
 
 class PollutionQueryHandler:
     def __init__(self, api_key):
-        self.client = anthropic.Client(api_key=api_key)
+        # Client Anthropic được tạo ở lần gọi Claude đầu tiên (hoặc khi prewarm): riêng
+        # việc import anthropic mất cỡ một giây nên không làm ở lúc khởi động.
+        self.api_key = api_key
+        self._client = None
+        self._async_client = None
+        # Nguồn kết quả vẫn được Claude viết lại; các nguồn khác dùng answer_templates.
+        self.llm_rewrite_sources = set(Config.LLM_REWRITE_SOURCES)
+        # Câu hỏi lặp lại (hoặc khớp bộ luật tiếng Việt) không cần Claude chọn tool.
+        self.tool_cache = ToolSelectionCache(
+            max_entries=Config.TOOL_CACHE_SIZE,
+            ttl=Config.TOOL_CACHE_TTL_SECONDS,
+            rules=prompt_rules.extract_tool_call if Config.TOOL_RULES_ENABLED else None
+        )
+        # Kết quả truy vấn/thống kê; cassandra_CRUD xóa các mục liên quan khi ghi dữ liệu.
+        self.result_cache = result_cache.get_cache()
+        # Thống kê đọc từ bảng rollup ngày/tháng thay vì quét lại dữ liệu theo giờ.
+        self.use_rollups = Config.STATS_USE_ROLLUPS
         self.tools = [
             {
                 "name": "query_pollution_data_openai",
@@ -77,39 +109,113 @@ class PollutionQueryHandler:
                 "input_schema": {
                     "type": "object",
                     "properties": {
-                        "stat_type": { "type": "string", "description": "Loại thống kê (mean, median, mode, max, min)"},
+                        "stat_type": { "type": "string", "description": "Loại thống kê (mean, median, std, max, min, count); nhiều loại cách nhau bằng dấu phẩy (vd. \"mean,max\") hoặc \"all\""},
                         "start_day": {"type": "integer","description": "Ngày bắt đầu (1-31)"},
                         "start_month": {"type": "integer","description": "Tháng bắt đầu (1-12)"},
                         "end_day": {"type": "integer","description": "Ngày kết thúc (1-31)"},
                         "end_month": {"type": "integer","description": "Tháng kết thúc (1-12)"},
-                        "year": {"type": "integer","description": "Năm phân tích"}
+                        "year": {"type": "integer","description": "Năm phân tích (năm bắt đầu)"},
+                        "end_year": {"type": "integer","description": "Năm kết thúc, nếu khác năm bắt đầu"}
                     },
                     "required": ["stat_type", "start_day", "start_month", "end_day", "end_month", "year"]
                 }
             }
         ]
 
+    @property
+    def client(self):
+        if self._client is None:
+            import anthropic
+
+            self._client = anthropic.Client(api_key=self.api_key)
+        return self._client
+
+    @client.setter
+    def client(self, value):
+        self._client = value
+
+    @property
+    def async_client(self):
+        """Client async cho các endpoint web: chờ Claude mà không chặn event loop."""
+        if self._async_client is None:
+            import anthropic
+
+            self._async_client = anthropic.AsyncAnthropic(api_key=self.api_key)
+        return self._async_client
+
+    @async_client.setter
+    def async_client(self, value):
+        self._async_client = value
+
+    def prewarm_clients(self):
+        """Tạo sẵn hai client Anthropic (import anthropic) trước request đầu tiên."""
+        return self.client, self.async_client
+
+    @staticmethod
+    def _query_span(year, month, day):
+        """(start, end, chi tiết) dùng làm khóa cache cho truy vấn theo ngày; None nếu thiếu năm."""
+        if year is None:
+            return None
+        if month is None and day is not None:
+            # Ngày nhưng không có tháng: đọc cả năm rồi lọc theo ngày.
+            return (*time_bounds(year), f"day={day}")
+        return (*time_bounds(year, month, day), None)
+
+    def _cached_result(self, tool, span):
+        if span is None:
+            return None
+        return self.result_cache.get(tool, *span)
+
+    def _store_result(self, tool, span, result, epoch):
+        # Chỉ lưu kết quả có dữ liệu: kết quả rỗng có thể do lỗi truy vấn đã bị nuốt.
+        if span is None or not result:
+            return
+        if isinstance(result, dict) and ("message" in result or "error" in result
+                                         or "error" in result.get("result", {})):
+            return
+        start, end, detail = span
+        self.result_cache.put(tool, start, end, result, detail, epoch=epoch)
+
+    @staticmethod
+    def _index_query(year, month, day):
+        """Kết quả truy vấn từ chỉ mục thời gian theo giờ (vài micro giây); None nếu không dùng được
+        (chưa có chỉ mục, khoảng ngoài phần chỉ mục phủ) để đọc backend lưu trữ."""
+        index = timeseries_index.get_index()
+        if index is None:
+            return None
+        with metrics.span("db", "index_query"):
+            return index.query_frame(year, month, day)
+
     def query_pollution_data_openai(self, year=None, month=None, day=None):
         query_params = {
             "year": year,
             "month": month,
             "day": day,
         }
-        print("Đang truy vấn dữ liệu với:", query_params)
-        processor = PollutionDataProcessor(["127.0.0.1"], "pollution_db")
+        logger.debug("Đang truy vấn dữ liệu với: %s", query_params)
+        span = self._query_span(year, month, day)
+        cached = self._cached_result("query_pollution_data_openai", span)
+        if cached is not None:
+            return cached
+        epoch = self.result_cache.epoch
         try:
-            data = processor.query_pollution_data(**query_params)
-            processor.close_connection()
+            data = self._index_query(year, month, day)
+            if data is None:
+                processor = storage.get_store()
+                with metrics.span("db", "query"):
+                    data = processor.query_pollution_data(**query_params)
             if data.empty:
                 return {"message": "Không có dữ liệu phù hợp với truy vấn."}
-            return data.to_dict(orient="records")
+            records = data.to_dict(orient="records")
+            self._store_result("query_pollution_data_openai", span, records, epoch)
+            return records
         except Exception as e:
             return {"error": f"Lỗi truy vấn Cassandra: {str(e)}"}
 
     def insert_data_to_database(self, Day, Month, Year, Hour, PT08_S1_CO, C6H6_GT, PT08_S5_O3, PT08_S2_NMHC,
                                 PT08_S4_NO2, AQI_Label):
-        processor = PollutionDataProcessor(["127.0.0.1"], "pollution_db")
         try:
+            processor = storage.get_store()
             corrected_data = {
                 "Day": Day,
                 "Month": Month,
@@ -123,7 +229,8 @@ class PollutionQueryHandler:
                 "AQI_Label": AQI_Label
             }
 
-            insert_status = processor.add_pollution_data_from_nlp(**corrected_data)
+            with metrics.span("db", "insert"):
+                insert_status = processor.add_pollution_data_from_nlp(**corrected_data)
 
             if insert_status == "inserted":
                 return {"message": "Dữ liệu đã được thêm vào database."}
@@ -136,123 +243,336 @@ class PollutionQueryHandler:
 
     def predict_pollution_level(self, Day, Month, Year, Hour, PT08_S1_CO, C6H6_GT, PT08_S5_O3, PT08_S2_NMHC, PT08_S4_NO2):
         try:
-            self.model = tf.keras.models.load_model("model_ML/air_quality_model.h5")
-
-            input_features = np.array([[Day, Month, Year, Hour, PT08_S1_CO, C6H6_GT, PT08_S5_O3, PT08_S2_NMHC, PT08_S4_NO2]])
+            input_features = [Day, Month, Year, Hour, PT08_S1_CO, C6H6_GT, PT08_S5_O3, PT08_S2_NMHC, PT08_S4_NO2]
 
-            prediction = self.model.predict(input_features)
-            predicted_class = int(np.argmax(prediction, axis=1)[0])
+            with metrics.span("inference", "predict"):
+                predicted_class = inference_engine.get_engine().predict(input_features)
 
-            pollution_levels = ["Thấp", "Trung bình", "Cao", "Nguy hiểm", "Rất nguy hại"]
-            predicted_label = pollution_levels[predicted_class]
+            predicted_label = inference_engine.POLLUTION_LEVELS[predicted_class]
             return {"pollution_level": predicted_class, "description": predicted_label}
         except Exception as e:
             return {"error": f"Lỗi dự đoán: {str(e)}"}
 
 
-    def statistical_analysis(self, stat_type: str, start_day: int, start_month: int, end_day: int, end_month: int,
-                             year: int):
-        processor = PollutionDataProcessor(["127.0.0.1"], "pollution_db")
-        time_range = {
+    @staticmethod
+    def _time_range(start_day, start_month, end_day, end_month, year, end_year=None):
+        return {
             "start_day": start_day,
             "start_month": start_month,
             "end_day": end_day,
             "end_month": end_month,
-            "year": year
+            "year": year,
+            "end_year": end_year
         }
 
-        data = processor.query_pollution_data_for_stats(time_range)
-
-        if not data:
-            return {"message": "Không có dữ liệu để thống kê"}
-
-        columns = ['PT08_S1_CO', 'C6H6_GT', 'PT08_S5_O3', 'PT08_S2_NMHC', 'PT08_S4_NO2', 'AQI_Label']
-        data_dicts = [dict(zip(columns, row)) for row in data]
-
-        data_array = np.array([[row[col] for col in columns] for row in data_dicts])
-
-        stats_result = {}
-        if stat_type == "mean":
-            stats_result = dict(zip(columns, np.mean(data_array, axis=0)))
-        elif stat_type == "median":
-            stats_result = dict(zip(columns, np.median(data_array, axis=0)))
-        elif stat_type == "std":
-            stats_result = dict(zip(columns, np.std(data_array, axis=0)))
-        elif stat_type == "max":
-            stats_result = dict(zip(columns, np.max(data_array, axis=0)))
-        elif stat_type == "min":
-            stats_result = dict(zip(columns, np.min(data_array, axis=0)))
-        elif stat_type == "count":
-            stats_result = {"Total Records": len(data)}
-        else:
-            stats_result = {"error": "Loại thống kê không hợp lệ"}
-
-        return {"stat_type": stat_type, "result": stats_result}
+    @staticmethod
+    def _rollup_stats(rollup_map):
+        """StreamingStats dựng từ {metric: Rollup}; None nếu rollup của khoảng này chưa có hoặc
+        đã cũ (``range_stats`` trả về None) hoặc khoảng không có dữ liệu."""
+        if rollup_map is None:
+            return None
+        parts = [rollup_map[metric] for metric in rollups.METRICS]
+        if parts[0].count == 0:
+            return None
+        return StreamingStats.from_rollups(STATS_COLUMNS, parts)
+
+    @staticmethod
+    def _index_result(index, stat_type, stat_types, span):
+        """Thống kê trên các giờ trong chỉ mục thời gian; None nếu không có chỉ mục hoặc khoảng nằm
+        ngoài phần chỉ mục phủ (bên gọi đọc rollup/dữ liệu gốc)."""
+        if index is None:
+            return None
+        with metrics.span("db", "index_stats"):
+            values = index.range_values(span[0], span[1])
+        if values is None:
+            return None
+        return StreamingStats(STATS_COLUMNS, stat_types).add_array(values).summary(stat_type)
+
+    def _rollup_result(self, processor, stat_type, span):
+        if not self.use_rollups or processor.rollups is None:
+            return None
+        try:
+            with metrics.span("db", "rollup_stats"):
+                stats = self._rollup_stats(processor.rollups.range_stats(span[0], span[1]))
+        except Exception as e:
+            logger.warning("Không đọc được rollup, quét dữ liệu gốc: %s", e)
+            return None
+        return stats.summary(stat_type) if stats is not None else None
 
-    def call_claude_function(self, prompt):
+    async def _arollup_result(self, processor, stat_type, span):
+        if not self.use_rollups or processor.rollups is None:
+            return None
         try:
-            response = self.client.messages.create(
-                model="claude-3-5-haiku-20241022",
-                max_tokens=1000,
-                tools=self.tools,
-                messages=[{"role": "user", "content": prompt}],
-            )
+            with metrics.span("db", "rollup_stats"):
+                stats = self._rollup_stats(await processor.rollups.arange_stats(span[0], span[1]))
+        except Exception as e:
+            logger.warning("Không đọc được rollup, quét dữ liệu gốc: %s", e)
+            return None
+        return stats.summary(stat_type) if stats is not None else None
 
-            print(f'Claude Raw Response: {response}')
+    def statistical_analysis(self, stat_type: str, start_day: int, start_month: int, end_day: int, end_month: int,
+                             year: int, end_year: int = None):
+        """Thống kê một hoặc nhiều loại (vd. "mean,std,median" hoặc "all") trong một lượt đọc."""
+        stat_types = stats_engine.parse_stat_types(stat_type)
+        if stat_types is None:
+            return {"stat_type": stat_type, "result": dict(stats_engine.INVALID)}
+        stat_type = ",".join(stat_types)
+        time_range = self._time_range(start_day, start_month, end_day, end_month, year, end_year)
+        span = (*stats_time_range(time_range), stat_type)
+        cached = self._cached_result("statistical_analysis", span)
+        if cached is not None:
+            return cached
+        epoch = self.result_cache.epoch
+        result = self._index_result(timeseries_index.get_index(), stat_type, stat_types, span)
+        if result is None:
+            processor = storage.get_store()
+            result = self._rollup_result(processor, stat_type, span)
+        if result is None:
+            stats = StreamingStats(STATS_COLUMNS, stat_types)
+            with metrics.span("db", "scan_stats"):
+                for page in processor.iter_pollution_pages(span[0], span[1]):
+                    stats.add_rows(page)
+            result = stats.summary(stat_type)
+        self._store_result("statistical_analysis", span, result, epoch)
+        return result
+
+    # --- Bản async cho các endpoint web: I/O chờ trên event loop, việc CPU chạy trong thread pool ---
+
+    async def aquery_pollution_data_openai(self, year=None, month=None, day=None):
+        logger.debug("Đang truy vấn dữ liệu với: %s", {"year": year, "month": month, "day": day})
+        span = self._query_span(year, month, day)
+        cached = self._cached_result("query_pollution_data_openai", span)
+        if cached is not None:
+            return cached
+        epoch = self.result_cache.epoch
+        try:
+            data = self._index_query(year, month, day)
+            if data is None:
+                processor = await asyncio.to_thread(storage.get_store)
+                with metrics.span("db", "query"):
+                    data = await processor.aquery_pollution_data(year=year, month=month, day=day)
+            if data.empty:
+                return {"message": "Không có dữ liệu phù hợp với truy vấn."}
+            records = data.to_dict(orient="records")
+            self._store_result("query_pollution_data_openai", span, records, epoch)
+            return records
+        except Exception as e:
+            return {"error": f"Lỗi truy vấn Cassandra: {str(e)}"}
 
-            if not response or not isinstance(response.content, list) or len(response.content) == 0:
-                return {"error": "Không có phản hồi hợp lệ từ Claude."}
+    async def astatistical_analysis(self, stat_type: str, start_day: int, start_month: int, end_day: int,
+                                    end_month: int, year: int, end_year: int = None):
+        stat_types = stats_engine.parse_stat_types(stat_type)
+        if stat_types is None:
+            return {"stat_type": stat_type, "result": dict(stats_engine.INVALID)}
+        stat_type = ",".join(stat_types)
+        time_range = self._time_range(start_day, start_month, end_day, end_month, year, end_year)
+        span = (*stats_time_range(time_range), stat_type)
+        cached = self._cached_result("statistical_analysis", span)
+        if cached is not None:
+            return cached
+        epoch = self.result_cache.epoch
+        index = timeseries_index.get_index()
+        result = None
+        if index is not None:
+            result = await asyncio.to_thread(self._index_result, index, stat_type, stat_types, span)
+        if result is None:
+            processor = await asyncio.to_thread(storage.get_store)
+            result = await self._arollup_result(processor, stat_type, span)
+        if result is None:
+            # Mỗi trang được gộp ngay khi về nên event loop chỉ bận trong thời gian xử lý một trang.
+            stats = StreamingStats(STATS_COLUMNS, stat_types)
+            with metrics.span("db", "scan_stats"):
+                await processor.aconsume_pollution_range(span[0], span[1], stats.add_rows)
+            result = stats.summary(stat_type)
+        self._store_result("statistical_analysis", span, result, epoch)
+        return result
+
+    async def apredict_pollution_level(self, **arguments):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(inference_engine.get_executor(),
+                                          lambda: self.predict_pollution_level(**arguments))
+
+    async def ainsert_data_to_database(self, **arguments):
+        return await asyncio.to_thread(self.insert_data_to_database, **arguments)
+
+    @property
+    def function_map(self):
+        return {
+            "query_pollution_data_openai": self.query_pollution_data_openai,
+            "predict_pollution_level": self.predict_pollution_level,
+            "insert_data_to_database": self.insert_data_to_database,
+            "statistical_analysis": self.statistical_analysis
+        }
 
-            if isinstance(response.content, list) and response.content:
-                tool_use_block = next((block for block in response.content if block.type == "tool_use"), None)
+    @property
+    def async_function_map(self):
+        return {
+            "query_pollution_data_openai": self.aquery_pollution_data_openai,
+            "predict_pollution_level": self.apredict_pollution_level,
+            "insert_data_to_database": self.ainsert_data_to_database,
+            "statistical_analysis": self.astatistical_analysis
+        }
 
-                if getattr(tool_use_block, 'type', None) == 'tool_use':
-                    function_name = getattr(tool_use_block, 'name', None)
-                    arguments = getattr(tool_use_block, 'input', {})
+    def _tool_request(self, prompt):
+        return {
+            "model": CLAUDE_MODEL,
+            "max_tokens": 1000,
+            "tools": self.tools,
+            "messages": [{"role": "user", "content": prompt}],
+        }
 
-                    if not function_name:
-                        return {"error": "Không tìm thấy tên hàm."}
+    @staticmethod
+    def _parse_tool_call(response):
+        """Trả về (tên hàm, tham số, lỗi) từ phản hồi chọn tool của Claude."""
+        if not response or not isinstance(response.content, list) or len(response.content) == 0:
+            return None, None, {"error": "Không có phản hồi hợp lệ từ Claude."}
+
+        tool_use_block = next((block for block in response.content if block.type == "tool_use"), None)
+        if getattr(tool_use_block, 'type', None) != 'tool_use':
+            return None, None, {"error": "Dữ liệu nhập vào không hợp lệ."}
+
+        function_name = getattr(tool_use_block, 'name', None)
+        arguments = getattr(tool_use_block, 'input', {})
+        if not function_name:
+            return None, None, {"error": "Không tìm thấy tên hàm."}
+        if not isinstance(arguments, dict):
+            arguments = {}
+        return function_name, arguments, None
+
+    def _remember_tool(self, prompt, function_name, arguments):
+        if function_name in self.function_map:
+            self.tool_cache.store(prompt, function_name, arguments)
+
+    def _select_tool(self, prompt):
+        """(tên hàm, tham số, lỗi): lấy từ cache/bộ luật, nếu không có thì hỏi Claude."""
+        with metrics.span("tool_selection", "cache"):
+            cached = self.tool_cache.lookup(prompt)
+        if cached is not None:
+            return cached[0], cached[1], None
+
+        with metrics.span("tool_selection", "llm"):
+            response = self.client.messages.create(**self._tool_request(prompt))
+
+        logger.debug("Claude Raw Response: %s", metrics.preview(response))
+
+        function_name, arguments, error = self._parse_tool_call(response)
+        if error is None:
+            self._remember_tool(prompt, function_name, arguments)
+        return function_name, arguments, error
+
+    async def _aselect_tool(self, prompt):
+        with metrics.span("tool_selection", "cache"):
+            cached = self.tool_cache.lookup(prompt)
+        if cached is not None:
+            return cached[0], cached[1], None
+
+        with metrics.span("tool_selection", "llm"):
+            response = await self.async_client.messages.create(**self._tool_request(prompt))
+
+        logger.debug("Claude Raw Response: %s", metrics.preview(response))
+
+        function_name, arguments, error = self._parse_tool_call(response)
+        if error is None:
+            self._remember_tool(prompt, function_name, arguments)
+        return function_name, arguments, error
+
+    @staticmethod
+    def _log_tool_result(function_name, arguments, result):
+        outcome = metrics.record_tool(function_name, result)
+        if outcome == "error":
+            logger.warning('Hàm "%s" lỗi: %s, với tham số: %s', function_name, result["error"], arguments)
+        else:
+            logger.debug('Kết quả từ hàm "%s" (%s): %s, với tham số: %s', function_name, outcome,
+                         metrics.preview(result), arguments)
 
-                    if not isinstance(arguments, dict):
-                        arguments = {}
+    def call_claude_function(self, prompt):
+        try:
+            function_name, arguments, error = self._select_tool(prompt)
+            if error:
+                return error
+
+            function = self.function_map.get(function_name)
+            if function is None:
+                return {"error": "Hàm không hợp lệ."}
+            with metrics.span("tool", function_name):
+                result = function(**arguments)
+            self._log_tool_result(function_name, arguments, result)
+            return result
 
-                    function_map = {
-                        "query_pollution_data_openai": self.query_pollution_data_openai,
-                        "predict_pollution_level": self.predict_pollution_level,
-                        "insert_data_to_database": self.insert_data_to_database,
-                        "statistical_analysis": self.statistical_analysis
-                    }
+        except Exception as e:
+            return {"error": f"Lỗi khi gọi Claude: {str(e)}"}
 
-                    if function_name in function_map:
-                        result = function_map[function_name](**arguments)
-                    else:
-                        result = {"error": "Hàm không hợp lệ."}
+    async def _arun_tool(self, function_name, arguments):
+        function = self.async_function_map.get(function_name)
+        if function is None:
+            return {"error": "Hàm không hợp lệ."}
+        with metrics.span("tool", function_name):
+            result = await function(**arguments)
+        self._log_tool_result(function_name, arguments, result)
+        return result
 
-                    print(f'Kết quả từ hàm "{function_name}": {result}, với tham số: {arguments}')
-                    return result
+    async def acall_claude_function(self, prompt):
+        try:
+            function_name, arguments, error = await self._aselect_tool(prompt)
+            if error:
+                return error
+            return await self._arun_tool(function_name, arguments)
 
         except Exception as e:
             return {"error": f"Lỗi khi gọi Claude: {str(e)}"}
 
-        return {"error": "Dữ liệu nhập vào không hợp lệ."}
-
-    def rewrite_result_with_advice(self, result, source=None):
-
-        if source is None:
-            if isinstance(result, list):
-                source = "query"
-            elif isinstance(result, dict) and "pollution_level" in result:
-                source = "predict"
-            elif isinstance(result, dict) and result.get("message") in [
-                                                                        "Hàm đã được thực thi!",
-                                                                        "Dữ liệu đã được thêm vào database.",
-                                                                        "Đã thêm dữ liệu thành công"]:
-                source = "insert"
-            elif isinstance(result, dict) and result.get("stat_type") in ["mean", "median", "max","min","count","std"]:
-                source = "stats"
-        else:
-                source = "unknown"
-        print("Source:", source)
+    async def astream_query(self, prompt):
+        """Các sự kiện (tên, dữ liệu) của một câu hỏi, gửi ngay khi có: ``tool_selected``,
+        ``tool_result``, các đoạn ``answer`` của câu trả lời rồi ``done``; lỗi là sự kiện ``error``."""
+        try:
+            function_name, arguments, error = await self._aselect_tool(prompt)
+            if error:
+                yield "error", error
+                return
+            yield "tool_selected", {"tool": function_name, "arguments": arguments}
+            result = await self._arun_tool(function_name, arguments)
+        except Exception as e:
+            yield "error", {"error": f"Lỗi khi gọi Claude: {str(e)}"}
+            return
+        source = self.detect_source(result)
+        yield "tool_result", {"source": source, "result": result}
+        answer = []
+        try:
+            async for text in self.astream_rewrite(result, source):
+                answer.append(text)
+                yield "answer", {"text": text}
+        except Exception as e:
+            # Luồng Claude đứt giữa chừng: báo lỗi thay vì gửi thông báo lỗi như một đoạn câu trả lời.
+            logger.warning("Lỗi khi stream câu trả lời (%s): %s", source, e)
+            yield "error", {"error": f"Lỗi khi viết lại kết quả: {str(e)}"}
+            return
+        # Kết quả không cần viết lại (vd. lỗi của tool) được trả nguyên như /api/query.
+        yield "done", {"response": "".join(answer) if answer else result}
+
+    @staticmethod
+    def detect_source(result):
+        if isinstance(result, list):
+            return "query"
+        elif isinstance(result, dict) and "pollution_level" in result:
+            return "predict"
+        elif isinstance(result, dict) and result.get("message") in [
+                                                                    "Hàm đã được thực thi!",
+                                                                    "Dữ liệu đã được thêm vào database.",
+                                                                    "Đã thêm dữ liệu thành công"]:
+            return "insert"
+        elif isinstance(result, dict) and stats_engine.parse_stat_types(result.get("stat_type")) is not None:
+            return "stats"
+        return "unknown"
+
+    def _local_answer(self, result, source):
+        """Câu trả lời định dạng sẵn (không gọi Claude) nếu nguồn không nằm trong LLM_REWRITE_SOURCES."""
+        if source in self.llm_rewrite_sources:
+            return None
+        with metrics.span("rewrite", f"local:{source}"):
+            return answer_templates.render(source, result)
+
+    def _rewrite_prompt(self, result, source):
+        """Prompt viết lại kết quả theo nguồn; None nếu kết quả không cần viết lại."""
         if source == "query":
             rewriting_prompt = f"""
             Bạn là chuyên gia phân tích dữ liệu môi trường.   
@@ -333,27 +653,91 @@ class PollutionQueryHandler:
                 rewriting_prompt = f"""
                 Viết lại tổng số bản ghi dữ liệu (`count`):{total_records}
                 """
+            elif stat_type and "," in stat_type:
+                rewriting_prompt = f"""
+                Ghi lại tất cả các kết quả thống kê sau của các chỉ số ô nhiễm và không nhận xét:
+                {answer_templates.render_stats(result)}
+                """
             else:
 
                 rewriting_prompt = "Dữ liệu không hợp lệ hoặc không thể diễn giải."
 
         else:
+            return None
+        return rewriting_prompt
+
+    @staticmethod
+    def _rewrite_request(rewriting_prompt):
+        return {
+            "model": CLAUDE_MODEL,
+            "max_tokens": 500,
+            "messages": [{"role": "user", "content": rewriting_prompt}],
+        }
+
+    @staticmethod
+    def _response_text(response):
+        if hasattr(response, 'content') and isinstance(response.content, list):
+            text_blocks = [block.text for block in response.content if getattr(block, 'type', None) == 'text']
+            return "\n".join(text_blocks)
+        return "Không thể viết lại kết quả."
+
+    def rewrite_result_with_advice(self, result, source=None):
+        source = source or self.detect_source(result)
+        logger.debug("Source: %s", source)
+        local_answer = self._local_answer(result, source)
+        if local_answer is not None:
+            return local_answer
+        rewriting_prompt = self._rewrite_prompt(result, source)
+        if rewriting_prompt is None:
             return result
         try:
-            print("Rewriting Prompt:", rewriting_prompt)
-
-            response = self.client.messages.create(
-                model="claude-3-5-haiku-20241022",
-                max_tokens=500,
-                messages=[{"role": "user", "content": rewriting_prompt}],
-            )
-            print(result)
-            if hasattr(response, 'content') and isinstance(response.content, list):
-                text_blocks = [block.text for block in response.content if getattr(block, 'type', None) == 'text']
-                return "\n".join(text_blocks)
+            logger.debug("Rewriting Prompt: %s", metrics.preview(rewriting_prompt, 1000))
+            with metrics.span("rewrite", f"llm:{source}"):
+                response = self.client.messages.create(**self._rewrite_request(rewriting_prompt))
+            return self._response_text(response)
         except Exception as e:
             return f"Lỗi khi viết lại kết quả: {str(e)}"
-        return "Không thể viết lại kết quả."
+
+    async def arewrite_result_with_advice(self, result, source=None):
+        source = source or self.detect_source(result)
+        logger.debug("Source: %s", source)
+        local_answer = self._local_answer(result, source)
+        if local_answer is not None:
+            return local_answer
+        rewriting_prompt = self._rewrite_prompt(result, source)
+        if rewriting_prompt is None:
+            return result
+        try:
+            logger.debug("Rewriting Prompt: %s", metrics.preview(rewriting_prompt, 1000))
+            with metrics.span("rewrite", f"llm:{source}"):
+                response = await self.async_client.messages.create(**self._rewrite_request(rewriting_prompt))
+            return self._response_text(response)
+        except Exception as e:
+            return f"Lỗi khi viết lại kết quả: {str(e)}"
+
+    async def astream_rewrite(self, result, source=None):
+        """Như ``arewrite_result_with_advice`` nhưng trả từng đoạn văn bản ngay khi Claude sinh ra
+        (``messages.stream``); câu trả lời định dạng sẵn được trả một lần. Không trả gì nếu kết
+        quả không cần viết lại. Lỗi từ Claude được ném ra để ``astream_query`` gửi sự kiện ``error``."""
+        source = source or self.detect_source(result)
+        logger.debug("Source: %s", source)
+        local_answer = self._local_answer(result, source)
+        if local_answer is not None:
+            yield local_answer
+            return
+        rewriting_prompt = self._rewrite_prompt(result, source)
+        if rewriting_prompt is None:
+            return
+        logger.debug("Rewriting Prompt: %s", metrics.preview(rewriting_prompt, 1000))
+        first_token = True
+        with metrics.span("rewrite", f"llm_stream:{source}") as span:
+            async with self.async_client.messages.stream(**self._rewrite_request(rewriting_prompt)) as stream:
+                async for text in stream.text_stream:
+                    if first_token:
+                        metrics.STAGE_SECONDS.observe(time.perf_counter() - span.start, stage="rewrite",
+                                                      name=f"first_token:{source}")
+                        first_token = False
+                    yield text
 
 if __name__ == "__main__":
     # Validate configuration before starting
@@ -364,3 +748,4 @@ if __name__ == "__main__":
     result = handler.call_claude_function(prompt)
     final_result = handler.rewrite_result_with_advice(result)
     print(final_result)
+    db_pool.shutdown_pool()
@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import metrics
+from config import Config
+
+FEATURE_NAMES = ["Day", "Month", "Year", "Hour", "PT08_S1_CO", "C6H6_GT", "PT08_S5_O3", "PT08_S2_NMHC",
+                 "PT08_S4_NO2"]
+POLLUTION_LEVELS = ["Thấp", "Trung bình", "Cao", "Nguy hiểm", "Rất nguy hại"]
+
+logger = metrics.get_logger("inference_engine")
+
+
+class InferenceEngine:
+    """Nạp mô hình một lần và phục vụ dự đoán từ bộ nhớ.
+
+    Backend ``numpy`` chạy forward pass từ trọng số đã xuất ra .npz (xem
+    numpy_model.py), không cần import TensorFlow. Backend ``keras`` bọc lời gọi
+    trực tiếp ``model(x, training=False)`` trong một ``tf.function`` có chữ ký cố
+    định và chạy thử một lần để trace sẵn đồ thị. ``auto`` dùng numpy nếu có file
+    .npz, ngược lại dùng keras.
+    """
+
+    def __init__(self, model_path=None, numpy_model_path=None, backend=None, latency_window=2000):
+        self.model_path = model_path or Config.MODEL_PATH
+        self.numpy_model_path = numpy_model_path or Config.NUMPY_MODEL_PATH
+        self.backend = backend or Config.MODEL_BACKEND
+        self.model = None
+        self._forward = None
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)
+        self.load_seconds = None
+        self.predictions = 0
+
+    @property
+    def loaded(self):
+        return self._forward is not None
+
+    def load(self):
+        if self._forward is not None:
+            return self
+        with self._lock:
+            if self._forward is None:
+                start = time.perf_counter()
+                with metrics.span("model_load", self.resolved_backend()):
+                    if self.resolved_backend() == "numpy":
+                        from numpy_model import NumpyModel
+
+                        path = self.numpy_model_path
+                        model = NumpyModel.load(path)
+                        forward = model.predict_proba
+                    else:
+                        import tensorflow as tf
+
+                        path = self.model_path
+                        model = tf.keras.models.load_model(path, compile=False)
+                        forward = tf.function(
+                            lambda x: model(x, training=False),
+                            input_signature=[tf.TensorSpec([None, len(FEATURE_NAMES)], tf.float32)],
+                        )
+                    # Chạy thử để trace đồ thị / làm nóng cache trước khi nhận request thật.
+                    forward(np.zeros((1, len(FEATURE_NAMES)), dtype=np.float32))
+                self.model = model
+                self._forward = forward
+                self.load_seconds = time.perf_counter() - start
+                logger.info("Đã nạp mô hình %s (%s) trong %.2fs", path, self.resolved_backend(), self.load_seconds)
+        return self
+
+    def resolved_backend(self):
+        if self.backend == "auto":
+            return "numpy" if os.path.exists(self.numpy_model_path) else "keras"
+        return self.backend
+
+    def predict_proba(self, features):
+        """Xác suất các lớp cho một mảng đặc trưng dạng (n, 9)."""
+        self.load()
+        x = np.asarray(features, dtype=np.float32).reshape(-1, len(FEATURE_NAMES))
+        return np.asarray(self._forward(x))
+
+    def predict(self, features):
+        """Dự đoán lớp ô nhiễm cho một dòng đặc trưng; ghi nhận độ trễ (không tính lần nạp)."""
+        self.load()
+        start = time.perf_counter()
+        predicted_class = int(np.argmax(self.predict_proba(features), axis=1)[0])
+        self._latencies.append(time.perf_counter() - start)
+        self.predictions += 1
+        return predicted_class
+
+    def predict_classes(self, features):
+        """Dự đoán lớp cho cả batch (n, 9); mỗi batch được ghi nhận là một lần đo độ trễ."""
+        self.load()
+        with metrics.span("inference", "predict_batch") as span:
+            classes = np.argmax(self.predict_proba(features), axis=1).astype(int)
+        self._latencies.append(span.seconds)
+        self.predictions += len(classes)
+        return classes
+
+    def latency_percentiles(self):
+        if not self._latencies:
+            return {"count": 0}
+        samples = np.fromiter(self._latencies, dtype=np.float64) * 1000
+        p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+        return {"count": len(samples), "p50_ms": round(float(p50), 3), "p90_ms": round(float(p90), 3),
+                "p99_ms": round(float(p99), 3)}
+
+    def stats(self):
+        return {
+            "backend": self.resolved_backend(),
+            "model_path": self.numpy_model_path if self.resolved_backend() == "numpy" else self.model_path,
+            "loaded": self.loaded,
+            "load_seconds": self.load_seconds,
+            "predictions": self.predictions,
+            "latency": self.latency_percentiles(),
+        }
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = InferenceEngine()
+    return _engine
+
+
+_executor = None
+
+
+def get_executor():
+    """Thread pool có giới hạn cho phần việc CPU của mô hình, để request web không
+    chiếm hết thread pool mặc định của event loop."""
+    global _executor
+    if _executor is None:
+        with _engine_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(1, Config.MODEL_WORKERS),
+                                               thread_name_prefix="model")
+    return _executor
@@ -0,0 +1,319 @@
+"""
+📡 Nhận số đo cảm biến theo thời gian thực và ghi xuống kho lưu trữ theo lô.
+
+Mỗi request /api/ingest mang một lô số đo thô theo bố cục AirQuality1.csv (Date, Time,
+PT08.S1(CO), C6H6(GT), ...), dạng NDJSON hoặc CSV. Lô được tính nhãn AQI ngay trên
+server bằng cùng bảng điểm gãy với AQIProcessor (aqi_engine), rồi đưa vào bộ đệm
+trong bộ nhớ. Một tác vụ nền ghi bộ đệm xuống ``storage.get_store()`` khi đủ
+``batch_rows`` dòng hoặc khi dòng cũ nhất đã chờ ``flush_seconds`` giây.
+
+Khi bộ đệm đầy (``max_buffered_rows``), request chờ tối đa ``backpressure_seconds``
+để có chỗ trống rồi bị từ chối (HTTP 429), thay vì để bộ nhớ tăng không giới hạn khi
+kho lưu trữ chậm hoặc đang lỗi; lô ghi lỗi được giữ lại và thử lại.
+
+Giá trị cảm biến thiếu (-200 hoặc rỗng) được điền bằng trung bình các giá trị hợp lệ
+đã nhận từ trước (như ``AQIProcessor.fill_missing_values`` nhưng tính dần theo luồng
+dữ liệu); dòng thiếu ngày/giờ hoặc chưa có trung bình để điền bị loại.
+"""
+
+import asyncio
+import io
+import json
+import threading
+import time
+from collections import deque
+
+import metrics
+from config import Config
+
+logger = metrics.get_logger("ingest")
+
+# Cột số đo cảm biến, giống COLUMNS_TO_FILL của process_data_training (module đó nạp pandas
+# nên chỉ được import khi có request ingest đầu tiên).
+SENSOR_COLUMNS = ["PT08.S1(CO)", "C6H6(GT)", "PT08.S5(O3)", "PT08.S2(NMHC)", "PT08.S4(NO2)"]
+REQUIRED_COLUMNS = ["Date", "Time"] + SENSOR_COLUMNS
+
+
+class BufferFull(Exception):
+    """Bộ đệm không còn chỗ cho lô mới trong thời gian chờ cho phép."""
+
+
+class WaitTimeout(Exception):
+    """Lô đã vào bộ đệm nhưng chưa được ghi trong ``wait_seconds``; ``ticket`` so với
+    ``flushed_seq`` trong ``stats()`` để biết khi nào lô đã ghi xong."""
+
+    def __init__(self, ticket, message):
+        super().__init__(message)
+        self.ticket = ticket
+
+
+def read_readings(body, content_type=""):
+    """DataFrame số đo thô từ body NDJSON hoặc CSV (phân cách ``;`` với dấu thập phân ``,``
+    như AirQuality1.csv, hoặc CSV phân cách ``,`` thông thường)."""
+    import pandas as pd
+
+    text = body.decode("utf-8-sig") if isinstance(body, bytes) else body
+    if not text.strip():
+        return pd.DataFrame(columns=REQUIRED_COLUMNS)
+    if "json" in content_type or text.lstrip().startswith("{"):
+        try:
+            records = [json.loads(line) for line in text.splitlines() if line.strip()]
+        except json.JSONDecodeError as e:
+            raise ValueError(f"NDJSON không hợp lệ: {e}")
+        frame = pd.DataFrame.from_records(records)
+    else:
+        header = text.split("\n", 1)[0]
+        semicolon = ";" in header
+        frame = pd.read_csv(io.StringIO(text), sep=";" if semicolon else ",", decimal="," if semicolon else ".",
+                            dtype={"Date": str, "Time": str})
+        frame = frame.loc[:, ~frame.columns.str.startswith("Unnamed")]
+    missing = [column for column in REQUIRED_COLUMNS if column not in frame.columns]
+    if missing:
+        raise ValueError(f"Thiếu cột: {', '.join(missing)}")
+    return frame
+
+
+def _numeric(series):
+    import pandas as pd
+
+    if series.dtype == object:
+        series = series.astype(str).str.strip().str.replace(",", ".", regex=False)
+    return pd.to_numeric(series, errors="coerce")
+
+
+class Ingestor:
+    """Bộ đệm ghi theo lô cho /api/ingest; các phương thức async chạy trên event loop của web app."""
+
+    def __init__(self, store_factory=None, batch_rows=None, flush_seconds=None, max_buffered_rows=None,
+                 backpressure_seconds=None, wait_seconds=None, breakpoints=None, rate_window=60.0):
+        import storage
+
+        self.store_factory = store_factory or storage.get_store
+        self.batch_rows = batch_rows or Config.INGEST_BATCH_ROWS
+        self.flush_seconds = Config.INGEST_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self.max_buffered_rows = max_buffered_rows or Config.INGEST_MAX_BUFFERED_ROWS
+        self.backpressure_seconds = (Config.INGEST_BACKPRESSURE_SECONDS if backpressure_seconds is None
+                                     else backpressure_seconds)
+        self.wait_seconds = Config.INGEST_WAIT_SECONDS if wait_seconds is None else wait_seconds
+        self.breakpoints = breakpoints
+        self.rate_window = rate_window
+        self.means = None
+        self._means_lock = threading.Lock()
+        # (thời điểm nhận, số thứ tự dòng cuối, DataFrame đã xử lý) theo thứ tự nhận.
+        self._buffer = deque()
+        self.buffered = 0
+        self._received_seq = 0
+        self._flushed_seq = 0
+        self._changed = None
+        self._task = None
+        self._stopping = False
+        self._flushed_at = deque()
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.flush_errors = 0
+        self.throttled = 0
+        self.last_flush = None
+
+    # --- Xử lý số đo ---
+
+    def prepare(self, raw):
+        """(DataFrame dạng processed_AQI_data.csv kèm AQI_Label, số dòng bị loại) từ số đo thô."""
+        import pandas as pd
+
+        import aqi_engine
+        from process_data_training import MISSING_VALUE, OUTPUT_COLUMNS, ColumnMeans
+
+        dates = pd.to_datetime(raw["Date"].astype(str).str.strip(), format="%d/%m/%Y", errors="coerce")
+        hours = pd.to_numeric(raw["Time"].astype(str).str.strip().str.split(r"[.:]", regex=True).str[0],
+                              errors="coerce")
+        sensors = pd.DataFrame({column: _numeric(raw[column]) for column in SENSOR_COLUMNS}, index=raw.index)
+        sensors = sensors.mask(sensors == MISSING_VALUE)
+        with self._means_lock:
+            if self.means is None:
+                self.means = ColumnMeans()
+            self.means.update(sensors)
+            means = self.means.means()
+        sensors = sensors.fillna(means)
+        valid = dates.notna() & hours.between(0, 23) & sensors.notna().all(axis=1)
+        frame = sensors[valid].copy()
+        frame["Day"] = dates[valid].dt.day
+        frame["Month"] = dates[valid].dt.month
+        frame["Year"] = dates[valid].dt.year
+        frame["Hour"] = hours[valid].astype(int)
+        aqi = aqi_engine.compute_aqi_frame(frame, self.breakpoints)["AQI"]
+        frame["AQI_Label"] = aqi_engine.label_aqi(aqi)
+        return frame[OUTPUT_COLUMNS].reset_index(drop=True), int((~valid).sum())
+
+    # --- Bộ đệm ---
+
+    def _condition(self):
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    async def submit(self, frame, rejected=0, wait=False):
+        """Đưa lô đã xử lý vào bộ đệm; chờ có chỗ (tối đa ``backpressure_seconds``) nếu bộ đệm đầy.
+        ``wait=True`` chờ tới khi lô đã được ghi xuống kho lưu trữ, tối đa ``wait_seconds`` rồi
+        báo ``WaitTimeout`` (lô vẫn nằm trong bộ đệm và sẽ được ghi). Trả về số dòng nhận."""
+        self.rejected += rejected
+        if frame.empty:
+            return 0
+        if len(frame) > self.max_buffered_rows:
+            raise ValueError(f"Lô {len(frame)} dòng lớn hơn bộ đệm ({self.max_buffered_rows} dòng)")
+        changed = self._condition()
+        async with changed:
+            if self.buffered + len(frame) > self.max_buffered_rows:
+                try:
+                    await asyncio.wait_for(changed.wait_for(
+                        lambda: self.buffered + len(frame) <= self.max_buffered_rows), self.backpressure_seconds)
+                except asyncio.TimeoutError:
+                    self.throttled += 1
+                    raise BufferFull(f"Bộ đệm đầy ({self.buffered}/{self.max_buffered_rows} dòng)")
+            self._received_seq += len(frame)
+            ticket = self._received_seq
+            self._buffer.append((time.monotonic(), ticket, frame))
+            self.buffered += len(frame)
+            self.accepted += len(frame)
+            changed.notify_all()
+            if wait:
+                try:
+                    await asyncio.wait_for(changed.wait_for(lambda: self._flushed_seq >= ticket),
+                                           self.wait_seconds)
+                except asyncio.TimeoutError:
+                    raise WaitTimeout(ticket, f"Lô chưa được ghi sau {self.wait_seconds}s") from None
+        return len(frame)
+
+    def _take_batch(self):
+        entries, rows = [], 0
+        while self._buffer and (not entries or rows + len(self._buffer[0][2]) <= self.batch_rows):
+            entries.append(self._buffer.popleft())
+            rows += len(entries[-1][2])
+        return entries
+
+    def _due(self, now):
+        if not self._buffer:
+            return None
+        if self.buffered >= self.batch_rows:
+            return 0.0
+        return max(self._buffer[0][0] + self.flush_seconds - now, 0.0)
+
+    async def flush_once(self):
+        """Ghi một lô từ đầu bộ đệm; lỗi ghi đưa lô trở lại đầu bộ đệm. Trả về số dòng đã ghi."""
+        changed = self._condition()
+        async with changed:
+            entries = self._take_batch()
+        if not entries:
+            return 0
+        import pandas as pd
+
+        batch = pd.concat([frame for _, _, frame in entries], ignore_index=True)
+        try:
+            store = await asyncio.to_thread(self.store_factory)
+            with metrics.span("db", "ingest_flush") as span:
+                result = await asyncio.to_thread(store.insert_data, batch)
+        except Exception:
+            async with changed:
+                self._buffer.extendleft(reversed(entries))
+            self.flush_errors += 1
+            raise
+        failed = len(result.get("failed_rows", ())) if isinstance(result, dict) else 0
+        now = time.monotonic()
+        oldest = entries[0][0]
+        async with changed:
+            self.buffered -= len(batch)
+            self._flushed_seq = entries[-1][1]
+            changed.notify_all()
+        self.batches += 1
+        self.written += len(batch) - failed
+        self.failed += failed
+        self._flushed_at.append((now, len(batch) - failed))
+        self.last_flush = {"rows": len(batch), "failed": failed, "seconds": round(span.seconds, 4),
+                           "waited_seconds": round(now - oldest, 4)}
+        return len(batch) - failed
+
+    async def run(self):
+        """Vòng lặp ghi nền: ghi khi đủ ``batch_rows`` hoặc dòng cũ nhất chờ quá ``flush_seconds``."""
+        changed = self._condition()
+        failures = 0
+        while True:
+            async with changed:
+                delay = self._due(time.monotonic())
+                while not self._stopping and (delay is None or delay > 0):
+                    try:
+                        await asyncio.wait_for(changed.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    delay = self._due(time.monotonic())
+                if self._stopping:
+                    return
+            try:
+                await self.flush_once()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                logger.warning("Ghi lô ingest lỗi (lần %s), thử lại: %s", failures, e)
+                async with changed:
+                    try:
+                        await asyncio.wait_for(changed.wait_for(lambda: self._stopping),
+                                               min(0.5 * 2 ** failures, 30.0))
+                    except asyncio.TimeoutError:
+                        pass
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self
+
+    async def stop(self):
+        """Dừng vòng lặp nền (sau khi lô đang ghi xong, không hủy giữa chừng) rồi ghi nốt bộ đệm;
+        lỗi ở bước này được ghi log và phần dữ liệu còn lại bị bỏ."""
+        if self._task is not None:
+            changed = self._condition()
+            async with changed:
+                self._stopping = True
+                changed.notify_all()
+            await self._task
+            self._task = None
+        while self._buffer:
+            try:
+                await self.flush_once()
+            except Exception as e:
+                logger.error("Không ghi được %s dòng ingest còn trong bộ đệm: %s", self.buffered, e)
+                break
+
+    # --- Thống kê ---
+
+    def rate(self):
+        """Số dòng ghi thành công mỗi giây trong ``rate_window`` giây gần nhất."""
+        now = time.monotonic()
+        while self._flushed_at and self._flushed_at[0][0] < now - self.rate_window:
+            self._flushed_at.popleft()
+        if not self._flushed_at:
+            return 0.0
+        return sum(rows for _, rows in self._flushed_at) / self.rate_window
+
+    def lag(self):
+        """Số giây dòng cũ nhất còn trong bộ đệm đã chờ."""
+        return time.monotonic() - self._buffer[0][0] if self._buffer else 0.0
+
+    def stats(self):
+        return {
+            "running": self._task is not None,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "written": self.written,
+            "failed": self.failed,
+            "buffered": self.buffered,
+            "flushed_seq": self._flushed_seq,
+            "max_buffered_rows": self.max_buffered_rows,
+            "batches": self.batches,
+            "flush_errors": self.flush_errors,
+            "throttled": self.throttled,
+            "rows_per_sec": round(self.rate(), 2),
+            "lag_seconds": round(self.lag(), 3),
+            "last_flush": self.last_flush,
+        }
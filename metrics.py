@@ -0,0 +1,325 @@
+"""
+📈 Đo độ trễ theo từng giai đoạn và ghi log có mức/lấy mẫu.
+
+``span(stage, name)`` đo thời gian một giai đoạn (chọn tool, gọi Claude, chạy tool,
+đọc/ghi database, nạp mô hình...) và ghi vào histogram ``aqm_stage_duration_seconds``;
+``render()`` xuất mọi metric theo định dạng văn bản của Prometheus cho endpoint
+/metrics. Metric được giữ trong bộ nhớ của từng tiến trình: khi chạy nhiều worker,
+mỗi lần scrape chỉ thấy số liệu của worker trả lời.
+
+Log đi qua module ``logging`` (logger ``aqm.*``) thay cho ``print``: mức log lấy từ
+``Config.LOG_LEVEL``; bản ghi DEBUG/INFO chỉ được giữ với tỉ lệ ``Config.LOG_SAMPLE_RATE``
+(WARNING trở lên luôn được ghi), để log của các request nóng không làm chậm worker.
+"""
+
+import functools
+import inspect
+import logging
+import random
+import sys
+import threading
+import time
+
+from config import Config
+
+# Ngưỡng histogram (giây): từ lần tra cache vài micro giây tới lần gọi Claude vài giây.
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.0075, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25,
+                   0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Bộ đếm tăng dần theo nhãn."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, "") for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Histogram:
+    """Histogram với các ngưỡng cố định (lưu số lần đo rơi vào từng khoảng, tổng và số lần)."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        position = len(self.buckets)
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                position = index
+                break
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][position] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self):
+        """{nhãn: (số lần theo khoảng, tổng, số lần)}."""
+        with self._lock:
+            return {key: (list(state[0]), state[1], state[2]) for key, state in self._values.items()}
+
+    def quantile(self, q, **labels):
+        """Phân vị ước lượng từ các khoảng (nội suy tuyến tính như histogram_quantile)."""
+        state = self.snapshot().get(tuple(labels.get(name, "") for name in self.labelnames))
+        if state is None or state[2] == 0:
+            return None
+        counts, _, total = state
+        rank = q * total
+        cumulative = 0
+        lower = 0.0
+        for index, bound in enumerate(self.buckets):
+            if cumulative + counts[index] >= rank:
+                inside = (rank - cumulative) / counts[index] if counts[index] else 0.0
+                return lower + (bound - lower) * inside
+            cumulative += counts[index]
+            lower = bound
+        return self.buckets[-1]
+
+    def samples(self):
+        samples = []
+        for key, (counts, total, count) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                samples.append((f"{self.name}_bucket", _format_labels(self.labelnames, key, le), cumulative))
+            labels = _format_labels(self.labelnames, key)
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class CallbackMetric:
+    """Metric đọc giá trị lúc scrape từ một hàm trả về số hoặc {giá trị nhãn: số}; dùng cho
+    các bộ đếm sẵn có trong cache, chỉ mục, batcher... (``kind`` là gauge hoặc counter)."""
+
+    def __init__(self, name, help_text, function, labelname=None, kind="gauge"):
+        self.name = name
+        self.help = help_text
+        self.function = function
+        self.labelname = labelname
+        self.kind = kind
+
+    def samples(self):
+        value = self.function()
+        if value is None:
+            return []
+        if self.labelname is None:
+            return [(self.name, "", value)]
+        return [(self.name, _format_labels((self.labelname,), (label,)), item)
+                for label, item in sorted(value.items())]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def callback(self, name, help_text, function, labelname=None, kind="gauge"):
+        """Đăng ký (hoặc thay) metric tính lúc scrape."""
+        with self._lock:
+            self._metrics[name] = CallbackMetric(name, help_text, function, labelname, kind)
+            return self._metrics[name]
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                logger.warning("Không đọc được metric %s: %s", metric.name, e)
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "aqm_stage_duration_seconds", "Thời gian từng giai đoạn xử lý (stage) theo tên (name)", ("stage", "name"))
+STAGE_ERRORS = REGISTRY.counter(
+    "aqm_stage_errors_total", "Số lần một giai đoạn kết thúc bằng exception", ("stage", "name"))
+TOOL_CALLS = REGISTRY.counter(
+    "aqm_tool_calls_total", "Số lần chạy tool theo kết quả (ok, empty, error)", ("tool", "outcome"))
+HTTP_SECONDS = REGISTRY.histogram(
+    "aqm_http_request_duration_seconds", "Thời gian xử lý request HTTP", ("method", "route", "status"))
+
+
+def render():
+    return REGISTRY.render()
+
+
+# --- Logging ---
+
+class SamplingFilter(logging.Filter):
+    """Giữ ngẫu nhiên một tỉ lệ ``rate`` bản ghi dưới WARNING; WARNING trở lên luôn được giữ."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def configure_logging(level=None, sample_rate=None):
+    """Gắn handler stderr cho logger ``aqm`` (một lần, hoặc lại khi truyền tham số)."""
+    global _configured
+    with _configure_lock:
+        if _configured and level is None and sample_rate is None:
+            return
+        root = logging.getLogger("aqm")
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        handler.addFilter(SamplingFilter(Config.LOG_SAMPLE_RATE if sample_rate is None else sample_rate))
+        root.addHandler(handler)
+        root.setLevel((level or Config.LOG_LEVEL).upper())
+        root.propagate = False
+        _configured = True
+
+
+def get_logger(name):
+    configure_logging()
+    return logging.getLogger(f"aqm.{name}")
+
+
+def preview(value, limit=300):
+    """Chuỗi rút gọn của ``value`` cho log (kết quả truy vấn có thể dài hàng nghìn ký tự)."""
+    text = str(value)
+    return text if len(text) <= limit else f"{text[:limit]}… ({len(text)} ký tự)"
+
+
+logger = get_logger("metrics")
+
+
+# --- Span ---
+
+class Span:
+    """Đo một giai đoạn; dùng được trong cả code đồng bộ lẫn async (``with`` quanh ``await``).
+    ``name`` có thể gán lại bên trong khối khi chỉ biết nhánh thực tế lúc chạy (vd. cache hay llm)."""
+
+    __slots__ = ("stage", "name", "start", "seconds")
+
+    def __init__(self, stage, name=""):
+        self.stage = stage
+        self.name = name
+        self.start = None
+        self.seconds = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.seconds = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(self.seconds, stage=self.stage, name=self.name)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(stage=self.stage, name=self.name)
+        if self.seconds * 1000 >= Config.SLOW_SPAN_MS:
+            logger.warning("Giai đoạn chậm %s/%s: %.0f ms", self.stage, self.name, self.seconds * 1000)
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s/%s: %.2f ms", self.stage, self.name, self.seconds * 1000)
+        return False
+
+
+def span(stage, name=""):
+    return Span(stage, name)
+
+
+def timed(stage, name=None):
+    """Decorator đo mỗi lần gọi hàm (đồng bộ hoặc async) bằng ``span(stage, name)``."""
+
+    def decorate(function):
+        label = name or function.__name__
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with Span(stage, label):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with Span(stage, label):
+                return function(*args, **kwargs)
+        return wrapper
+
+    return decorate
+
+
+def record_tool(tool, result):
+    """Đếm một lần chạy tool theo kết quả trả về."""
+    if isinstance(result, dict) and "error" in result:
+        outcome = "error"
+    elif not result or isinstance(result, dict) and "message" in result and "Không có dữ liệu" in result["message"]:
+        outcome = "empty"
+    else:
+        outcome = "ok"
+    TOOL_CALLS.inc(tool=tool, outcome=outcome)
+    return outcome
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+🔁 Chuyển dữ liệu từ bảng pollution_data (khóa theo id) sang bảng
+pollution_data_by_month (phân vùng theo năm/tháng).
+
+    python migrate_time_buckets.py --page-size 5000 --concurrency 64
+
+Dòng được ghi với khóa xác định theo giờ đo (``storage.row_id``) thay cho id ngẫu nhiên
+cũ, nên chạy lại migration hay nạp lại CSV sau đó đều là upsert. ``--rekey`` chuyển các
+dòng id ngẫu nhiên đã có sẵn trong pollution_data_by_month (nạp trước khi có khóa xác
+định) sang ``row_id`` và xóa dòng cũ; chạy một lần trên hệ thống đang có dữ liệu:
+
+    python migrate_time_buckets.py --rekey
+"""
+
+import argparse
+import calendar
+import time
+from datetime import datetime
+
+from cassandra.query import SimpleStatement
+
+import metrics
+import result_cache
+import timeseries_index
+from bulk_loader import BulkLoader
+from cassandra_CRUD import INSERT_COLUMNS, LEGACY_TABLE, POLLUTION_TABLE, PollutionDataProcessor
+from config import Config
+from storage import row_id
+
+logger = metrics.get_logger("migrate_time_buckets")
+
+SELECT_LEGACY = f"""
+SELECT id, day, month, year, hour, pt08_s1_co, c6h6_gt, pt08_s5_o3, pt08_s2_nmhc, pt08_s4_no2, aqi_label
+FROM {LEGACY_TABLE}
+"""
+SELECT_PARTITION = f"""
+SELECT id, day, month, year, hour, pt08_s1_co, c6h6_gt, pt08_s5_o3, pt08_s2_nmhc, pt08_s4_no2, aqi_label
+FROM {POLLUTION_TABLE} WHERE year = ? AND month = ?
+"""
+INSERT_ROW = f"INSERT INTO {POLLUTION_TABLE} ({INSERT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+DELETE_ROW = f"DELETE FROM {POLLUTION_TABLE} WHERE year = ? AND month = ? AND day = ? AND hour = ? AND id = ?"
+
+
+def keyed(row):
+    """Tham số INSERT của một dòng (id, day, month, year, hour, ...) với id = ``row_id`` của giờ đo."""
+    return (row_id(row.year, row.month, row.day, row.hour),) + tuple(row)[1:]
+
+
+def _finish(processor, months):
+    """Tính lại rollup, chỉ mục thời gian và xóa cache cho các tháng vừa ghi."""
+    processor.refresh_rollups(months=sorted(months))
+    if months:
+        (first_year, first_month), (last_year, last_month) = min(months), max(months)
+        last_day = calendar.monthrange(last_year, last_month)[1]
+        timeseries_index.reload_range(processor, datetime(first_year, first_month, 1),
+                                      datetime(last_year, last_month, last_day, 23))
+    result_cache.get_cache().clear()
+
+
+def migrate(processor, page_size=5000, concurrency=64, batch_size=20):
+    processor.create_schema()
+    loader = BulkLoader(
+        processor.session, INSERT_ROW, concurrency=concurrency, batch_size=batch_size,
+        partition_key=lambda params: (params[3], params[2]), progress_every=0,
+    )
+
+    start = time.perf_counter()
+    copied = failed = 0
+    page = []
+    months = set()
+    # Driver tự phân trang theo fetch_size nên chỉ giữ một trang trong bộ nhớ.
+    for row in processor.session.execute(SimpleStatement(SELECT_LEGACY, fetch_size=page_size)):
+        # Khóa theo giờ đo: chạy lại migration (hay nạp lại CSV) ghi đè thay vì sinh bản ghi trùng.
+        page.append(keyed(row))
+        months.add((row.year, row.month))
+        if len(page) >= page_size:
+            processor.mark_rollups_dirty(days={(params[3], params[2], params[1]) for params in page})
+            result = loader.load(page)
+            copied, failed, page = copied + result["rows"], failed + result["failed"], []
+    if page:
+        processor.mark_rollups_dirty(days={(params[3], params[2], params[1]) for params in page})
+        result = loader.load(page)
+        copied, failed = copied + result["rows"], failed + result["failed"]
+
+    _finish(processor, months)
+    elapsed = time.perf_counter() - start
+    logger.info("Đã chuyển %s dòng sang %s trong %.1fs, %s dòng lỗi", copied, POLLUTION_TABLE, elapsed, failed)
+    return copied, failed
+
+
+def rekey(processor, concurrency=64, batch_size=20):
+    """Chuyển các dòng id ngẫu nhiên trong pollution_data_by_month sang ``row_id`` của giờ đo.
+
+    Mỗi giờ giữ một dòng: dòng đã mang ``row_id`` nếu có, nếu không thì dòng cũ đầu tiên được
+    ghi lại với ``row_id``. Dòng mới được ghi trước rồi mới xóa dòng cũ, nên dừng giữa chừng
+    không mất dữ liệu và chạy lại sẽ làm nốt. Trả về (số dòng ghi lại, số dòng cũ đã xóa)."""
+    processor.create_schema()
+    partition_key = lambda params: (params[3], params[2])
+    writer = BulkLoader(processor.session, INSERT_ROW, concurrency=concurrency, batch_size=batch_size,
+                        partition_key=partition_key, progress_every=0)
+    deleter = BulkLoader(processor.session, DELETE_ROW, concurrency=concurrency, batch_size=batch_size,
+                         partition_key=lambda params: (params[0], params[1]), progress_every=0)
+    select = processor.session.prepare(SELECT_PARTITION)
+
+    start = time.perf_counter()
+    rewritten = deleted = failed = 0
+    months = set()
+    for year, month in processor.partitions():
+        keyed_hours, legacy = set(), {}
+        for row in processor.session.execute(select, (year, month)):
+            params = keyed(row)
+            if row.id == params[0]:
+                keyed_hours.add(params[0])
+            else:
+                legacy.setdefault(params[0], []).append((row, params))
+        if not legacy:
+            continue
+        rows = [entries[0][1] for key, entries in legacy.items() if key not in keyed_hours]
+        stale = [(year, month, row.day, row.hour, row.id) for entries in legacy.values() for row, _ in entries]
+        processor.mark_rollups_dirty(months=[(year, month)])
+        result = writer.load(rows)
+        failed += result["failed"]
+        if result["failed"]:
+            # Giữ dòng cũ của tháng này cho lần chạy sau thay vì xóa khi bản mới chưa ghi được.
+            continue
+        result = deleter.load(stale)
+        rewritten += len(rows)
+        deleted += result["rows"]
+        failed += result["failed"]
+        months.add((year, month))
+
+    _finish(processor, months)
+    elapsed = time.perf_counter() - start
+    logger.info("Đã chuyển %s dòng sang khóa theo giờ, xóa %s dòng id ngẫu nhiên trong %.1fs, %s dòng lỗi",
+                rewritten, deleted, elapsed, failed)
+    return rewritten, deleted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--page-size", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--rekey", action="store_true",
+                        help="Chuyển dòng id ngẫu nhiên trong pollution_data_by_month sang khóa theo giờ")
+    args = parser.parse_args()
+
+    processor = PollutionDataProcessor(Config.CASSANDRA_HOSTS, Config.CASSANDRA_KEYSPACE)
+    try:
+        if args.rekey:
+            rewritten, deleted = rekey(processor, args.concurrency, args.batch_size)
+            print(f"✅ Đã chuyển {rewritten} dòng sang khóa theo giờ, xóa {deleted} dòng id ngẫu nhiên")
+        else:
+            copied, failed = migrate(processor, args.page_size, args.concurrency, args.batch_size)
+            print(f"✅ Đã chuyển {copied} dòng sang {POLLUTION_TABLE}, {failed} dòng lỗi")
+    finally:
+        processor.close_connection()
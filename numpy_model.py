@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+🧮 Xuất mô hình Keras (.h5) sang .npz và chạy forward pass chỉ bằng NumPy.
+
+    python numpy_model.py export                      # model_ML/air_quality_model.h5 -> .npz
+    python numpy_model.py export --check              # kèm so sánh với Keras trên dữ liệu đã xử lý
+"""
+
+import json
+
+import numpy as np
+
+SUPPORTED_LAYERS = ("Dense", "BatchNormalization", "Dropout", "Normalization")
+ACTIVATIONS = {
+    None: lambda x: x,
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+    "tanh": np.tanh,
+}
+
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+
+ACTIVATIONS["softmax"] = _softmax
+
+
+def _weights_by_suffix(group):
+    """Trọng số của một layer trong file h5, khóa theo tên ngắn (kernel, bias, gamma...)."""
+    weights = {}
+    for name in group.attrs.get("weight_names", []):
+        name = name.decode() if isinstance(name, bytes) else name
+        weights[name.split("/")[-1].split(":")[0]] = np.asarray(group[name])
+    return weights
+
+
+def export_npz(h5_path, npz_path):
+    """Đọc cấu hình và trọng số từ file Keras .h5 (chỉ cần h5py) và ghi ra .npz."""
+    import h5py
+
+    with h5py.File(h5_path, "r") as f:
+        config = json.loads(f.attrs["model_config"])
+        if config["class_name"] != "Sequential":
+            raise ValueError(f"Chỉ hỗ trợ mô hình Sequential, nhận {config['class_name']}")
+        model_weights = f["model_weights"] if "model_weights" in f else f
+
+        layers = []
+        arrays = {}
+        for layer in config["config"]["layers"]:
+            kind, layer_config = layer["class_name"], layer["config"]
+            if kind == "InputLayer":
+                continue
+            if kind not in SUPPORTED_LAYERS:
+                raise ValueError(f"Layer {kind} chưa được hỗ trợ")
+            spec = {"kind": kind, "name": layer_config["name"]}
+            if kind == "Dense":
+                spec["activation"] = layer_config.get("activation")
+            elif kind == "BatchNormalization":
+                spec["epsilon"] = layer_config.get("epsilon", 1e-3)
+            if kind != "Dropout":
+                for key, value in _weights_by_suffix(model_weights[layer_config["name"]]).items():
+                    arrays[f"{len(layers)}/{key}"] = value
+            layers.append(spec)
+
+    np.savez_compressed(npz_path, layers=json.dumps(layers), **arrays)
+    print(f"✅ Đã xuất {len(layers)} layer sang {npz_path}")
+    return npz_path
+
+
+class NumpyModel:
+    """Forward pass suy luận (inference) cho mạng dense tuần tự đã xuất ra .npz."""
+
+    def __init__(self, steps):
+        self.steps = steps
+
+    @classmethod
+    def load(cls, npz_path):
+        with np.load(npz_path) as data:
+            layers = json.loads(str(data["layers"]))
+            steps = []
+            for index, spec in enumerate(layers):
+                w = {key.split("/", 1)[1]: data[key] for key in data.files if key.startswith(f"{index}/")}
+                kind = spec["kind"]
+                if kind == "Dense":
+                    steps.append(("dense", w["kernel"].astype(np.float32), w["bias"].astype(np.float32),
+                                  ACTIVATIONS[spec["activation"]]))
+                elif kind == "BatchNormalization":
+                    # Gộp sẵn BN thành một phép nhân và cộng theo từng kênh.
+                    scale = w["gamma"] / np.sqrt(w["moving_variance"] + spec["epsilon"])
+                    shift = w["beta"] - w["moving_mean"] * scale
+                    steps.append(("affine", scale.astype(np.float32), shift.astype(np.float32), None))
+                elif kind == "Normalization":
+                    scale = 1 / np.sqrt(np.maximum(w["variance"], 1e-7))
+                    steps.append(("affine", scale.astype(np.float32),
+                                  (-w["mean"] * scale).astype(np.float32), None))
+        return cls(steps)
+
+    def predict_proba(self, features):
+        x = np.asarray(features, dtype=np.float32)
+        for kind, a, b, activation in self.steps:
+            if kind == "dense":
+                x = activation(x @ a + b)
+            else:
+                x = x * a + b
+        return x
+
+
+def check_parity(h5_path, npz_path, csv_path):
+    """So sánh đầu ra NumPy với Keras trên toàn bộ dữ liệu đã xử lý."""
+    import pandas as pd
+    import tensorflow as tf
+
+    from batch_predict import CSV_FEATURE_COLUMNS
+
+    features = pd.read_csv(csv_path)[CSV_FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+    keras_out = tf.keras.models.load_model(h5_path, compile=False).predict(features, verbose=0)
+    numpy_out = NumpyModel.load(npz_path).predict_proba(features)
+    max_diff = float(np.abs(keras_out - numpy_out).max())
+    agreement = float((keras_out.argmax(axis=1) == numpy_out.argmax(axis=1)).mean())
+    print(f"Sai khác xác suất lớn nhất: {max_diff:.2e}, trùng nhãn: {agreement:.4%} trên {len(features)} dòng")
+    return max_diff, agreement
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Xuất trọng số .h5 sang .npz")
+    export.add_argument("--h5", default="model_ML/air_quality_model.h5")
+    export.add_argument("--npz", default="model_ML/air_quality_model.npz")
+    export.add_argument("--check", action="store_true", help="So sánh với Keras (cần TensorFlow)")
+    export.add_argument("--csv", default="Data/processed_AQI_data.csv")
+    args = parser.parse_args()
+
+    export_npz(args.h5, args.npz)
+    if args.check:
+        max_diff, agreement = check_parity(args.h5, args.npz, args.csv)
+        if max_diff > 1e-4 or agreement < 1.0:
+            raise SystemExit("❌ Kết quả NumPy lệch so với Keras")
@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+import numpy as np
+
+
+class MicroBatcher:
+    """Gom các request dự đoán đồng thời thành một lần forward pass.
+
+    Mỗi request đưa một dòng đặc trưng vào hàng đợi và chờ kết quả. Vòng lặp nền
+    lấy tối đa ``max_batch_size`` dòng, hoặc dừng gom sau ``max_wait_ms`` kể từ
+    dòng đầu tiên, chạy ``predict_fn`` trên cả batch trong thread pool rồi trả kết
+    quả về từng request.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=2.0, executor=None):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor
+        self._queue = None
+        self._worker = None
+        self.batches = 0
+        self.rows = 0
+
+    def _ensure_started(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, features):
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((features, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            features = np.asarray([row for row, _ in batch], dtype=np.float32)
+            try:
+                results = await loop.run_in_executor(self.executor, self.predict_fn, features)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.rows += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch_size": round(self.rows / self.batches, 2) if self.batches else 0,
+        }
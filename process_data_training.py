@@ -1,33 +1,79 @@
+import math
+
 import pandas as pd
 
+import aqi_engine
+
+COLUMNS_TO_FILL = ['PT08.S1(CO)', 'PT08.S4(NO2)', 'PT08.S5(O3)', 'C6H6(GT)', 'PT08.S2(NMHC)']
+OUTPUT_COLUMNS = ['Day', 'Month', 'Year', 'Hour', 'PT08.S1(CO)', 'C6H6(GT)', 'PT08.S5(O3)', 'PT08.S2(NMHC)',
+                  'PT08.S4(NO2)', 'AQI_Label']
+MISSING_VALUE = -200
+
+
+class ColumnMeans:
+    """Trung bình các giá trị hợp lệ (khác -200 và NaN), cộng dồn được qua nhiều chunk.
+
+    Tổng được giữ chính xác dưới dạng vài số float không chồng lấn (math.fsum lặp
+    trên phần dư), nên kết quả không phụ thuộc cách chia chunk.
+    """
+
+    def __init__(self, columns=COLUMNS_TO_FILL):
+        self.columns = list(columns)
+        self.parts = {col: [] for col in self.columns}
+        self.counts = {col: 0 for col in self.columns}
+
+    def update(self, df):
+        for col in self.columns:
+            valid = df[col][(df[col] != MISSING_VALUE) & df[col].notna()]
+            values = self.parts[col] + valid.tolist()
+            parts = []
+            while True:
+                residual = math.fsum(values + [-p for p in parts])
+                if residual == 0:
+                    break
+                parts.append(residual)
+            self.parts[col] = parts
+            self.counts[col] += len(valid)
+
+    def means(self):
+        return {col: (math.fsum(self.parts[col]) / self.counts[col] if self.counts[col] else float('nan'))
+                for col in self.columns}
+
+
 class AQIProcessor:
-    def __init__(self, input_file, output_file):
+    def __init__(self, input_file, output_file, breakpoints=None):
         self.input_file = input_file
         self.output_file = output_file
+        self.breakpoints = breakpoints or aqi_engine.DEFAULT_BREAKPOINTS
         self.df = None
 
+    def _read_csv(self, **kwargs):
+        # Ép kiểu float cho các cột cảm biến để mọi chunk ghi ra cùng định dạng số.
+        return pd.read_csv(self.input_file, sep=";", decimal=',', encoding='utf-8',
+                           dtype={col: 'float64' for col in COLUMNS_TO_FILL}, **kwargs)
+
     def load_data(self):
-        self.df = pd.read_csv(self.input_file, sep=";", decimal=',', encoding='utf-8')
+        self.df = self._read_csv()
 
-    def process_time(self):
+    def process_time(self, first_id=1):
+        self.df = self.df.dropna(subset=['Time'])
         self.df['Date'] = pd.to_datetime(self.df['Date'], format='%d/%m/%Y')
         self.df['Year'] = self.df['Date'].dt.year
         self.df['Month'] = self.df['Date'].dt.month
         self.df['Day'] = self.df['Date'].dt.day
         self.df['DayOfWeek'] = self.df['Date'].dt.dayofweek
-        self.df = self.df.dropna(subset=['Time'])
         self.df['Hour'] = self.df['Time'].astype(str).str[:2].astype(int)
         self.df.drop(columns=['Date', 'Time'], inplace=True)
-        self.df.insert(0, 'id', range(1, len(self.df) + 1))
-
-    def fill_missing_values(self):
-        columns_to_fill = ['PT08.S1(CO)', 'PT08.S4(NO2)', 'PT08.S5(O3)', 'C6H6(GT)','PT08.S2(NMHC)']
-        for col in columns_to_fill:
-            mean_value = self.df.loc[self.df[col] != -200, col].mean()
+        self.df.insert(0, 'id', range(first_id, first_id + len(self.df)))
 
-            self.df[col] = self.df[col].replace(-200, mean_value)
+    def fill_missing_values(self, means=None):
+        if means is None:
+            accumulator = ColumnMeans()
+            accumulator.update(self.df)
+            means = accumulator.means()
 
-            self.df[col].fillna(mean_value, inplace=True)
+        for col in COLUMNS_TO_FILL:
+            self.df[col] = self.df[col].replace(MISSING_VALUE, means[col]).fillna(means[col])
 
     def calculate_aqi(self, conc, breakpoints):
         for i in range(len(breakpoints) - 1):
@@ -39,37 +85,16 @@ class AQIProcessor:
         return breakpoints[-1][1]
 
     def calculate_all_aqi(self):
-        co_breakpoints = [(0, 0), (941, 50), (1075, 100), (1221, 150), (1407, 200), (1704, 300)]
-        no2_breakpoints = [(0, 0), (1242, 50), (1456, 100), (1662, 150), (1886, 200), (2349, 300)]
-        o3_breakpoints = [(0, 0), (742, 50), (983, 100), (1255, 150), (1577, 200), (2086, 300)]
-
-        self.df['AQI_CO'] = self.df['PT08.S1(CO)'].apply(lambda x: self.calculate_aqi(x, co_breakpoints))
-        self.df['AQI_NO2'] = self.df['PT08.S4(NO2)'].apply(lambda x: self.calculate_aqi(x, no2_breakpoints))
-        self.df['AQI_O3'] = self.df['PT08.S5(O3)'].apply(lambda x: self.calculate_aqi(x, o3_breakpoints))
-
-        self.df['AQI'] = self.df[['AQI_CO', 'AQI_NO2', 'AQI_O3']].max(axis=1)
-
-        # Thay thế giá trị None bằng giá trị trung bình
-        self.df['AQI'].fillna(self.df['AQI'].mean(), inplace=True)
+        aqi = aqi_engine.compute_aqi_frame(self.df, self.breakpoints)
+        for column in aqi.columns:
+            self.df[column] = aqi[column]
 
     def label_aqi(self):
-        def categorize_aqi(aqi):
-            if aqi <= 50:
-                return 0  # Tốt
-            elif aqi <= 100:
-                return 1  # Trung bình
-            elif aqi <= 150:
-                return 2  # Không tốt cho nhóm nhạy cảm
-            elif aqi <= 200:
-                return 3  # Không tốt
-            else:
-                return 4  # Rất xấu
-
-        self.df['AQI_Label'] = self.df['AQI'].apply(categorize_aqi)
-
-    def save_data(self):
-        self.df[['Day', 'Month', 'Year','Hour','PT08.S1(CO)','C6H6(GT)','PT08.S5(O3)','PT08.S2(NMHC)','PT08.S4(NO2)','AQI_Label']].to_csv(self.output_file, index=False)
-        print("AQI data with labels saved successfully!")
+        # 0: Tốt, 1: Trung bình, 2: Không tốt cho nhóm nhạy cảm, 3: Không tốt, 4: Rất xấu
+        self.df['AQI_Label'] = aqi_engine.label_aqi(self.df['AQI'])
+
+    def save_data(self, mode='w', header=True):
+        self.df[OUTPUT_COLUMNS].to_csv(self.output_file, index=False, mode=mode, header=header)
 
     def process(self):
         self.load_data()
@@ -78,8 +103,47 @@ class AQIProcessor:
         self.calculate_all_aqi()
         self.label_aqi()
         self.save_data()
+        print("AQI data with labels saved successfully!")
+
+    def process_streaming(self, chunk_size=50_000):
+        """Xử lý file theo từng chunk, bộ nhớ không phụ thuộc kích thước file.
+
+        Lượt 1 chỉ đọc các cột cần điền để tính trung bình; lượt 2 xử lý và ghi nối
+        tiếp từng chunk. Kết quả giống hệt ``process()``.
+        """
+        accumulator = ColumnMeans()
+        for chunk in self._read_csv(usecols=COLUMNS_TO_FILL, chunksize=chunk_size):
+            accumulator.update(chunk)
+        means = accumulator.means()
+
+        next_id = 1
+        rows = 0
+        for index, chunk in enumerate(self._read_csv(chunksize=chunk_size)):
+            self.df = chunk
+            self.process_time(first_id=next_id)
+            self.fill_missing_values(means)
+            self.calculate_all_aqi()
+            self.label_aqi()
+            self.save_data(mode='w' if index == 0 else 'a', header=index == 0)
+            next_id += len(self.df)
+            rows += len(self.df)
+
+        self.df = None
+        print(f"AQI data with labels saved successfully! ({rows} dòng, chunk {chunk_size})")
 
 
 if __name__ == "__main__":
-    processor = AQIProcessor("Data/AirQuality1.csv", "Data/processed_AQI_data.csv")
-    processor.process()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Tiền xử lý dữ liệu và gán nhãn AQI")
+    parser.add_argument("--input", default="Data/AirQuality1.csv")
+    parser.add_argument("--output", default="Data/processed_AQI_data.csv")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="Xử lý theo chunk (streaming) thay vì nạp toàn bộ file vào bộ nhớ")
+    args = parser.parse_args()
+
+    processor = AQIProcessor(args.input, args.output)
+    if args.chunk_size:
+        processor.process_streaming(args.chunk_size)
+    else:
+        processor.process()
@@ -0,0 +1,169 @@
+"""
+Bộ luật trích xuất (tool, tham số) từ các câu hỏi tiếng Việt thường gặp mà không
+cần gọi Claude. Chỉ trả lời khi chắc chắn; câu nào không khớp trọn vẹn thì trả về
+None để handler hỏi Claude như bình thường.
+"""
+
+import calendar
+import re
+import unicodedata
+from datetime import date
+
+STAT_KEYWORDS = [
+    ("median", r"trung vị|\bmedian\b"),
+    ("std", r"độ lệch chuẩn|\bstd\b"),
+    ("count", r"bao nhiêu bản ghi|số bản ghi|số lượng bản ghi|\bđếm\b|\bcount\b"),
+    ("max", r"cao nhất|lớn nhất|tối đa|\bmax\b"),
+    ("min", r"thấp nhất|nhỏ nhất|tối thiểu|\bmin\b"),
+    ("mean", r"trung bình|\bmean\b"),
+]
+# "Giờ nào cao nhất?" hỏi thời điểm, không phải giá trị; tool thống kê không trả lời được.
+WHEN_KEYWORDS = r"\b(?:giờ|lúc|khi|ngày|thời điểm) nào\b"
+PREDICT_KEYWORDS = r"dự đoán|dự báo"
+INSERT_KEYWORDS = r"\b(?:thêm|chèn|lưu)\b"
+QUERY_KEYWORDS = r"chất lượng không khí|dữ liệu|ô nhiễm|aqi|truy vấn|\bxem\b"
+
+FEATURE_PATTERNS = {
+    "PT08_S1_CO": r"pt08[._ ]?s1[._ ]?\(?co\)?",
+    "C6H6_GT": r"c6h6(?:[._ ]?\(?gt\)?)?|benzen",
+    "PT08_S5_O3": r"pt08[._ ]?s5[._ ]?\(?o3\)?",
+    "PT08_S2_NMHC": r"pt08[._ ]?s2[._ ]?\(?nmhc\)?",
+    "PT08_S4_NO2": r"pt08[._ ]?s4[._ ]?\(?no2\)?",
+}
+NUMBER = r"(-?\d+(?:[.,]\d+)?)"
+
+_SLASH_DATE = re.compile(r"\b(\d{1,2})[/-](\d{1,2})[/-](\d{4})\b")
+_DATE_PART = (r"(?:ngày\s+)?(?P<{p}d>\d{{1,2}})?\s*(?:tháng\s+(?P<{p}m>\d{{1,2}}))?\s*"
+              r"(?:năm\s+(?P<{p}y>\d{{4}}))?")
+_RANGE = re.compile(r"\btừ\s+" + _DATE_PART.format(p="s") + r"\s*(?:đến|tới)\s+" + _DATE_PART.format(p="e"))
+_FULL_DATE = re.compile(r"(?:ngày\s+)?\b(\d{1,2})\s+tháng\s+(\d{1,2})\s+năm\s+(\d{4})\b")
+_HOUR = re.compile(r"\b(\d{1,2})\s*(?:giờ|h)\b(?:\s+(sáng|trưa|chiều|tối|đêm))?")
+
+
+def normalize(prompt):
+    """Chuẩn hóa câu hỏi: NFC, chữ thường, ngày dd/mm/yyyy viết thành
+    "dd tháng mm năm yyyy", gộp khoảng trắng và bỏ dấu câu ở cuối."""
+    text = unicodedata.normalize("NFC", prompt).lower()
+    text = _SLASH_DATE.sub(lambda m: f"{int(m[1])} tháng {int(m[2])} năm {m[3]}", text)
+    return " ".join(text.split()).strip(" .?!")
+
+
+def _valid_date(year, month, day):
+    try:
+        date(year, month, day)
+    except ValueError:
+        return False
+    return True
+
+
+def _number(text):
+    return float(text.replace(",", "."))
+
+
+def _stat_type(text):
+    """Các loại thống kê được nhắc tới, theo thứ tự trong câu ("mean,max"); None nếu không có."""
+    found = []
+    for stat_type, pattern in STAT_KEYWORDS:
+        match = re.search(pattern, text)
+        if match:
+            found.append((match.start(), stat_type))
+    return ",".join(stat_type for _, stat_type in sorted(found)) or None
+
+
+def _single_date(text):
+    dates = {(int(y), int(m), int(d)) for d, m, y in _FULL_DATE.findall(text)}
+    if len(dates) != 1:
+        return None
+    year, month, day = dates.pop()
+    return (year, month, day) if _valid_date(year, month, day) else None
+
+
+def _date_range(text):
+    """(start, end) dạng (năm, tháng, ngày) từ "từ ... đến ..."; phần thiếu lấy theo vế còn lại."""
+    match = _RANGE.search(text)
+    if not match:
+        return None
+    g = {key: int(value) if value else None for key, value in match.groupdict().items()}
+    end_year = g["ey"] or g["sy"]
+    start_year = g["sy"] or end_year
+    end_month = g["em"] or g["sm"]
+    start_month = g["sm"] or end_month
+    if None in (start_year, end_year, start_month, end_month) or (g["sd"] is None and g["sm"] is None):
+        return None
+    start_day = g["sd"] or 1
+    end_day = g["ed"] or calendar.monthrange(end_year, end_month)[1]
+    start, end = (start_year, start_month, start_day), (end_year, end_month, end_day)
+    if not (_valid_date(*start) and _valid_date(*end)) or start > end:
+        return None
+    return start, end
+
+
+def _hour(text):
+    hours = {(int(h), period) for h, period in _HOUR.findall(text)}
+    if len(hours) != 1:
+        return None
+    hour, period = hours.pop()
+    if period in ("chiều", "tối") and hour < 12:
+        hour += 12
+    elif period == "đêm" and 6 <= hour < 12:
+        hour += 12
+    return hour if 0 <= hour <= 23 else None
+
+
+def _features(text):
+    values = {}
+    for name, pattern in FEATURE_PATTERNS.items():
+        found = re.findall(rf"(?:{pattern})\s*(?:=|:|là)?\s*{NUMBER}", text)
+        if len(found) != 1:
+            return None
+        values[name] = _number(found[0])
+    return values
+
+
+def _stats_call(text, stat_type):
+    span = _date_range(text)
+    if span is None:
+        single = _single_date(text)
+        if single is None:
+            return None
+        span = (single, single)
+    (start_year, start_month, start_day), (end_year, end_month, end_day) = span
+    arguments = {"stat_type": stat_type, "start_day": start_day, "start_month": start_month,
+                 "end_day": end_day, "end_month": end_month, "year": start_year}
+    if end_year != start_year:
+        arguments["end_year"] = end_year
+    return "statistical_analysis", arguments
+
+
+def _predict_call(text):
+    day_of = _single_date(text)
+    hour = _hour(text)
+    features = _features(text)
+    if day_of is None or hour is None or features is None:
+        return None
+    year, month, day = day_of
+    return "predict_pollution_level", {"Day": day, "Month": month, "Year": year, "Hour": hour, **features}
+
+
+def extract_tool_call(prompt):
+    """(tên tool, tham số) cho các câu hỏi dạng quen thuộc; None nếu không chắc chắn."""
+    text = normalize(prompt)
+    if re.search(INSERT_KEYWORDS, text):
+        # Ghi dữ liệu luôn để Claude xác nhận đầy đủ các trường.
+        return None
+    if re.search(PREDICT_KEYWORDS, text):
+        return _predict_call(text)
+    if _HOUR.search(text):
+        # Tool truy vấn/thống kê chỉ nhận tới ngày; câu hỏi có giờ để Claude xử lý
+        # thay vì trả lời cho cả ngày.
+        return None
+    stat_type = _stat_type(text)
+    if stat_type is not None:
+        return None if re.search(WHEN_KEYWORDS, text) else _stats_call(text, stat_type)
+    if _RANGE.search(text) or not re.search(QUERY_KEYWORDS, text):
+        return None
+    day_of = _single_date(text)
+    if day_of is None:
+        return None
+    year, month, day = day_of
+    return "query_pollution_data_openai", {"year": year, "month": month, "day": day}
@@ -0,0 +1,94 @@
+import json
+import math
+
+import numpy as np
+
+
+class QuantileSketch:
+    """Sketch phân vị gộp được, theo ý tưởng DDSketch.
+
+    Mỗi giá trị khác 0 rơi vào bucket chỉ số ``ceil(log_gamma(|x|))`` với
+    ``gamma = (1 + a) / (1 - a)``, nên phân vị trả về có sai số tương đối không quá
+    ``a`` (``relative_accuracy``). Hai sketch cùng độ chính xác gộp bằng cách cộng
+    số đếm theo bucket, nên có thể lưu sketch theo ngày/tháng rồi ghép theo khoảng.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+
+    def _keys(self, magnitudes):
+        return np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64)
+
+    def _value(self, key):
+        # Điểm giữa (theo sai số tương đối) của bucket (gamma^(k-1), gamma^k].
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        for buckets, part in ((self.positive, values[values > 0]), (self.negative, -values[values < 0])):
+            if len(part):
+                keys, counts = np.unique(self._keys(part), return_counts=True)
+                for key, count in zip(keys.tolist(), counts.tolist()):
+                    buckets[key] = buckets.get(key, 0) + count
+        self.zeros += int(np.count_nonzero(values == 0))
+        self.count += len(values)
+        return self
+
+    def add(self, value):
+        return self.add_many([value])
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Chỉ gộp được các sketch có cùng relative_accuracy")
+        for buckets, other_buckets in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_buckets.items():
+                buckets[key] = buckets.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        if self.count == 0:
+            return float("nan")
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive))
+
+    def median(self):
+        return self.quantile(0.5)
+
+    def to_bytes(self):
+        return json.dumps({
+            "a": self.relative_accuracy,
+            "p": [[key, count] for key, count in sorted(self.positive.items())],
+            "n": [[key, count] for key, count in sorted(self.negative.items())],
+            "z": self.zeros,
+        }, separators=(",", ":")).encode()
+
+    @classmethod
+    def from_bytes(cls, data):
+        payload = json.loads(bytes(data))
+        sketch = cls(payload["a"])
+        sketch.positive = {key: count for key, count in payload["p"]}
+        sketch.negative = {key: count for key, count in payload["n"]}
+        sketch.zeros = payload["z"]
+        sketch.count = sketch.zeros + sum(sketch.positive.values()) + sum(sketch.negative.values())
+        return sketch
@@ -0,0 +1,264 @@
+"""
+Cache kết quả các tool đọc Cassandra (truy vấn theo ngày, thống kê theo khoảng).
+
+Mỗi mục gắn với khoảng thời gian [start, end] mà nó đã đọc, nên khi ghi dữ liệu
+vào một ngày/tháng chỉ cần xóa các mục có khoảng chứa ngày/tháng đó.
+
+Backend bộ nhớ chỉ thấy các lần ghi của chính tiến trình: ghi từ worker khác, từ
+/api/ingest ở worker khác hay từ các script nạp/migration không xóa được mục của nó,
+nên mục chỉ sống tối đa ``ttl`` giây. Chạy nhiều worker hoặc có nơi ghi bên ngoài thì
+dùng backend SQLite (``RESULT_CACHE_PATH``) để mọi tiến trình xóa trên cùng một file.
+"""
+
+import calendar
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import metrics
+from config import Config
+
+logger = metrics.get_logger("result_cache")
+
+TIME_FORMAT = "%Y-%m-%dT%H"
+
+
+def _json_default(value):
+    # Số kiểu NumPy (int64, float32...) trong kết quả thống kê.
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Không tuần tự hóa được {type(value).__name__}")
+
+
+class _MemoryBackend:
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.evictions = 0
+        self._generation = 0
+
+    def generation(self):
+        return self._generation
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[3] <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return json.loads(entry[2])
+
+    def put(self, key, start, end, payload, generation=None):
+        if generation is not None and generation != self._generation:
+            return False
+        self.entries[key] = (start, end, payload, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    def invalidate(self, start, end):
+        stale = [key for key, (first, last, _, _) in self.entries.items() if first <= end and last >= start]
+        for key in stale:
+            del self.entries[key]
+        self._generation += 1
+        return len(stale)
+
+    def clear(self):
+        self.entries.clear()
+        self._generation += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class _SqliteBackend:
+    """Backend trên đĩa dùng chung giữa các worker; LRU theo thời điểm truy cập.
+
+    Số thế hệ (``generation``) nằm trong cùng file và tăng trong cùng giao dịch với mỗi lần
+    xóa, còn ``put`` so sánh nó trong giao dịch ghi: kết quả một worker đọc trước lần ghi
+    của worker khác không thể được lưu lại sau khi worker đó đã xóa cache."""
+
+    def __init__(self, path, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(result_cache)")}
+        if columns and "expires" not in columns:
+            # File cache từ bản cũ (chưa có hạn dùng): bỏ đi, cache dựng lại dần.
+            self.connection.execute("DROP TABLE result_cache")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS result_cache (
+                key TEXT PRIMARY KEY, start TEXT, "end" TEXT, payload TEXT, accessed REAL, expires REAL
+            )""")
+        self.connection.execute('CREATE INDEX IF NOT EXISTS result_cache_span ON result_cache (start, "end")')
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS result_cache_generation (id INTEGER PRIMARY KEY, value INTEGER)")
+        self.connection.execute("INSERT OR IGNORE INTO result_cache_generation VALUES (0, 0)")
+
+    def generation(self):
+        return self.connection.execute("SELECT value FROM result_cache_generation WHERE id = 0").fetchone()[0]
+
+    def _bump(self):
+        self.connection.execute("UPDATE result_cache_generation SET value = value + 1 WHERE id = 0")
+
+    def get(self, key):
+        now = time.time()
+        row = self.connection.execute("SELECT payload, expires FROM result_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] is None or row[1] <= now:
+            self.connection.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+            return None
+        self.connection.execute("UPDATE result_cache SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def put(self, key, start, end, payload, generation=None):
+        now = time.time()
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            if generation is not None and generation != self.generation():
+                return False
+            self.connection.execute("INSERT OR REPLACE INTO result_cache VALUES (?, ?, ?, ?, ?, ?)",
+                                    (key, start, end, payload, now, now + self.ttl))
+            excess = len(self) - self.max_entries
+            if excess > 0:
+                self.connection.execute(
+                    "DELETE FROM result_cache WHERE key IN "
+                    "(SELECT key FROM result_cache ORDER BY accessed LIMIT ?)", (excess,))
+                self.evictions += excess
+        return True
+
+    def invalidate(self, start, end):
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            cursor = self.connection.execute('DELETE FROM result_cache WHERE start <= ? AND "end" >= ?', (end, start))
+            self._bump()
+        return cursor.rowcount
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.execute("DELETE FROM result_cache")
+            self._bump()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+
+
+class ResultCache:
+    """Cache LRU có giới hạn kích thước cho kết quả tool, khóa theo
+    (tool, khoảng thời gian đã chuẩn hóa, chi tiết như stat_type).
+
+    Mặc định nằm trong bộ nhớ tiến trình. Khi có ``path``, dùng file SQLite làm
+    nơi lưu duy nhất để mọi worker thấy cùng dữ liệu và cùng thao tác xóa. Mục hết
+    hạn sau ``ttl`` giây dù không có lần ghi nào xóa nó.
+    """
+
+    def __init__(self, max_entries=512, path=None, ttl=300):
+        self.max_entries = max_entries
+        self.path = path or None
+        self.ttl = ttl
+        self._backend = _SqliteBackend(path, max_entries, ttl) if path else _MemoryBackend(max_entries, ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def epoch(self):
+        """Thế hệ hiện tại, tăng sau mỗi lần xóa (trong file SQLite nếu dùng chung): kết quả
+        đọc trước một lần ghi không được lưu lại sau đó."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            return self._backend.generation()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(tool, start, end, detail=None):
+        return f"{tool}|{start:{TIME_FORMAT}}|{end:{TIME_FORMAT}}|{detail or ''}"
+
+    def get(self, tool, start, end, detail=None):
+        if not self.enabled:
+            return None
+        with self._lock:
+            value = self._backend.get(self.make_key(tool, start, end, detail))
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, tool, start, end, value, detail=None, epoch=None):
+        """Lưu kết quả; ``epoch`` là ``self.epoch`` đọc trước khi truy vấn cơ sở dữ liệu."""
+        if not self.enabled:
+            return
+        payload = json.dumps(value, default=_json_default, ensure_ascii=False)
+        with self._lock:
+            self._backend.put(self.make_key(tool, start, end, detail),
+                              f"{start:{TIME_FORMAT}}", f"{end:{TIME_FORMAT}}", payload, epoch)
+
+    def invalidate(self, start, end):
+        """Xóa mọi mục có khoảng thời gian giao với [start, end]."""
+        with self._lock:
+            removed = self._backend.invalidate(f"{start:{TIME_FORMAT}}", f"{end:{TIME_FORMAT}}")
+            self.invalidations += removed
+        return removed
+
+    def invalidate_day(self, year, month, day):
+        return self.invalidate(datetime(year, month, day), datetime(year, month, day, 23))
+
+    def invalidate_month(self, year, month):
+        last_day = calendar.monthrange(year, month)[1]
+        return self.invalidate(datetime(year, month, 1), datetime(year, month, last_day, 23))
+
+    def clear(self):
+        with self._lock:
+            self._backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = len(self._backend)
+        return {
+            "backend": "sqlite" if self.path else "memory",
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "evictions": self._backend.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache(Config.RESULT_CACHE_SIZE, Config.RESULT_CACHE_PATH,
+                                     Config.RESULT_CACHE_TTL_SECONDS)
+                if _cache.enabled and not _cache.path and int(os.getenv("WEB_CONCURRENCY", 1)) > 1:
+                    logger.warning("Cache kết quả trong bộ nhớ với nhiều worker: ghi ở worker khác chỉ có hiệu "
+                                   "lực sau %ss; đặt RESULT_CACHE_PATH để dùng chung", _cache.ttl)
+    return _cache
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+📈 Bảng tổng hợp sẵn (rollup) theo ngày và theo tháng cho thống kê ô nhiễm.
+
+Mỗi dòng rollup giữ count, sum, sum of squares, min, max và một sketch phân vị
+(xem quantile_sketch.py) cho một chỉ số trong một ngày/tháng. Thống kê theo khoảng
+chỉ cần gộp vài chục dòng rollup thay vì đọc lại toàn bộ dữ liệu theo giờ.
+
+Bảng trạng thái giữ, cho từng ngày, lần cuối dữ liệu gốc được ghi (``marked_at``, ghi
+trước khi ghi dữ liệu và ngay trước khi tính lại) và thời điểm bắt đầu lần tính lại
+rollup thành công gần nhất (``refreshed_at``). Ngày có ``marked_at > refreshed_at`` là
+rollup cũ (lần tính lại lỗi hoặc chưa chạy xong): thống kê có ngày đó quét dữ liệu gốc.
+Ngày chưa có ``refreshed_at`` là chưa được phủ (dữ liệu gốc nạp trước khi có rollup, hoặc
+tháng chưa từng được tính trọn): thống kê cũng quét dữ liệu gốc thay vì coi rollup thiếu
+là đủ. Tính lại một số ngày của tháng chưa được phủ trọn sẽ tính lại cả tháng, nên rollup
+tháng không bao giờ được gộp từ một phần rollup ngày.
+
+Không có rollup theo giờ: bảng gốc đã là một dòng mỗi giờ, và khoảng thống kê luôn
+tính theo ngày trọn vẹn nên rollup giờ không bao giờ được đọc.
+
+    python rollups.py rebuild --start 2004-03 --end 2005-04   # dựng lại từ dữ liệu gốc
+"""
+
+import asyncio
+import calendar
+import math
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import metrics
+from quantile_sketch import QuantileSketch
+
+logger = metrics.get_logger("rollups")
+
+METRICS = ["pt08_s1_co", "c6h6_gt", "pt08_s5_o3", "pt08_s2_nmhc", "pt08_s4_no2", "aqi_label"]
+ROLLUP_COLUMNS = "samples, total, total_sq, minimum, maximum, sketch"
+DAILY_TABLE = "pollution_rollup_daily"
+MONTHLY_TABLE = "pollution_rollup_monthly"
+STATUS_TABLE = "pollution_rollup_status"
+
+STALE_READS = metrics.REGISTRY.counter(
+    "aqm_rollup_stale_reads_total", "Thống kê phải quét dữ liệu gốc vì rollup trong khoảng đã cũ")
+UNCOVERED_READS = metrics.REGISTRY.counter(
+    "aqm_rollup_uncovered_reads_total", "Thống kê phải quét dữ liệu gốc vì có ngày trong khoảng chưa có rollup")
+REFRESH_FAILURES = metrics.REGISTRY.counter(
+    "aqm_rollup_refresh_failures_total", "Số lần tính lại rollup sau khi ghi bị lỗi")
+
+CREATE_ROLLUP_TABLES = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {DAILY_TABLE} (
+        year int, month int, day int, metric text,
+        samples bigint, total double, total_sq double, minimum double, maximum double, sketch blob,
+        PRIMARY KEY ((year, month), day, metric)
+    )""",
+    f"""
+    CREATE TABLE IF NOT EXISTS {MONTHLY_TABLE} (
+        year int, month int, metric text,
+        samples bigint, total double, total_sq double, minimum double, maximum double, sketch blob,
+        PRIMARY KEY ((year), month, metric)
+    )""",
+    f"""
+    CREATE TABLE IF NOT EXISTS {STATUS_TABLE} (
+        year int, month int, day int, marked_at double, refreshed_at double,
+        PRIMARY KEY ((year), month, day)
+    )""",
+]
+
+
+def days_between(start, end):
+    """Các (year, month, day) từ ngày của ``start`` đến ngày của ``end`` (bao gồm hai đầu)."""
+    day, last = start.date(), end.date()
+    while day <= last:
+        yield day.year, day.month, day.day
+        day += timedelta(days=1)
+
+
+def month_days(year, month):
+    return [(year, month, day) for day in range(1, calendar.monthrange(year, month)[1] + 1)]
+
+
+class Rollup:
+    """Thống kê gộp được của một chỉ số: count, sum, sum of squares, min, max, sketch."""
+
+    __slots__ = ("count", "total", "total_sq", "minimum", "maximum", "sketch")
+
+    def __init__(self, count=0, total=0.0, total_sq=0.0, minimum=math.inf, maximum=-math.inf, sketch=None):
+        self.count = count
+        self.total = total
+        self.total_sq = total_sq
+        self.minimum = minimum
+        self.maximum = maximum
+        self.sketch = sketch if sketch is not None else QuantileSketch()
+
+    @classmethod
+    def from_values(cls, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return cls()
+        return cls(len(values), float(values.sum()), float(np.dot(values, values)), float(values.min()),
+                   float(values.max()), QuantileSketch().add_many(values))
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.samples, row.total, row.total_sq, row.minimum, row.maximum,
+                   QuantileSketch.from_bytes(row.sketch))
+
+    def params(self):
+        return [self.count, self.total, self.total_sq, self.minimum, self.maximum, self.sketch.to_bytes()]
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.sketch.merge(other.sketch)
+        return self
+
+    def mean(self):
+        return self.total / self.count
+
+    def std(self):
+        # Độ lệch chuẩn tổng thể (ddof=0) như np.std.
+        mean = self.mean()
+        return math.sqrt(max(self.total_sq / self.count - mean * mean, 0.0))
+
+    def median(self):
+        return self.sketch.median()
+
+
+def rollups_from_rows(rows, key):
+    """Gom các dòng dữ liệu gốc (có đủ cột METRICS) thành {key(row): {metric: Rollup}}."""
+    groups = {}
+    for row in rows:
+        groups.setdefault(key(row), []).append([getattr(row, metric) for metric in METRICS])
+    result = {}
+    for group, values in groups.items():
+        columns = np.asarray(values, dtype=np.float64).T
+        result[group] = {metric: Rollup.from_values(column) for metric, column in zip(METRICS, columns)}
+    return result
+
+
+def merge_rollups(parts):
+    """Gộp nhiều {metric: Rollup} thành một."""
+    merged = {metric: Rollup() for metric in METRICS}
+    for part in parts:
+        for metric, rollup in part.items():
+            merged[metric].merge(rollup)
+    return merged
+
+
+class RollupStore:
+    """Đọc/ghi rollup trong Cassandra cho một ``PollutionDataProcessor``.
+
+    Rollup được tính lại từ dữ liệu gốc của cả tháng bị ảnh hưởng (hoặc của từng
+    ngày được chỉ định) thay vì cộng dồn, nên ghi lại nhiều lần vẫn cho cùng kết quả.
+    """
+
+    def __init__(self, processor):
+        self.processor = processor
+
+    @property
+    def session(self):
+        return self.processor.session
+
+    def create_schema(self):
+        for statement in CREATE_ROLLUP_TABLES:
+            self.session.execute(statement)
+
+    def _write(self, statements):
+        futures = [self.session.execute_async(statement, params) for statement, params in statements]
+        for future in futures:
+            future.result()
+
+    def _write_status(self, column, days, value):
+        query = self.processor._prepare(
+            f"INSERT INTO {STATUS_TABLE} (year, month, day, {column}) VALUES (?, ?, ?, ?)")
+        self._write((query, [int(year), int(month), int(day), value]) for year, month, day in set(days))
+
+    def mark_dirty(self, days):
+        """Đánh dấu rollup các ngày ``days`` (dãy (year, month, day)) là cũ, trước khi ghi dữ liệu
+        gốc của chúng; lần tính lại thành công bắt đầu sau thời điểm này mới xóa dấu."""
+        self._write_status("marked_at", days, time.time())
+
+    def _mark_fresh(self, days, started):
+        self._write_status("refreshed_at", days, started)
+
+    def _status_queries(self, start, end):
+        """Một câu đọc bảng trạng thái cho mỗi năm trong [start, end]."""
+        query = self.processor._prepare(
+            f"SELECT year, month, day, marked_at, refreshed_at FROM {STATUS_TABLE} "
+            f"WHERE year = ? AND (month, day) >= (?, ?) AND (month, day) <= (?, ?)")
+        return [(query, (year, *((start.month, start.day) if year == start.year else (1, 1)),
+                         *((end.month, end.day) if year == end.year else (12, 31))))
+                for year in range(start.year, end.year + 1)]
+
+    @staticmethod
+    def _stale(rows):
+        return [(row.year, row.month, row.day) for row in rows if row.marked_at is not None
+                and (row.refreshed_at is None or row.marked_at > row.refreshed_at)]
+
+    def month_covered(self, year, month):
+        """Mọi ngày của tháng đã có rollup (đã được tính trọn tháng ít nhất một lần)."""
+        query = self.processor._prepare(f"SELECT day, refreshed_at FROM {STATUS_TABLE} WHERE year = ? AND month = ?")
+        covered = {row.day for row in self.session.execute(query, (year, month)) if row.refreshed_at is not None}
+        return len(covered) == calendar.monthrange(year, month)[1]
+
+    def stale_days(self, start, end):
+        """Các (year, month, day) trong [start, end] có rollup cũ hơn dữ liệu gốc."""
+        futures = [self.session.execute_async(query, params) for query, params in self._status_queries(start, end)]
+        return self._stale(row for future in futures for row in future.result())
+
+    def _read_daily(self, year, month, first_day=1, last_day=31):
+        query = self.processor._prepare(
+            f"SELECT day, metric, {ROLLUP_COLUMNS} FROM {DAILY_TABLE} "
+            f"WHERE year = ? AND month = ? AND day >= ? AND day <= ?")
+        return self.session.execute(query, (year, month, first_day, last_day))
+
+    def refresh_month(self, year, month, days=None):
+        """Tính lại rollup ngày (tất cả, hoặc chỉ ``days``) và rollup tháng cho (year, month).
+        Tháng chưa được phủ trọn thì luôn tính lại cả tháng."""
+        # Thời điểm bắt đầu đọc: dữ liệu ghi (và đánh dấu) sau đó vẫn để ngày ở trạng thái cũ.
+        started = time.time()
+        last_day = calendar.monthrange(year, month)[1]
+        days = sorted(set(days)) if days else None
+        if days and not self.month_covered(year, month):
+            logger.info("Rollup %s-%02d chưa phủ trọn tháng, tính lại cả tháng", year, month)
+            days = None
+        first, last = (days[0], days[-1]) if days else (1, last_day)
+        rows = self.processor.iter_pollution_range(datetime(year, month, first), datetime(year, month, last, 23),
+                                                   "day," + ",".join(METRICS))
+        daily = rollups_from_rows(rows, key=lambda row: row.day)
+        if days:
+            daily = {day: metrics for day, metrics in daily.items() if day in days}
+
+        insert_daily = self.processor._prepare(
+            f"INSERT INTO {DAILY_TABLE} (year, month, day, metric, {ROLLUP_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+        self._write((insert_daily, [year, month, day, metric, *rollup.params()])
+                    for day, metrics in daily.items() for metric, rollup in metrics.items())
+
+        if days:
+            # Rollup tháng gộp từ tất cả rollup ngày của tháng (kể cả các ngày không đổi).
+            stored = rollups_from_stored(self._read_daily(year, month), key=lambda row: row.day)
+            stored.update(daily)
+            daily = stored
+        monthly = merge_rollups(daily.values())
+        insert_monthly = self.processor._prepare(
+            f"INSERT INTO {MONTHLY_TABLE} (year, month, metric, {ROLLUP_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+        self._write((insert_monthly, [year, month, metric, *rollup.params()])
+                    for metric, rollup in monthly.items() if rollup.count)
+        self._mark_fresh([(year, month, day) for day in days] if days else month_days(year, month), started)
+        return sum(metrics[METRICS[0]].count for metrics in daily.values())
+
+    def refresh_days(self, days):
+        """Cập nhật rollup sau khi ghi các ngày ``days`` (dãy (year, month, day))."""
+        by_month = {}
+        for year, month, day in days:
+            by_month.setdefault((int(year), int(month)), set()).add(int(day))
+        for (year, month), month_days in sorted(by_month.items()):
+            self.refresh_month(year, month, month_days)
+
+    def refresh_range(self, start, end):
+        """Cập nhật rollup sau khi dữ liệu trong [start, end] thay đổi (vd. gán lại nhãn)."""
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            last_day = calendar.monthrange(year, month)[1]
+            first = start.day if (year, month) == (start.year, start.month) else 1
+            last = end.day if (year, month) == (end.year, end.month) else last_day
+            self.refresh_month(year, month, None if (first, last) == (1, last_day) else range(first, last + 1))
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    def _range_queries(self, start, end):
+        """Các câu đọc rollup cho khoảng ngày [start, end]: tháng đủ dùng rollup tháng,
+        tháng lẻ ở hai đầu dùng rollup ngày."""
+        monthly = self.processor._prepare(
+            f"SELECT metric, {ROLLUP_COLUMNS} FROM {MONTHLY_TABLE} WHERE year = ? AND month >= ? AND month <= ?")
+        daily = self.processor._prepare(
+            f"SELECT metric, {ROLLUP_COLUMNS} FROM {DAILY_TABLE} WHERE year = ? AND month = ? AND day >= ? AND day <= ?")
+        queries = []
+        full_months = []
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            last_day = calendar.monthrange(year, month)[1]
+            first = start.day if (year, month) == (start.year, start.month) else 1
+            last = end.day if (year, month) == (end.year, end.month) else last_day
+            if first == 1 and last == last_day:
+                full_months.append((year, month))
+            else:
+                queries.append((daily, (year, month, first, last)))
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+        # Các tháng đủ liên tiếp trong cùng năm được đọc bằng một lát cắt.
+        runs = []
+        for year, month in full_months:
+            if runs and runs[-1][0] == year and runs[-1][2] == month - 1:
+                runs[-1][2] = month
+            else:
+                runs.append([year, month, month])
+        queries.extend((monthly, tuple(run)) for run in runs)
+        return queries
+
+    def _checked(self, status_rows, rollup_rows, start, end):
+        """{metric: Rollup} gộp từ ``rollup_rows``; None nếu có ngày trong khoảng mang rollup cũ
+        hoặc chưa có rollup."""
+        status_rows = list(status_rows)
+        stale = self._stale(status_rows)
+        if stale:
+            STALE_READS.inc()
+            logger.info("Rollup của %d ngày trong %s - %s cũ hơn dữ liệu gốc (vd. %s), quét dữ liệu gốc",
+                        len(stale), start.date(), end.date(), "-".join(map(str, stale[0])))
+            return None
+        covered = {(row.year, row.month, row.day) for row in status_rows if row.refreshed_at is not None}
+        missing = [day for day in days_between(start, end) if day not in covered]
+        if missing:
+            UNCOVERED_READS.inc()
+            logger.info("%d ngày trong %s - %s chưa có rollup (vd. %s), quét dữ liệu gốc",
+                        len(missing), start.date(), end.date(), "-".join(map(str, missing[0])))
+            return None
+        return merge_rollups(part for part in rollups_from_stored(rollup_rows).values())
+
+    def range_stats(self, start, end):
+        """{metric: Rollup} cho các ngày từ ``start`` đến ``end`` (bao gồm hai đầu); None nếu
+        rollup của ngày nào trong khoảng chưa có hoặc chưa được tính lại sau lần ghi gần nhất."""
+        status = self._status_queries(start, end)
+        futures = [self.session.execute_async(query, params)
+                   for query, params in status + self._range_queries(start, end)]
+        results = [future.result() for future in futures]
+        return self._checked((row for rows in results[:len(status)] for row in rows),
+                             (row for rows in results[len(status):] for row in rows), start, end)
+
+    async def arange_stats(self, start, end):
+        from cassandra_CRUD import execute_aio
+
+        status = self._status_queries(start, end)
+        results = await asyncio.gather(*(execute_aio(self.session, query, params)
+                                         for query, params in status + self._range_queries(start, end)))
+        return self._checked((row for rows in results[:len(status)] for row in rows),
+                             (row for rows in results[len(status):] for row in rows), start, end)
+
+
+def rollups_from_stored(rows, key=lambda row: None):
+    """Gom các dòng rollup đã lưu thành {key(row): {metric: Rollup}}, gộp các dòng cùng khóa."""
+    result = {}
+    for row in rows:
+        group = result.setdefault(key(row), {})
+        rollup = Rollup.from_row(row)
+        if row.metric in group:
+            group[row.metric].merge(rollup)
+        else:
+            group[row.metric] = rollup
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from cassandra_CRUD import PollutionDataProcessor
+    from config import Config
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="Tính lại rollup từ dữ liệu gốc")
+    rebuild.add_argument("--start", required=True, help="Tháng bắt đầu, dạng YYYY-MM")
+    rebuild.add_argument("--end", required=True, help="Tháng kết thúc, dạng YYYY-MM")
+    args = parser.parse_args()
+
+    processor = PollutionDataProcessor(Config.CASSANDRA_HOSTS, Config.CASSANDRA_KEYSPACE)
+    try:
+        processor.create_schema()
+        start, end = datetime.strptime(args.start, "%Y-%m"), datetime.strptime(args.end, "%Y-%m")
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            rows = processor.rollups.refresh_month(year, month)
+            print(f"✅ {year}-{month:02d}: {rows} dòng")
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    finally:
+        processor.close_connection()
@@ -81,6 +81,23 @@ class AirQualityApp {
         this.addMessageToChat(message, 'user');
         userInput.value = '';
 
+        // Stream the answer when the browser supports it; otherwise wait for the full response
+        if (window.ReadableStream && window.TextDecoder) {
+            try {
+                await this.streamMessage(message);
+                return;
+            } catch (error) {
+                console.error('Stream error:', error);
+                if (error.eventsReceived) {
+                    this.showSystemMessage('❌ Mất kết nối khi đang nhận câu trả lời. Vui lòng thử lại.', 'error');
+                    return;
+                }
+            }
+        }
+        await this.sendMessageBlocking(message);
+    }
+
+    async sendMessageBlocking(message) {
         // Show loading
         this.showLoading(true);
 
@@ -108,6 +125,101 @@ class AirQualityApp {
         }
     }
 
+    async streamMessage(message) {
+        const response = await fetch('/api/query/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream'
+            },
+            body: JSON.stringify({ message: message })
+        });
+        if (!response.ok || !response.body) {
+            throw new Error(`Stream unavailable (${response.status})`);
+        }
+
+        // Assistant bubble: a status line while waiting, then the answer text as it arrives
+        const chatMessages = document.getElementById('chatMessages');
+        const messageDiv = document.createElement('div');
+        messageDiv.className = 'message assistant';
+        messageDiv.innerHTML = '<i class="fas fa-robot"></i> <span class="message-status"></span><span class="message-text"></span>';
+        const status = messageDiv.querySelector('.message-status');
+        const text = messageDiv.querySelector('.message-text');
+        status.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Đang phân tích câu hỏi...';
+        chatMessages.appendChild(messageDiv);
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+
+        const handlers = {
+            tool_selected: (data) => {
+                status.innerHTML = `<i class="fas fa-spinner fa-spin"></i> Đang chạy <code>${data.tool}</code>...`;
+            },
+            tool_result: () => {
+                status.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Đang viết câu trả lời...';
+            },
+            answer: (data) => {
+                status.innerHTML = '';
+                text.textContent += data.text;
+            },
+            done: (data) => {
+                status.innerHTML = '';
+                if (!text.textContent) {
+                    const result = data.response;
+                    text.textContent = typeof result === 'string' ? result : (result.error || result.message || JSON.stringify(result));
+                }
+            },
+            error: (data) => {
+                messageDiv.remove();
+                this.showSystemMessage(`❌ ${data.error || 'Có lỗi xảy ra khi xử lý câu hỏi của bạn.'}`, 'error');
+            }
+        };
+
+        let eventsReceived = 0;
+        try {
+            for await (const [event, data] of this.readEvents(response.body)) {
+                eventsReceived += 1;
+                if (handlers[event]) {
+                    handlers[event](data);
+                }
+                chatMessages.scrollTop = chatMessages.scrollHeight;
+            }
+        } catch (error) {
+            if (!eventsReceived) {
+                messageDiv.remove();
+            }
+            error.eventsReceived = eventsReceived;
+            throw error;
+        }
+    }
+
+    // Parse a text/event-stream body into [event, data] pairs
+    async *readEvents(body) {
+        const reader = body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = 'message';
+                const data = [];
+                for (const line of block.split('\n')) {
+                    if (line.startsWith('event:')) {
+                        event = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        data.push(line.slice(5).trimStart());
+                    }
+                }
+                if (data.length) {
+                    yield [event, JSON.parse(data.join('\n'))];
+                }
+            }
+        }
+    }
+
     async makePrediction() {
         const formData = {
             day: parseInt(document.getElementById('day').value),
@@ -0,0 +1,151 @@
+"""
+Thống kê một lượt (single pass) trên các trang kết quả của driver Cassandra.
+
+Mỗi trang được chép vào một bộ đệm float64 cấp phát sẵn rồi gộp vào các bộ tích lũy
+theo cột (count, mean/M2 theo Welford–Chan, min, max); trung vị lấy từ sketch phân
+vị gộp được (quantile_sketch.py). Bộ nhớ chỉ phụ thuộc kích thước trang và bộ đệm
+sketch, không phụ thuộc độ dài khoảng thời gian, và nhiều loại thống kê được tính
+trong cùng một lượt.
+"""
+
+import numpy as np
+
+from quantile_sketch import QuantileSketch
+
+STAT_TYPES = ["count", "mean", "median", "std", "min", "max"]
+NO_DATA = {"message": "Không có dữ liệu để thống kê"}
+INVALID = {"error": "Loại thống kê không hợp lệ"}
+
+
+def parse_stat_types(stat_type):
+    """Danh sách loại thống kê từ "mean", "mean,std" hoặc "all"; None nếu có loại không hợp lệ."""
+    if not isinstance(stat_type, str):
+        return None
+    names = [name.strip().lower() for name in stat_type.split(",") if name.strip()]
+    if names == ["all"]:
+        return list(STAT_TYPES)
+    if not names or any(name not in STAT_TYPES for name in names):
+        return None
+    return list(dict.fromkeys(names))
+
+
+class StreamingStats:
+    """Bộ tích lũy thống kê theo cột, nạp từng trang một.
+
+    ``columns`` là tên cột trong kết quả trả về, theo đúng thứ tự giá trị trong mỗi
+    dòng. Sketch trung vị chỉ được duy trì khi ``median`` có mặt trong ``stat_types``;
+    giá trị được gom vào một bộ đệm ``sketch_rows`` dòng rồi mới nạp vào sketch để
+    giảm số lần cập nhật bucket.
+    """
+
+    def __init__(self, columns, stat_types=STAT_TYPES, page_size=1000, relative_accuracy=0.01,
+                 sketch_rows=16384):
+        self.columns = list(columns)
+        width = len(self.columns)
+        self.count = 0
+        self.mean = np.zeros(width)
+        self.m2 = np.zeros(width)
+        self.minimum = np.full(width, np.inf)
+        self.maximum = np.full(width, -np.inf)
+        self.sketches = ([QuantileSketch(relative_accuracy) for _ in self.columns]
+                         if "median" in stat_types else None)
+        self._buffer = np.empty((page_size, width))
+        self._pending = np.empty((sketch_rows if self.sketches is not None else 0, width))
+        self._pending_rows = 0
+
+    @classmethod
+    def from_rollups(cls, columns, parts):
+        """Dựng trạng thái từ các ``rollups.Rollup`` (một phần tử cho mỗi cột)."""
+        stats = cls(columns, stat_types=(), page_size=0)
+        stats.count = parts[0].count
+        if stats.count:
+            totals = np.array([part.total for part in parts])
+            stats.mean = totals / stats.count
+            stats.m2 = np.maximum(np.array([part.total_sq for part in parts]) - totals * stats.mean, 0.0)
+        stats.minimum = np.array([part.minimum for part in parts], dtype=np.float64)
+        stats.maximum = np.array([part.maximum for part in parts], dtype=np.float64)
+        stats.sketches = [part.sketch for part in parts]
+        return stats
+
+    def add_rows(self, rows):
+        """Nạp một trang dòng (tuple/namedtuple) của driver, hoặc một mảng 2 chiều."""
+        if isinstance(rows, np.ndarray) and rows.dtype == np.float64:
+            return self.add_array(rows)
+        size = len(rows)
+        if size == 0:
+            return self
+        if size > len(self._buffer):
+            self._buffer = np.empty((size, len(self.columns)))
+        page = self._buffer[:size]
+        page[...] = rows
+        return self.add_array(page)
+
+    def add_array(self, page):
+        """Gộp một khối (n_dòng, n_cột) vào các bộ tích lũy (công thức gộp của Chan)."""
+        size = len(page)
+        if size == 0:
+            return self
+        page_mean = page.mean(axis=0)
+        page_m2 = np.square(page - page_mean).sum(axis=0)
+        total = self.count + size
+        delta = page_mean - self.mean
+        self.mean += delta * (size / total)
+        self.m2 += page_m2 + np.square(delta) * (self.count * size / total)
+        self.count = total
+        np.minimum(self.minimum, page.min(axis=0), out=self.minimum)
+        np.maximum(self.maximum, page.max(axis=0), out=self.maximum)
+        if self.sketches is not None:
+            self._queue_for_sketch(page)
+        return self
+
+    def _queue_for_sketch(self, page):
+        if len(page) > len(self._pending) - self._pending_rows:
+            self._flush_sketches()
+            if len(page) > len(self._pending):
+                self._add_to_sketches(page)
+                return
+        self._pending[self._pending_rows:self._pending_rows + len(page)] = page
+        self._pending_rows += len(page)
+
+    def _flush_sketches(self):
+        if self._pending_rows:
+            self._add_to_sketches(self._pending[:self._pending_rows])
+            self._pending_rows = 0
+
+    def _add_to_sketches(self, block):
+        for sketch, column in zip(self.sketches, block.T):
+            sketch.add_many(column)
+
+    def values(self, stat_type):
+        if stat_type == "mean":
+            return self.mean
+        if stat_type == "std":
+            return np.sqrt(self.m2 / self.count)
+        if stat_type == "min":
+            return self.minimum
+        if stat_type == "max":
+            return self.maximum
+        if stat_type == "median":
+            self._flush_sketches()
+            return [sketch.median() for sketch in self.sketches]
+        raise ValueError(stat_type)
+
+    def _result(self, stat_type):
+        if stat_type == "count":
+            return {"Total Records": int(self.count)}
+        return dict(zip(self.columns, (float(value) for value in self.values(stat_type))))
+
+    def summary(self, stat_type):
+        """Kết quả cho ``stat_type`` (một hoặc nhiều loại cách nhau bằng dấu phẩy).
+
+        Một loại: ``{"stat_type": "mean", "result": {cột: giá trị}}``; nhiều loại:
+        ``{"stat_type": "mean,std", "result": {"mean": {...}, "std": {...}}}``.
+        """
+        names = parse_stat_types(stat_type)
+        if names is None:
+            return {"stat_type": stat_type, "result": dict(INVALID)}
+        if self.count == 0:
+            return dict(NO_DATA)
+        if len(names) == 1:
+            return {"stat_type": names[0], "result": self._result(names[0])}
+        return {"stat_type": ",".join(names), "result": {name: self._result(name) for name in names}}
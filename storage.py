@@ -0,0 +1,215 @@
+"""
+🗄️ Giao diện lưu trữ dữ liệu ô nhiễm và chọn backend theo cấu hình.
+
+Hai backend cùng cài đặt ``PollutionStore``:
+
+- ``cassandra``: ``cassandra_CRUD.PollutionDataProcessor`` (bảng phân vùng theo tháng),
+- ``columnar``: ``columnar_store.ColumnarStore`` (file NumPy theo cột, chia năm/tháng),
+
+chọn bằng biến môi trường ``STORAGE_BACKEND``. Các tool trong function_calling chỉ
+dùng ``get_store()`` nên chạy được với cả hai.
+"""
+
+import asyncio
+import calendar
+import threading
+import uuid
+from collections import namedtuple
+from datetime import datetime
+
+from config import Config
+
+# Tên cột theo lược đồ bảng pollution_data_by_month (Cassandra trả về chữ thường).
+QUERY_COLUMNS = "hour,AQI_Label,day,month,year"
+STATS_COLUMNS = "pt08_s1_co,c6h6_gt,pt08_s5_o3,pt08_s2_nmhc,pt08_s4_no2,aqi_label"
+INSERT_COLUMNS = "id, Day, Month, Year, Hour, PT08_S1_CO, C6H6_GT, PT08_S5_O3, PT08_S2_NMHC, PT08_S4_NO2, AQI_Label"
+
+# Namespace của khóa dòng xác định: id = uuid5(trạm, giờ đo), nên ghi lại cùng một giờ
+# (chạy lại backfill, gửi lại số đo) là upsert đè lên dòng cũ thay vì sinh bản trùng.
+ROW_ID_NAMESPACE = uuid.UUID("3f6c1a52-8d4e-5b0f-9c27-6e1d4a8b7f30")
+
+# Một lượt đọc trên một phân vùng (year, month); first/last là (day, hour) hoặc None
+# nếu đọc từ đầu/đến hết phân vùng.
+PartitionRead = namedtuple("PartitionRead", ["year", "month", "first", "last"])
+
+
+def plan_partition_reads(start, end):
+    """Chuyển khoảng thời gian [start, end] (tính theo giờ, bao gồm hai đầu) thành
+    danh sách tối thiểu các lượt đọc phân vùng (year, month)."""
+    if start > end:
+        return []
+
+    reads = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        last_day = calendar.monthrange(year, month)[1]
+        first = (start.day, start.hour) if (year, month) == (start.year, start.month) else None
+        last = (end.day, end.hour) if (year, month) == (end.year, end.month) else None
+        if first == (1, 0):
+            first = None
+        if last == (last_day, 23):
+            last = None
+        reads.append(PartitionRead(year, month, first, last))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return reads
+
+
+def row_id(year, month, day, hour, station=None):
+    """Khóa dòng của số đo tại (trạm, giờ); trạm mặc định là ``Config.STATION_ID``."""
+    station = Config.STATION_ID if station is None else station
+    return uuid.uuid5(ROW_ID_NAMESPACE, f"{station}/{int(year):04d}-{int(month):02d}-{int(day):02d}T{int(hour):02d}")
+
+
+def row_ids(df, station=None):
+    """Khóa các dòng của DataFrame dạng processed_AQI_data.csv; giữ cột ``id`` nếu đã có
+    (vd. khi chép giữa hai backend)."""
+    if "id" in df:
+        return [value if isinstance(value, uuid.UUID) else uuid.UUID(str(value)) for value in df["id"]]
+    return [row_id(year, month, day, hour, station) for year, month, day, hour in zip(
+        df["Year"].tolist(), df["Month"].tolist(), df["Day"].tolist(), df["Hour"].tolist())]
+
+
+def time_bounds(year, month=None, day=None, hour=None):
+    """Khoảng [start, end] tương ứng với các trường ngày giờ được chỉ định."""
+    start = datetime(year, month or 1, day or 1, hour or 0)
+    end_month = month or 12
+    end_day = day or calendar.monthrange(year, end_month)[1]
+    end = datetime(year, end_month, end_day, 23 if hour is None else hour)
+    return start, end
+
+
+def query_bounds(year, month=None, day=None, hour=None):
+    """(start, end, filters) của truy vấn có năm.
+
+    Chỉ phần tiền tố liên tục (tháng, ngày, giờ) tạo thành một lát cắt thời gian;
+    các trường còn lại (vd. giờ mà không có ngày) là ``filters`` [(tên cột, giá trị)]
+    phải lọc sau khi đọc.
+    """
+    fields = [('month', month), ('day', day), ('hour', hour)]
+    prefix = []
+    for _, value in fields:
+        if value is None:
+            break
+        prefix.append(value)
+    start, end = time_bounds(year, *prefix)
+    filters = [(name, value) for name, value in fields[len(prefix):] if value is not None]
+    return start, end, filters
+
+
+def stats_time_range(time_range):
+    """Khoảng [start, end] của yêu cầu thống kê (từ đầu ngày bắt đầu đến hết ngày kết thúc)."""
+    start = datetime(time_range['year'], time_range['start_month'], time_range['start_day'])
+    end = datetime(time_range.get('end_year') or time_range['year'], time_range['end_month'],
+                   time_range['end_day'], 23)
+    return start, end
+
+
+def parse_end_time(value):
+    """Ngày kết thúc không kèm giờ được hiểu là đến hết 23h của ngày đó."""
+    end = datetime.fromisoformat(value)
+    return end if 'T' in value or ' ' in value else end.replace(hour=23)
+
+
+def column_names(columns):
+    """Danh sách tên cột (chữ thường, như Cassandra trả về) từ chuỗi "a,b,c"."""
+    return [column.strip().lower() for column in columns.split(",")]
+
+
+class PollutionStore:
+    """Các thao tác lưu trữ mà tool query/stats/insert cần.
+
+    Lớp con cài đặt các hàm đồng bộ; bản async mặc định chạy bản đồng bộ trong thread
+    pool, backend nào có I/O async thật (Cassandra) thì ghi đè. ``rollups`` là
+    ``rollups.RollupStore`` nếu backend có bảng tổng hợp sẵn, ngược lại None.
+    """
+
+    backend = None
+    rollups = None
+
+    def create_schema(self):
+        raise NotImplementedError
+
+    def insert_data(self, df, **kwargs):
+        """Ghi DataFrame dạng Data/processed_AQI_data.csv."""
+        raise NotImplementedError
+
+    def add_pollution_data_from_nlp(self, PT08_S1_CO, C6H6_GT, PT08_S5_O3, PT08_S2_NMHC, PT08_S4_NO2, AQI_Label,
+                                    Year, Month, Day, Hour):
+        """Thêm một giờ dữ liệu; trả về "inserted" hoặc "exists" nếu giờ đó đã có dữ liệu (hỏi Bloom
+        filter giờ nếu đã dựng, nếu không thì đọc kiểm tra trong phân vùng)."""
+        raise NotImplementedError
+
+    def partitions(self):
+        """Các (year, month) đã có dữ liệu, theo thứ tự thời gian."""
+        raise NotImplementedError
+
+    def query_pollution_data(self, year=None, month=None, day=None, hour=None):
+        """DataFrame các cột ``QUERY_COLUMNS`` khớp điều kiện, theo thứ tự thời gian."""
+        raise NotImplementedError
+
+    def iter_pollution_pages(self, start, end, columns=STATS_COLUMNS, fetch_size=1000):
+        """Duyệt các trang (dãy dòng, mỗi dòng theo thứ tự ``columns``) trong [start, end]."""
+        raise NotImplementedError
+
+    def iter_pollution_range(self, start, end, columns=STATS_COLUMNS, fetch_size=1000):
+        """Như ``iter_pollution_pages`` nhưng duyệt từng dòng."""
+        for page in self.iter_pollution_pages(start, end, columns, fetch_size):
+            yield from page
+
+    async def aquery_pollution_data(self, year=None, month=None, day=None, hour=None):
+        return await asyncio.to_thread(self.query_pollution_data, year, month, day, hour)
+
+    async def aconsume_pollution_range(self, start, end, on_page, columns=STATS_COLUMNS, fetch_size=1000):
+        """Gọi ``on_page(rows)`` lần lượt cho từng trang trong [start, end]."""
+        def consume():
+            for page in self.iter_pollution_pages(start, end, columns, fetch_size):
+                on_page(page)
+
+        await asyncio.to_thread(consume)
+
+    def health(self):
+        return {"backend": self.backend}
+
+    def close_connection(self):
+        pass
+
+    @staticmethod
+    def _plan_query(year, month=None, day=None, hour=None):
+        """Các lượt đọc phân vùng cho truy vấn có năm, kèm các điều kiện còn phải lọc sau khi đọc."""
+        start, end, filters = query_bounds(year, month, day, hour)
+        return plan_partition_reads(start, end), filters
+
+    @staticmethod
+    def _apply_filters(df, filters):
+        for name, value in filters:
+            if not df.empty:
+                df = df[df[name] == value].reset_index(drop=True)
+        return df
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Backend lưu trữ theo ``Config.STORAGE_BACKEND`` (mặc định Cassandra qua db_pool)."""
+    global _store
+    if Config.STORAGE_BACKEND != "columnar":
+        import db_pool
+
+        return db_pool.get_processor()
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                from columnar_store import ColumnarStore
+
+                _store = ColumnarStore(Config.COLUMNAR_PATH)
+    return _store
+
+
+def health():
+    if Config.STORAGE_BACKEND != "columnar":
+        import db_pool
+
+        return {"backend": "cassandra", **db_pool.get_pool().health()}
+    return get_store().health()
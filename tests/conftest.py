@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Các test dùng module ở thư mục gốc và đối tượng giả lập trong benchmarks/fakes.py.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+sys.path.insert(0, ROOT)
@@ -0,0 +1,57 @@
+"""Phiên bản phân vùng của ColumnarStore khi người ghi và người đọc chạy xen nhau."""
+
+import os
+
+import pandas as pd
+import pytest
+
+from columnar_store import ColumnarStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSV = os.path.join(ROOT, "Data", "processed_AQI_data.csv")
+
+
+@pytest.fixture(scope="module")
+def march():
+    frame = pd.read_csv(CSV)
+    return frame[(frame["Year"] == 2004) & (frame["Month"] == 3)].reset_index(drop=True)
+
+
+def versions(store):
+    return sorted(entry for entry in os.listdir(store._partition_path(2004, 3)) if entry.startswith("v"))
+
+
+def write_in_parts(store, frame, parts):
+    size = -(-len(frame) // parts)
+    for start in range(0, len(frame), size):
+        store.insert_data(frame.iloc[start:start + size])
+
+
+def test_write_keeps_previous_version(tmp_path, march):
+    store = ColumnarStore(str(tmp_path))
+    write_in_parts(store, march, 4)
+    assert versions(store) == ["v3", "v4"]
+    assert len(store.query_pollution_data(2004, 3)) == len(march)
+
+
+def test_reader_drops_arrays_of_replaced_versions(tmp_path, march):
+    writer, reader = ColumnarStore(str(tmp_path)), ColumnarStore(str(tmp_path))
+    writer.insert_data(march.iloc[:100])
+    assert len(reader.query_pollution_data(2004, 3)) == 100
+    writer.insert_data(march.iloc[100:200])
+    writer.insert_data(march.iloc[200:])
+
+    assert len(reader.query_pollution_data(2004, 3)) == len(march)
+    assert {key[2] for key in reader._arrays} == {3}
+
+
+def test_read_retries_when_version_was_removed(tmp_path, march, monkeypatch):
+    writer, reader = ColumnarStore(str(tmp_path)), ColumnarStore(str(tmp_path))
+    write_in_parts(writer, march, 3)
+    # Manifest đọc ngay trước hai lần ghi khác: phiên bản 1 đã bị dọn khi người đọc mở file.
+    stale = [{"version": 1, "rows": 10}]
+    manifest = reader._manifest
+    monkeypatch.setattr(reader, "_manifest", lambda year, month: stale.pop() if stale else manifest(year, month))
+
+    assert len(reader.query_pollution_data(2004, 3)) == len(march)
+    assert not stale
@@ -0,0 +1,69 @@
+"""ConnectionPool chỉ mở một kết nối Cassandra cho cả tiến trình, kể cả khi nhiều luồng cùng gọi."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from db_pool import ConnectionPool
+from fakes import FakeCluster
+
+
+class CountingFactory:
+    """cluster_factory đếm số Cluster được tạo; connect chậm để các luồng đến cùng lúc."""
+
+    def __init__(self, connect_latency=0.05):
+        self.connect_latency = connect_latency
+        self.clusters = []
+
+    def __call__(self, hosts):
+        cluster = FakeCluster(hosts, connect_latency=self.connect_latency)
+        self.clusters.append(cluster)
+        return cluster
+
+
+def test_concurrent_requests_share_one_connection():
+    factory = CountingFactory()
+    pool = ConnectionPool(["127.0.0.1"], "pollution_db", cluster_factory=factory)
+    try:
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            processors = list(executor.map(lambda _: pool.get_processor(), range(64)))
+        assert len(factory.clusters) == 1
+        assert len(factory.clusters[0].sessions) == 1
+        assert all(processor is processors[0] for processor in processors)
+        assert processors[0].session is factory.clusters[0].sessions[0]
+        assert pool.health()["clusters_opened"] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_shutdown_closes_the_connection_and_reconnects_once():
+    factory = CountingFactory(connect_latency=0.0)
+    pool = ConnectionPool(["127.0.0.1"], "pollution_db", cluster_factory=factory)
+    first = pool.get_session()
+    pool.shutdown()
+    assert factory.clusters[0].is_shutdown
+    assert not pool.health()["connected"]
+
+    assert pool.get_session() is not first
+    assert pool.get_session() is pool.get_session()
+    assert len(factory.clusters) == 2
+    pool.shutdown()
+
+
+def test_failed_connect_is_reported_and_retried():
+    attempts = []
+
+    def flaky(hosts):
+        attempts.append(hosts)
+        if len(attempts) == 1:
+            raise ConnectionError("no hosts available")
+        return FakeCluster(hosts)
+
+    pool = ConnectionPool(["127.0.0.1"], "pollution_db", cluster_factory=flaky)
+    with pytest.raises(ConnectionError):
+        pool.get_session()
+    assert pool.health()["last_error"] == "no hosts available"
+    pool.get_session()
+    assert "last_error" not in pool.health()
+    assert pool.health()["clusters_opened"] == 1
+    pool.shutdown()
@@ -0,0 +1,29 @@
+"""Mô hình NumPy (model_ML/air_quality_model.npz) phải cho cùng kết quả với mô hình Keras."""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from batch_predict import CSV_FEATURE_COLUMNS
+from numpy_model import NumpyModel, check_parity
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+H5 = os.path.join(ROOT, "model_ML", "air_quality_model.h5")
+NPZ = os.path.join(ROOT, "model_ML", "air_quality_model.npz")
+CSV = os.path.join(ROOT, "Data", "processed_AQI_data.csv")
+
+
+def test_numpy_model_matches_keras():
+    pytest.importorskip("tensorflow")
+    max_diff, agreement = check_parity(H5, NPZ, CSV)
+    assert agreement == 1.0
+    assert max_diff < 1e-4
+
+
+def test_numpy_model_outputs_probabilities():
+    features = pd.read_csv(CSV, nrows=256)[CSV_FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+    proba = NumpyModel.load(NPZ).predict_proba(features)
+    assert proba.shape[0] == len(features)
+    np.testing.assert_allclose(proba.sum(axis=1), 1.0, atol=1e-5)
@@ -0,0 +1,54 @@
+"""Sự kiện của ``astream_query`` (dùng cho /api/query/stream) với client Claude giả."""
+
+import asyncio
+
+import pytest
+
+from fakes import FakeAsyncAnthropic
+from function_calling import PollutionQueryHandler
+
+PREDICT = ("predict_pollution_level", {"Day": 10, "Month": 3, "Year": 2004, "Hour": 18, "PT08_S1_CO": 1360,
+                                       "C6H6_GT": 11.9, "PT08_S5_O3": 1268, "PT08_S2_NMHC": 1046,
+                                       "PT08_S4_NO2": 1692})
+PROMPT = "Dự đoán mức độ ô nhiễm lúc 18 giờ ngày 10/3/2004"
+
+
+def collect(handler):
+    async def run():
+        return [event async for event in handler.astream_query(PROMPT)]
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def handler():
+    """Handler dự đoán không cần mô hình; câu trả lời của nguồn ``predict`` do Claude viết lại."""
+    handler = PollutionQueryHandler("test-key")
+    handler.llm_rewrite_sources = {"predict"}
+
+    async def predict(**arguments):
+        return {"pollution_level": "Kém", "input": arguments}
+
+    handler.apredict_pollution_level = predict
+    return handler
+
+
+def test_answer_chunks_then_done(handler):
+    handler.async_client = FakeAsyncAnthropic(0.0, tool_call=lambda prompt: PREDICT,
+                                              answer=lambda prompt: "Không khí kém, hạn chế ra ngoài.")
+    events = collect(handler)
+    names = [name for name, _ in events]
+    assert names[:2] == ["tool_selected", "tool_result"]
+    assert set(names[2:-1]) == {"answer"} and names[-1] == "done"
+    assert "".join(data["text"] for name, data in events if name == "answer") == "Không khí kém, hạn chế ra ngoài."
+    assert events[-1][1]["response"] == "Không khí kém, hạn chế ra ngoài."
+
+
+def test_stream_failure_is_an_error_event(handler):
+    def fail(prompt):
+        raise ConnectionError("overloaded")
+
+    handler.async_client = FakeAsyncAnthropic(0.0, tool_call=lambda prompt: PREDICT, answer=fail)
+    events = collect(handler)
+    assert [name for name, _ in events] == ["tool_selected", "tool_result", "error"]
+    assert "overloaded" in events[-1][1]["error"]
@@ -0,0 +1,115 @@
+"""Chọn tool: cache câu hỏi, bộ luật tiếng Việt và các câu hỏi phải để Claude xử lý."""
+
+import pytest
+
+import prompt_rules
+from fakes import FakeAnthropic
+from function_calling import PollutionQueryHandler
+from tool_cache import ToolSelectionCache
+
+QUERY_DAY = ("query_pollution_data_openai", {"year": 2004, "month": 5, "day": 20})
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def handler():
+    """Handler với Claude giả luôn chọn ``QUERY_DAY``; các tool chỉ ghi lại tham số."""
+    handler = PollutionQueryHandler("test-key")
+    handler.client = FakeAnthropic(latency=0.0, tool_call=lambda prompt: QUERY_DAY)
+    handler.tool_cache = ToolSelectionCache(rules=prompt_rules.extract_tool_call)
+    handler.calls = []
+    for name in handler.function_map:
+        setattr(handler, name, lambda _name=name, **arguments: handler.calls.append((_name, arguments)) or {"ok": True})
+    return handler
+
+
+def test_rule_match_skips_claude(handler):
+    assert handler.call_claude_function("Chất lượng không khí ngày 10/3/2004?") == {"ok": True}
+    assert handler.calls == [("query_pollution_data_openai", {"year": 2004, "month": 3, "day": 10})]
+    assert handler.client.calls == 0
+    assert handler.tool_cache.stats()["rule_hits"] == 1
+
+
+def test_cache_miss_asks_claude_once_then_hits(handler):
+    handler.call_claude_function("Hôm 20 tháng 5 năm 2004 không khí ra sao?")
+    handler.call_claude_function("hôm 20/5/2004   không khí ra sao")
+    assert handler.client.calls == 1
+    assert handler.calls == [QUERY_DAY, QUERY_DAY]
+    stats = handler.tool_cache.stats()
+    assert (stats["misses"], stats["hits"], stats["entries"]) == (1, 1, 1)
+
+
+def test_cached_arguments_are_copies(handler):
+    handler.call_claude_function("Hôm 20 tháng 5 năm 2004 không khí ra sao?")
+    handler.calls[0][1]["day"] = 21
+    handler.call_claude_function("Hôm 20 tháng 5 năm 2004 không khí ra sao?")
+    assert handler.calls[1] == QUERY_DAY
+
+
+def test_invalid_claude_response_is_not_cached(handler):
+    handler.client = FakeAnthropic(latency=0.0)
+    result = handler.call_claude_function("Hôm 20 tháng 5 năm 2004 không khí ra sao?")
+    assert "error" in result
+    assert handler.tool_cache.stats()["entries"] == 0
+
+
+def test_entries_expire_after_ttl():
+    clock = Clock()
+    cache = ToolSelectionCache(ttl=60, rules=None, clock=clock)
+    cache.store("Mùa xuân năm 2004 ô nhiễm thế nào?", *QUERY_DAY)
+    assert cache.lookup("mùa xuân năm 2004 ô nhiễm thế nào") == QUERY_DAY
+    clock.now = 61
+    assert cache.lookup("Mùa xuân năm 2004 ô nhiễm thế nào?") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_eviction():
+    cache = ToolSelectionCache(max_entries=2, rules=None)
+    for prompt in ("câu 1", "câu 2"):
+        cache.store(prompt, *QUERY_DAY)
+    cache.lookup("câu 1")
+    cache.store("câu 3", *QUERY_DAY)
+    assert cache.lookup("câu 2") is None
+    assert cache.lookup("câu 1") == QUERY_DAY
+    assert cache.stats()["evictions"] == 1
+
+
+@pytest.mark.parametrize("prompt, expected", [
+    ("Tính trung bình dữ liệu ô nhiễm từ 17 tháng 3 năm 2004 đến 17 tháng 4 năm 2004",
+     ("statistical_analysis", {"stat_type": "mean", "start_day": 17, "start_month": 3, "end_day": 17,
+                               "end_month": 4, "year": 2004})),
+    ("AQI cao nhất và trung bình từ 20/12/2004 đến 10/1/2005",
+     ("statistical_analysis", {"stat_type": "max,mean", "start_day": 20, "start_month": 12, "end_day": 10,
+                               "end_month": 1, "year": 2004, "end_year": 2005})),
+    ("Dự đoán mức độ ô nhiễm ngày 15 tháng 3 năm 2025 lúc 8 giờ tối với PT08_S1_CO 120.5, C6H6_GT 5.3, "
+     "PT08_S5_O3 45.2, PT08_S2_NMHC 220.7, PT08_S4_NO2 34.1",
+     ("predict_pollution_level", {"Day": 15, "Month": 3, "Year": 2025, "Hour": 20, "PT08_S1_CO": 120.5,
+                                  "C6H6_GT": 5.3, "PT08_S5_O3": 45.2, "PT08_S2_NMHC": 220.7,
+                                  "PT08_S4_NO2": 34.1})),
+])
+def test_rules_extract_familiar_prompts(prompt, expected):
+    assert prompt_rules.extract_tool_call(prompt) == expected
+
+
+@pytest.mark.parametrize("prompt", [
+    # Hỏi thời điểm xảy ra giá trị lớn nhất/nhỏ nhất: tool thống kê chỉ trả giá trị.
+    "Giờ nào AQI cao nhất ngày 20/5/2004?",
+    "Lúc nào nồng độ CO thấp nhất từ 1 đến 30 tháng 5 năm 2004?",
+    "Ngày nào ô nhiễm trung bình cao nhất từ 1 tháng 3 đến 31 tháng 5 năm 2004",
+    # Có giờ cụ thể: tool truy vấn/thống kê chỉ nhận tới ngày.
+    "Chất lượng không khí ngày 20/5/2004 lúc 8 giờ",
+    "AQI trung bình ngày 20 tháng 5 năm 2004 lúc 14h",
+    # Ghi dữ liệu luôn để Claude xác nhận các trường.
+    "Thêm dữ liệu ngày 20/5/2004 lúc 8 giờ với PT08_S1_CO 1000",
+])
+def test_rules_leave_ambiguous_prompts_to_claude(handler, prompt):
+    assert prompt_rules.extract_tool_call(prompt) is None
+    handler.call_claude_function(prompt)
+    assert handler.client.calls == 1
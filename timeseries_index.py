@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+⏱️ Chỉ mục chuỗi thời gian theo giờ cho các câu hỏi hay gặp ("ngày X", "thống kê
+từ ngày A đến ngày B").
+
+Mỗi giờ kể từ 0h ngày 1/1 của năm đầu tiên là một dòng của mảng float64
+(số giờ, 6 cột thống kê) trong một file .npy; giờ chưa có dữ liệu là NaN. Tra một
+giờ hay một khoảng chỉ là tính chỉ số rồi cắt mảng, không cần đọc cơ sở dữ liệu.
+
+File được mở bằng memory-map dùng chung (MAP_SHARED): mọi worker uvicorn đọc cùng
+một bản trong page cache, và giờ mới ghi vào file được các worker khác thấy ngay.
+Khi dữ liệu nằm ngoài các năm đã có, một phiên bản lớn hơn được ghi ra rồi
+manifest.json được thay bằng os.replace như trong columnar_store:
+
+    <path>/manifest.json     {"version": 2, "start": "2004-01-01T00", "hours": 17544}
+    <path>/v2.npy
+
+Mỗi giờ chỉ giữ một bộ giá trị; nếu một giờ có nhiều bản ghi thì bản ghi sau ghi đè.
+
+Manifest ghi thêm khoảng ``covered`` mà nguồn dựng chỉ mục phủ trọn (cả các năm của mọi
+phân vùng khi dựng từ cơ sở dữ liệu, từ giờ đầu đến giờ cuối của file khi dựng từ CSV).
+Truy vấn và thống kê chỉ được trả lời từ chỉ mục khi khoảng hỏi nằm trong ``covered``;
+ngoài khoảng đó (vd. dòng trong cơ sở dữ liệu mà CSV không có, hay giờ ghi vào năm mới)
+bên gọi đọc backend lưu trữ như khi không có chỉ mục.
+
+    python timeseries_index.py build --csv Data/processed_AQI_data.csv
+    python timeseries_index.py build --from-database
+"""
+
+import contextlib
+import json
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import metrics
+from config import Config
+from storage import QUERY_COLUMNS, STATS_COLUMNS, column_names, query_bounds
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ khóa giữa các luồng trong một tiến trình
+    fcntl = None
+
+logger = metrics.get_logger("timeseries_index")
+
+COLUMNS = column_names(STATS_COLUMNS)
+# Cột đọc từ backend lưu trữ để dựng chỉ mục: thời điểm rồi các cột thống kê.
+SOURCE_COLUMNS = "year,month,day,hour," + STATS_COLUMNS
+CSV_VALUE_COLUMNS = ["PT08.S1(CO)", "C6H6(GT)", "PT08.S5(O3)", "PT08.S2(NMHC)", "PT08.S4(NO2)", "AQI_Label"]
+MANIFEST = "manifest.json"
+HOUR = timedelta(hours=1)
+
+# Phiên bản đang mở: ``key`` là (inode, mtime) của manifest, ``base``/``origin`` là giờ đầu
+# (datetime64[h] và datetime), ``values`` là ndarray trỏ vào vùng memory-map.
+_Version = namedtuple("_Version", ["key", "base", "origin", "values", "number", "covered"])
+
+
+def hour_stamps(years, months, days, hours):
+    """Mảng datetime64[h] từ các mảng năm, tháng, ngày, giờ."""
+    month_index = (np.asarray(years, dtype=np.int64) - 1970) * 12 + np.asarray(months, dtype=np.int64) - 1
+    dates = month_index.astype("datetime64[M]").astype("datetime64[D]") + (np.asarray(days, dtype=np.int64) - 1)
+    return dates.astype("datetime64[h]") + np.asarray(hours, dtype=np.int64)
+
+
+def stamp_fields(stamps):
+    """{year, month, day, hour} (mảng int64) từ mảng datetime64[h]."""
+    dates = stamps.astype("datetime64[D]")
+    months = stamps.astype("datetime64[M]")
+    month_index = months.astype(np.int64)
+    return {
+        "year": month_index // 12 + 1970,
+        "month": month_index % 12 + 1,
+        "day": (dates - months.astype("datetime64[D]")).astype(np.int64) + 1,
+        "hour": (stamps - dates.astype("datetime64[h]")).astype(np.int64),
+    }
+
+
+def _year_start(stamp):
+    return stamp.astype("datetime64[Y]").astype("datetime64[h]")
+
+
+def _year_end(stamp):
+    """0h ngày 1/1 của năm kế tiếp (mốc cuối, không bao gồm)."""
+    return (stamp.astype("datetime64[Y]") + 1).astype("datetime64[h]")
+
+
+def _split_rows(rows):
+    """(stamps, values) từ các dòng theo thứ tự cột ``SOURCE_COLUMNS``."""
+    block = np.asarray(rows, dtype=np.float64).reshape(-1, 4 + len(COLUMNS))
+    return hour_stamps(*block[:, :4].astype(np.int64).T), block[:, 4:]
+
+
+class TimeSeriesIndex:
+    """Mảng dày theo giờ trong thư mục ``path``; đọc không cần khóa, ghi giữ khóa file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._version = None
+        self._lock_depth = 0
+        self.lookups = 0
+        self.updates = 0
+
+    @property
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, MANIFEST))
+
+    def _current(self):
+        """``_Version`` hiện tại, mở lại khi manifest đổi; None nếu chưa dựng."""
+        try:
+            info = os.stat(os.path.join(self.path, MANIFEST))
+        except FileNotFoundError:
+            return None
+        key = (info.st_ino, info.st_mtime_ns)
+        version = self._version
+        if version is None or version.key != key:
+            with self._lock:
+                with open(os.path.join(self.path, MANIFEST)) as f:
+                    manifest = json.load(f)
+                # ndarray thường trỏ vào vùng memory-map: cắt mảng không tốn chi phí của np.memmap.
+                values = np.asarray(np.load(os.path.join(self.path, f"v{manifest['version']}.npy"), mmap_mode="r"))
+                # Manifest cũ không có ``covered``: không trả lời từ chỉ mục cho tới khi dựng lại.
+                covered = manifest.get("covered")
+                version = self._version = _Version(key, np.datetime64(manifest["start"], "h"),
+                                                   datetime.fromisoformat(manifest["start"]), values,
+                                                   manifest["version"],
+                                                   tuple(map(datetime.fromisoformat, covered)) if covered else None)
+        return version
+
+    # --- Đọc ---
+
+    def _window(self, start, end):
+        """(giờ đầu, khối giá trị) của [start, end] trong phần đã có chỉ mục; None nếu chưa dựng."""
+        current = self._current()
+        if current is None:
+            return None
+        values = current.values
+        self.lookups += 1
+        first = (start - current.origin) // HOUR
+        last = (end - current.origin) // HOUR + 1
+        first, last = min(max(first, 0), len(values)), min(max(last, 0), len(values))
+        return current.base + first, values[first:max(first, last)]
+
+    def covers(self, start, end):
+        """[start, end] nằm trọn trong khoảng nguồn dựng chỉ mục đã phủ."""
+        current = self._current()
+        return (current is not None and current.covered is not None
+                and current.covered[0] <= start and end <= current.covered[1])
+
+    def point(self, moment):
+        """{cột: giá trị} tại giờ ``moment``; None nếu giờ đó không có dữ liệu."""
+        window = self._window(moment, moment)
+        if window is None or not len(window[1]) or np.isnan(window[1][0, 0]):
+            return None
+        return dict(zip(COLUMNS, window[1][0].tolist()))
+
+    def range_values(self, start, end):
+        """Mảng (n, 6) float64 các giờ có dữ liệu trong [start, end] theo thứ tự thời gian;
+        None nếu chưa dựng chỉ mục hoặc khoảng nằm ngoài phần chỉ mục phủ."""
+        if not self.covers(start, end):
+            return None
+        window = self._window(start, end)
+        if window is None:
+            return None
+        block = window[1]
+        return block[~np.isnan(block[:, 0])]
+
+    def query_frame(self, year, month=None, day=None, hour=None):
+        """DataFrame như ``PollutionStore.query_pollution_data``; None nếu chỉ mục không trả
+        lời được (thiếu năm, ngày không hợp lệ, chưa dựng chỉ mục, khoảng ngoài phần chỉ mục phủ)."""
+        if year is None:
+            return None
+        try:
+            start, end, filters = query_bounds(year, month, day, hour)
+        except ValueError:
+            return None
+        if not self.covers(start, end):
+            return None
+        window = self._window(start, end)
+        if window is None:
+            return None
+        first, block = window
+        present = np.flatnonzero(~np.isnan(block[:, 0]))
+        fields = stamp_fields(first + present)
+        keep = np.ones(len(present), dtype=bool)
+        for name, value in filters:
+            keep &= fields[name] == value
+        # pandas chỉ cần khi trả kết quả, không import lúc khởi động worker.
+        import pandas as pd
+
+        if not keep.any():
+            return pd.DataFrame()
+        fields["aqi_label"] = block[present, COLUMNS.index("aqi_label")]
+        return pd.DataFrame({name: fields[name][keep] for name in column_names(QUERY_COLUMNS)})
+
+    def stats(self):
+        current = self._current()
+        if current is None:
+            return {"path": self.path, "built": False}
+        return {
+            "path": self.path,
+            "built": True,
+            "start": str(current.base),
+            "hours": len(current.values),
+            "covered": [moment.isoformat(timespec="hours") for moment in current.covered] if current.covered else None,
+            "hours_with_data": int(np.count_nonzero(~np.isnan(current.values[:, 0]))),
+            "lookups": self.lookups,
+            "updates": self.updates,
+        }
+
+    # --- Ghi ---
+
+    @contextlib.contextmanager
+    def _write_lock(self):
+        """Khóa ghi giữa các luồng và (trên POSIX) giữa các tiến trình dùng chung thư mục."""
+        with self._lock:
+            # Khóa lồng nhau (vd. build_from_store gọi rebuild) không mở lại file khóa.
+            if fcntl is None or self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, ".lock"), "w") as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _publish(self, base, hours, previous=None):
+        """Ghi phiên bản mới gồm ``hours`` giờ từ ``base`` (chép dữ liệu của ``_Version``
+        ``previous`` nếu có), trả về memory-map ghi được; manifest chỉ được thay sau ``_commit``."""
+        version = (previous.number if previous is not None else 0) + 1
+        while os.path.exists(os.path.join(self.path, f"v{version}.npy")):
+            version += 1
+        os.makedirs(self.path, exist_ok=True)
+        array = np.lib.format.open_memmap(os.path.join(self.path, f"v{version}.npy"), mode="w+",
+                                          dtype=np.float64, shape=(hours, len(COLUMNS)))
+        array[:] = np.nan
+        if previous is not None:
+            offset = int((previous.base - base).astype(np.int64))
+            array[offset:offset + len(previous.values)] = previous.values
+        return version, array
+
+    def _commit(self, version, base, array, covered=None):
+        array.flush()
+        temporary = os.path.join(self.path, MANIFEST + ".tmp")
+        manifest = {"version": version, "start": str(base), "hours": int(len(array))}
+        if covered is not None:
+            manifest["covered"] = [moment.isoformat(timespec="hours") for moment in covered]
+        with open(temporary, "w") as f:
+            json.dump(manifest, f)
+        os.replace(temporary, os.path.join(self.path, MANIFEST))
+        # Worker khác đang giữ memory-map phiên bản cũ vẫn đọc được trên Linux cho tới khi mở lại.
+        for entry in os.listdir(self.path):
+            if entry.startswith("v") and entry.endswith(".npy") and entry != f"v{version}.npy":
+                with contextlib.suppress(OSError):
+                    os.remove(os.path.join(self.path, entry))
+
+    def update(self, stamps, values):
+        """Ghi các giờ ``stamps`` (datetime64[h]) với ``values`` (n, 6), mở rộng chỉ mục theo năm nếu cần."""
+        stamps = np.asarray(stamps, dtype="datetime64[h]")
+        if not len(stamps):
+            return
+        values = np.asarray(values, dtype=np.float64)
+        with self._write_lock():
+            current = self._current()
+            low, high = _year_start(stamps.min()), _year_start(stamps.max())
+            if current is not None:
+                low = min(low, current.base)
+                high = max(high, _year_start(current.base + len(current.values) - 1))
+            start, end = low, _year_end(high)
+            hours = int((end - start).astype(np.int64))
+            if current is not None and start == current.base and hours == len(current.values):
+                version = None
+                array = np.load(os.path.join(self.path, f"v{current.number}.npy"), mmap_mode="r+")
+            else:
+                version, array = self._publish(start, hours, current)
+            array[(stamps - start).astype(np.int64)] = values
+            if version is None:
+                array.flush()
+            else:
+                self._commit(version, start, array, current.covered if current is not None else None)
+            self.updates += len(stamps)
+
+    def update_frame(self, df):
+        """Ghi các dòng của DataFrame dạng Data/processed_AQI_data.csv."""
+        self.update(hour_stamps(df["Year"], df["Month"], df["Day"], df["Hour"]),
+                    df[CSV_VALUE_COLUMNS].to_numpy(dtype=np.float64))
+
+    def update_rows(self, rows):
+        """Ghi các dòng theo thứ tự cột ``SOURCE_COLUMNS`` (trang của ``iter_pollution_pages``)."""
+        self.update(*_split_rows(rows))
+
+    def load_range(self, store, start, end, fetch_size=5000):
+        """Đọc lại [start, end] từ backend lưu trữ vào chỉ mục (vd. sau khi cập nhật nhãn)."""
+        for page in store.iter_pollution_pages(start, end, SOURCE_COLUMNS, fetch_size):
+            self.update_rows(page)
+
+    def rebuild(self, blocks, first=None, last=None, covered=None):
+        """Dựng lại toàn bộ chỉ mục từ các khối (stamps, values) trải trong [``first``, ``last``]
+        (datetime64[h]); ``covered`` là (datetime, datetime) nguồn phủ trọn, mặc định
+        [``first``, ``last``]. Người đọc chỉ thấy phiên bản mới khi đã ghi xong."""
+        with self._write_lock():
+            if first is None:
+                # Chỉ mục rỗng vẫn có một năm NaN (không memory-map được file rỗng).
+                first = last = np.datetime64(f"{datetime.now().year}-01-01T00", "h")
+            elif covered is None:
+                covered = (first.astype(datetime), last.astype(datetime))
+            start, end = _year_start(first), _year_end(last)
+            version, array = self._publish(start, int((end - start).astype(np.int64)))
+            for stamps, values in blocks:
+                array[(stamps - start).astype(np.int64)] = values
+            self._commit(version, start, array, covered)
+
+    def build_from_csv(self, csv_path):
+        import pandas as pd
+
+        df = pd.read_csv(csv_path)
+        stamps = hour_stamps(df["Year"], df["Month"], df["Day"], df["Hour"])
+        if not len(stamps):
+            return self.rebuild([])
+        self.rebuild([(stamps, df[CSV_VALUE_COLUMNS].to_numpy(dtype=np.float64))], stamps.min(), stamps.max())
+
+    def build_from_store(self, store, fetch_size=5000):
+        """Dựng lại từ mọi phân vùng (year, month) của backend lưu trữ; chỉ mục phủ trọn các năm
+        đó vì tháng không có phân vùng là tháng không có dữ liệu."""
+        months = store.partitions()
+        if not months:
+            return self.rebuild([])
+        first = np.datetime64(f"{months[0][0]:04d}-{months[0][1]:02d}", "M").astype("datetime64[h]")
+        last = (np.datetime64(f"{months[-1][0]:04d}-{months[-1][1]:02d}", "M") + 1).astype("datetime64[h]") - 1
+        pages = store.iter_pollution_pages(first.astype(datetime), last.astype(datetime), SOURCE_COLUMNS, fetch_size)
+        covered = (_year_start(first).astype(datetime), (_year_end(last) - 1).astype(datetime))
+        self.rebuild((_split_rows(page) for page in pages), first, last, covered)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Chỉ mục tại ``Config.TS_INDEX_PATH``; None nếu không cấu hình hoặc chưa dựng."""
+    global _index
+    if not Config.TS_INDEX_PATH:
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = TimeSeriesIndex(Config.TS_INDEX_PATH)
+    return _index if _index.exists else None
+
+
+def ensure_index():
+    """Dựng chỉ mục từ ``Config.TS_INDEX_SOURCE`` nếu bật mà chưa có hoặc manifest chưa ghi
+    ``covered`` (gọi khi khởi động; các worker khởi động cùng lúc chờ nhau qua khóa file nên
+    chỉ một worker dựng)."""
+    if not Config.TS_INDEX_PATH:
+        return None
+    get_index()
+    with _index._write_lock():
+        if not _index.exists or _index._current().covered is None:
+            try:
+                if Config.TS_INDEX_SOURCE == "database":
+                    import storage
+
+                    _index.build_from_store(storage.get_store())
+                else:
+                    _index.build_from_csv(Config.TS_INDEX_CSV)
+                logger.info("Đã dựng chỉ mục thời gian: %s", _index.stats())
+            except Exception as e:
+                logger.error("Không dựng được chỉ mục thời gian: %s", e)
+    return get_index()
+
+
+def record_frame(df):
+    """Cập nhật chỉ mục (nếu có) sau khi ghi DataFrame dạng processed_AQI_data.csv;
+    lỗi chỉ mục không làm hỏng lần ghi dữ liệu gốc."""
+    index = get_index()
+    if index is None or df.empty:
+        return
+    try:
+        index.update_frame(df)
+    except Exception as e:
+        logger.warning("Không cập nhật được chỉ mục thời gian: %s", e)
+
+
+def reload_range(store, start, end):
+    """Đọc lại [start, end] từ ``store`` vào chỉ mục (nếu có) sau khi dữ liệu gốc đổi."""
+    index = get_index()
+    if index is None:
+        return
+    try:
+        index.load_range(store, start, end)
+    except Exception as e:
+        logger.warning("Không cập nhật được chỉ mục thời gian: %s", e)
+
+
+def stats():
+    index = get_index()
+    return index.stats() if index is not None else None
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Dựng lại chỉ mục thời gian")
+    build.add_argument("--path", default=Config.TS_INDEX_PATH or "Data/ts_index")
+    build.add_argument("--csv", help="File CSV đã xử lý (Data/processed_AQI_data.csv)")
+    build.add_argument("--from-database", action="store_true", help="Đọc từ backend STORAGE_BACKEND")
+    args = parser.parse_args()
+
+    index = TimeSeriesIndex(args.path)
+    begin = time.perf_counter()
+    if args.from_database:
+        import db_pool
+        import storage
+
+        try:
+            index.build_from_store(storage.get_store())
+        finally:
+            db_pool.shutdown_pool()
+    elif args.csv:
+        index.build_from_csv(args.csv)
+    else:
+        parser.error("cần --csv hoặc --from-database")
+    print(f"✅ Đã dựng chỉ mục trong {time.perf_counter() - begin:.1f}s: {index.stats()}")
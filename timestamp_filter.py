@@ -0,0 +1,209 @@
+"""
+🌸 Bloom filter các giờ đã có dữ liệu, để tool thêm dữ liệu không phải đọc database
+trước mỗi lần ghi.
+
+Khóa là giờ đo (số giờ tính từ 1970, như ``timeseries_index.hour_stamps``). Filter
+được dựng trong luồng nền lúc khởi động (prewarm) bằng cách đọc các cột
+(year, month, day, hour) của mọi phân vùng, sau đó mỗi lần ghi (``insert_data``, tool
+thêm dữ liệu, /api/ingest) thêm các giờ vừa ghi. Request không bao giờ chờ dựng filter:
+khi filter chưa sẵn sàng, ``lookup`` trả None (bên gọi đọc kiểm tra như khi tắt filter) và
+khởi động luồng dựng nếu chưa có.
+
+``lookup`` trả lời "chưa có" ngay khi filter nói không (chắc chắn đúng) nên giờ mới
+được ghi thẳng; "có thể có" được xác nhận bằng một lần đọc theo khóa trong đúng phân
+vùng, vì một lần sai dương (xác suất ``Config.EXISTS_FILTER_ERROR_RATE``) mà không
+kiểm tra sẽ làm mất số đo mới.
+
+Filter nằm trong bộ nhớ từng tiến trình: giờ do worker khác ghi sau khi filter dựng xong
+có thể bị báo "chưa có", khi đó lần ghi là upsert theo khóa xác định (``storage.row_id``)
+nên không sinh bản ghi trùng nhưng ghi đè số đo của giờ đó. Khi chạy nhiều worker cùng
+ghi mà cần báo "exists" chính xác, tắt ``EXISTS_FILTER`` để mọi lần thêm đều đọc kiểm tra.
+"""
+
+import math
+import threading
+
+import numpy as np
+
+import metrics
+from config import Config
+
+logger = metrics.get_logger("timestamp_filter")
+
+KEY_COLUMNS = "year,month,day,hour"
+# Số bit 1 của từng giá trị byte, để tính tỉ lệ bit đã bật.
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def _mix(values):
+    """splitmix64 trên mảng uint64 (phép nhân tràn số là modulo 2^64)."""
+    z = values + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def hour_keys(years, months, days, hours):
+    """Mảng khóa int64 (số giờ từ 1970) từ các mảng năm, tháng, ngày, giờ."""
+    from timeseries_index import hour_stamps
+
+    return hour_stamps(years, months, days, hours).astype(np.int64)
+
+
+class BloomFilter:
+    """Bloom filter trên khóa số nguyên; ``hashes`` vị trí bit sinh bằng băm kép từ splitmix64."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits = max(64, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._array = np.zeros((self.bits + 7) // 8, dtype=np.uint8)
+        self._steps = np.arange(self.hashes, dtype=np.uint64)
+        self._lock = threading.Lock()
+        self.added = 0
+        self.outcomes = {"absent": 0, "exists": 0, "false_positive": 0}
+
+    def _positions(self, keys):
+        """Mảng (số khóa, hashes) vị trí bit."""
+        keys = np.asarray(keys, dtype=np.int64).astype(np.uint64).reshape(-1, 1)
+        first = _mix(keys)
+        second = _mix(first) | np.uint64(1)
+        return (first + self._steps * second) % np.uint64(self.bits)
+
+    def add_many(self, keys):
+        positions = self._positions(keys).ravel()
+        masks = np.left_shift(np.uint8(1), (positions & np.uint64(7)).astype(np.uint8))
+        with self._lock:
+            np.bitwise_or.at(self._array, positions >> np.uint64(3), masks)
+            self.added += positions.size // self.hashes
+
+    def contains_many(self, keys):
+        """Mảng bool: False là chắc chắn chưa thêm, True là có thể đã thêm."""
+        positions = self._positions(keys)
+        bits = (self._array[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+        return bits.all(axis=1)
+
+    def __contains__(self, key):
+        return bool(self.contains_many([key])[0])
+
+    def stats(self):
+        fill = int(_POPCOUNT[self._array].sum(dtype=np.int64)) / self.bits
+        return {
+            "added": self.added,
+            "capacity": self.capacity,
+            "bits": self.bits,
+            "hashes": self.hashes,
+            "fill_ratio": round(fill, 4),
+            # Xác suất sai dương ước lượng từ tỉ lệ bit đã bật.
+            "estimated_error_rate": round(fill ** self.hashes, 6),
+            **self.outcomes,
+        }
+
+
+_filter = None
+_building = None
+_builder = None
+_lock = threading.Lock()
+
+
+def build(store):
+    """Filter chứa mọi giờ đang có trong ``store``. Các giờ được ghi trong lúc dựng cũng
+    được thêm (qua ``record_*``), nên không sót giờ nào ghi xen vào lúc đọc."""
+    global _building
+    bloom = _building = BloomFilter(Config.EXISTS_FILTER_CAPACITY, Config.EXISTS_FILTER_ERROR_RATE)
+    partitions = store.partitions()
+    if partitions:
+        from storage import time_bounds
+
+        start, end = time_bounds(*partitions[0])[0], time_bounds(*partitions[-1])[1]
+        for page in store.iter_pollution_pages(start, end, KEY_COLUMNS, fetch_size=5000):
+            block = np.asarray(page, dtype=np.int64).reshape(-1, 4)
+            if len(block):
+                bloom.add_many(hour_keys(*block.T))
+    return bloom
+
+
+def get_filter(store=None):
+    """Filter của ``store`` (mặc định ``storage.get_store()``), dựng ở lần gọi đầu; None nếu tắt
+    hoặc dựng lỗi (lần gọi sau thử lại)."""
+    global _filter, _building
+    if not Config.EXISTS_FILTER:
+        return None
+    if _filter is None:
+        with _lock:
+            if _filter is None:
+                if store is None:
+                    import storage
+
+                    store = storage.get_store()
+                try:
+                    with metrics.span("db", "exists_filter_build"):
+                        _filter = build(store)
+                except Exception as e:
+                    logger.warning("Không dựng được Bloom filter, ghi không qua filter: %s", e)
+                    return None
+                finally:
+                    _building = None
+                logger.info("Đã dựng Bloom filter giờ có dữ liệu: %s", _filter.stats())
+    return _filter
+
+
+def build_in_background(store=None):
+    """Dựng filter (``get_filter``) trong một luồng daemon nếu bật, chưa dựng và chưa có luồng nào đang dựng."""
+    global _builder
+    if not Config.EXISTS_FILTER:
+        return
+    with _lock:
+        if _filter is not None or (_builder is not None and _builder.is_alive()):
+            return
+        _builder = threading.Thread(target=get_filter, args=(store,), name="exists-filter", daemon=True)
+        _builder.start()
+
+
+def lookup(store, year, month, day, hour, confirm):
+    """True/False nếu giờ đã có/chưa có dữ liệu; None nếu filter tắt hoặc chưa dựng xong (bên gọi
+    tự đọc kiểm tra). Filter nói "chưa có" thì trả False không cần đọc; "có thể có" thì hỏi ``confirm()``."""
+    bloom = _filter if Config.EXISTS_FILTER else None
+    if bloom is None:
+        build_in_background(store)
+        return None
+    if hour_keys([year], [month], [day], [hour])[0] not in bloom:
+        bloom.outcomes["absent"] += 1
+        return False
+    found = bool(confirm())
+    bloom.outcomes["exists" if found else "false_positive"] += 1
+    return found
+
+
+def _current():
+    return _filter if _filter is not None else _building
+
+
+def record_hours(years, months, days, hours):
+    """Thêm các giờ vừa ghi vào filter (nếu đã dựng hoặc đang dựng)."""
+    bloom = _current()
+    if bloom is None or len(years) == 0:
+        return
+    try:
+        bloom.add_many(hour_keys(years, months, days, hours))
+    except Exception as e:
+        logger.warning("Không cập nhật được Bloom filter: %s", e)
+
+
+def record_frame(df):
+    """Như ``record_hours`` cho DataFrame dạng processed_AQI_data.csv."""
+    if _current() is None or df.empty:
+        return
+    record_hours(df["Year"].to_numpy(), df["Month"].to_numpy(), df["Day"].to_numpy(), df["Hour"].to_numpy())
+
+
+def reset():
+    """Bỏ filter hiện tại (vd. sau khi dữ liệu bị xóa); lần ``lookup`` sau dựng lại trong luồng nền."""
+    global _filter
+    with _lock:
+        _filter = None
+
+
+def stats():
+    return _filter.stats() if _filter is not None else None
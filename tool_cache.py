@@ -0,0 +1,79 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+import prompt_rules
+
+
+class ToolSelectionCache:
+    """Cache (tool, tham số) mà Claude đã chọn cho một câu hỏi.
+
+    Khóa là câu hỏi đã chuẩn hóa (``prompt_rules.normalize``), mỗi mục sống tối đa
+    ``ttl`` giây và bị loại theo LRU khi vượt ``max_entries``. Khi cache trượt,
+    bộ luật ``rules`` (mặc định ``prompt_rules.extract_tool_call``) được thử trước
+    khi phải hỏi Claude.
+    """
+
+    def __init__(self, max_entries=1024, ttl=86400, rules=prompt_rules.extract_tool_call, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.rules = rules
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.rule_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, prompt):
+        """(tên hàm, tham số) từ cache hoặc bộ luật; None nếu phải hỏi Claude."""
+        key = prompt_rules.normalize(prompt)
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, function_name, arguments = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return function_name, copy.deepcopy(arguments)
+                del self._entries[key]
+
+        call = self.rules(prompt) if self.rules is not None else None
+        with self._lock:
+            if call is None:
+                self.misses += 1
+                return None
+            self.rule_hits += 1
+        self.store(prompt, *call)
+        return call[0], copy.deepcopy(call[1])
+
+    def store(self, prompt, function_name, arguments):
+        if self.max_entries <= 0:
+            return
+        key = prompt_rules.normalize(prompt)
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, function_name, copy.deepcopy(arguments))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.rule_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "rule_hits": self.rule_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.rule_hits) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+🏋️ Huấn luyện lại mô hình phân loại AQI từ file CSV đã xử lý hoặc từ kho lưu trữ
+(Cassandra / kho cột) mà không nạp toàn bộ dữ liệu vào bộ nhớ.
+
+Dữ liệu đi qua pipeline ``tf.data``: đọc từng dòng (CSV, có thể nhiều file) hoặc từng
+trang (kho lưu trữ), chia train/validation cố định theo số thứ tự dòng, xáo trộn trong
+bộ đệm có seed, gom batch, giải mã song song rồi prefetch. Thống kê chuẩn hóa (mean,
+variance từng đặc trưng trên tập train) được tính trong một lượt đọc theo chunk và lưu
+cache theo dấu vân tay của nguồn dữ liệu. Lớp Normalization đầu mô hình mang thống kê
+này, nên mô hình vẫn nhận 9 đặc trưng thô như ``air_quality_model.h5`` và
+inference_engine / numpy_model dùng được ngay.
+
+Mỗi lần chạy ghi một phiên bản mới:
+
+    model_ML/versions/v0003/air_quality_model.h5
+    model_ML/versions/v0003/air_quality_model.npz     (backend numpy)
+    model_ML/versions/v0003/metrics.json              (độ chính xác, lịch sử, thời gian, RSS đỉnh...)
+
+    python train_model.py --epochs 30
+    python train_model.py --csv "Data/shards/*.csv" --batch-size 1024
+    python train_model.py --source database --start 2004-03-01 --end 2005-04-30
+    python train_model.py --epochs 30 --promote        # chép sang MODEL_PATH / NUMPY_MODEL_PATH
+"""
+
+import glob
+import hashlib
+import json
+import os
+import platform
+import shutil
+import sys
+import time
+
+import numpy as np
+
+from batch_predict import CASSANDRA_FEATURE_COLUMNS, CSV_FEATURE_COLUMNS
+from config import Config
+from inference_engine import POLLUTION_LEVELS
+
+LABEL_COLUMN = "AQI_Label"
+STORE_COLUMNS = ",".join(CASSANDRA_FEATURE_COLUMNS + ["aqi_label"])
+VERSIONS_DIR = "model_ML/versions"
+STATS_CACHE = "model_ML/feature_stats.json"
+
+
+def peak_rss_mb():
+    """RSS đỉnh của tiến trình (MB); None nếu hệ điều hành không hỗ trợ (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về byte.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class FeatureStats:
+    """Mean/variance từng cột, cộng dồn qua nhiều chunk (gộp theo công thức Chan, ổn định
+    số học với các cột có giá trị lớn như Year), kèm số dòng theo nhãn."""
+
+    def __init__(self, width):
+        self.count = 0
+        self.mean = np.zeros(width)
+        self.m2 = np.zeros(width)
+        self.class_counts = np.zeros(len(POLLUTION_LEVELS), dtype=np.int64)
+
+    def update(self, features, labels):
+        if len(features) == 0:
+            return
+        features = np.asarray(features, dtype=np.float64)
+        count = len(features)
+        mean = features.mean(axis=0)
+        m2 = ((features - mean) ** 2).sum(axis=0)
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / total
+        self.count = total
+        self.class_counts += np.bincount(np.asarray(labels, dtype=np.int64), minlength=len(POLLUTION_LEVELS))
+
+    @property
+    def variance(self):
+        return self.m2 / max(self.count, 1)
+
+    def to_dict(self):
+        return {"count": self.count, "mean": self.mean.tolist(), "variance": self.variance.tolist(),
+                "class_counts": self.class_counts.tolist()}
+
+
+def _keep(index, every, training):
+    """Mặt nạ chia train/validation cố định: mỗi dòng thứ ``every`` vào validation."""
+    holdout = index % every == 0
+    return ~holdout if training else holdout
+
+
+class CsvSource:
+    """Một hoặc nhiều file CSV dạng processed_AQI_data.csv (đường dẫn hoặc glob)."""
+
+    def __init__(self, pattern):
+        self.files = sorted(glob.glob(pattern)) or [pattern]
+        missing = [path for path in self.files if not os.path.exists(path)]
+        if missing:
+            raise FileNotFoundError(f"Không tìm thấy {', '.join(missing)}")
+        with open(self.files[0], encoding="utf-8") as f:
+            self.header = f.readline().strip().split(",")
+        self.feature_positions = [self.header.index(column) for column in CSV_FEATURE_COLUMNS]
+        self.label_position = self.header.index(LABEL_COLUMN)
+
+    def describe(self):
+        return {"type": "csv", "files": self.files}
+
+    def fingerprint(self):
+        parts = [f"{os.path.abspath(path)}:{os.path.getsize(path)}:{os.stat(path).st_mtime_ns}" for path in self.files]
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+    def chunks(self, chunk_rows):
+        """(đặc trưng, nhãn, chỉ số dòng toàn cục) theo từng chunk, cho lượt tính thống kê."""
+        import pandas as pd
+
+        offset = 0
+        for path in self.files:
+            for chunk in pd.read_csv(path, usecols=CSV_FEATURE_COLUMNS + [LABEL_COLUMN], chunksize=chunk_rows):
+                yield (chunk[CSV_FEATURE_COLUMNS].to_numpy(np.float64), chunk[LABEL_COLUMN].to_numpy(np.int64),
+                       offset + np.arange(len(chunk)))
+                offset += len(chunk)
+
+    def dataset(self, tf, training, every, batch_size, shuffle_buffer, seed):
+        lines = tf.data.Dataset.from_tensor_slices(self.files).interleave(
+            lambda path: tf.data.TextLineDataset(path).skip(1),
+            cycle_length=1, num_parallel_calls=tf.data.AUTOTUNE, deterministic=True)
+        # cycle_length=1 giữ thứ tự dòng giống lượt thống kê, để chia train/validation khớp nhau.
+        keep = tf.not_equal if training else tf.equal
+        lines = lines.enumerate().filter(lambda index, _: keep(index % every, 0)).map(lambda _, line: line)
+        if training:
+            lines = lines.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+        defaults = [[0.0]] * len(self.header)
+        features, label = self.feature_positions, self.label_position
+
+        def decode(batch):
+            fields = tf.io.decode_csv(batch, record_defaults=defaults)
+            return (tf.stack([fields[position] for position in features], axis=1),
+                    tf.cast(fields[label], tf.int32))
+
+        return lines.batch(batch_size).map(decode, num_parallel_calls=tf.data.AUTOTUNE, deterministic=True)
+
+
+class StoreSource:
+    """Khoảng [start, end] trong kho lưu trữ đang cấu hình (``storage.get_store()``)."""
+
+    def __init__(self, start, end, fetch_size=5000):
+        import storage
+
+        self.store = storage.get_store()
+        self.start, self.end = start, end
+        self.fetch_size = fetch_size
+
+    def describe(self):
+        return {"type": self.store.backend, "start": self.start.isoformat(), "end": self.end.isoformat()}
+
+    def fingerprint(self):
+        # Không có cách rẻ để biết dữ liệu trong phân vùng đổi; dùng --refresh-stats sau khi nạp thêm.
+        parts = [self.store.backend, self.start.isoformat(), self.end.isoformat(), repr(self.store.partitions())]
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+    def _pages(self):
+        offset = 0
+        for page in self.store.iter_pollution_pages(self.start, self.end, STORE_COLUMNS, self.fetch_size):
+            block = np.asarray(page, dtype=np.float64).reshape(-1, len(CASSANDRA_FEATURE_COLUMNS) + 1)
+            yield block[:, :-1], block[:, -1].astype(np.int64), offset + np.arange(len(block))
+            offset += len(block)
+
+    def chunks(self, chunk_rows):
+        return self._pages()
+
+    def dataset(self, tf, training, every, batch_size, shuffle_buffer, seed):
+        def pages():
+            for features, labels, index in self._pages():
+                keep = _keep(index, every, training)
+                yield features[keep].astype(np.float32), labels[keep].astype(np.int32)
+
+        rows = tf.data.Dataset.from_generator(pages, output_signature=(
+            tf.TensorSpec([None, len(CASSANDRA_FEATURE_COLUMNS)], tf.float32),
+            tf.TensorSpec([None], tf.int32))).unbatch()
+        if training:
+            rows = rows.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+        return rows.batch(batch_size)
+
+
+def feature_stats(source, every, cache_path=STATS_CACHE, refresh=False, chunk_rows=100_000):
+    """(thống kê tập train, lấy từ cache hay không); cache theo dấu vân tay nguồn và cách chia."""
+    key = f"{source.fingerprint()}:{every}"
+    if cache_path and not refresh and os.path.exists(cache_path):
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if cached.get("key") == key:
+            return cached, True
+    stats = FeatureStats(len(CSV_FEATURE_COLUMNS))
+    for features, labels, index in source.chunks(chunk_rows):
+        keep = _keep(index, every, True)
+        stats.update(features[keep], labels[keep])
+    if stats.count == 0:
+        raise ValueError("Nguồn dữ liệu không có dòng nào để huấn luyện")
+    result = {"key": key, "columns": CSV_FEATURE_COLUMNS, **stats.to_dict()}
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        temporary = cache_path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(result, f)
+        os.replace(temporary, cache_path)
+    return result, False
+
+
+def build_model(keras, stats, learning_rate=1e-3, dropout=0.3):
+    """Cùng kiến trúc với air_quality_model.h5, thêm lớp Normalization mang thống kê đã tính."""
+    normalization = keras.layers.Normalization(axis=-1)
+    model = keras.Sequential([
+        keras.Input((len(CSV_FEATURE_COLUMNS),)),
+        normalization,
+        keras.layers.Dense(256, activation="relu"),
+        keras.layers.BatchNormalization(),
+        keras.layers.Dropout(dropout),
+        keras.layers.Dense(128, activation="relu"),
+        keras.layers.BatchNormalization(),
+        keras.layers.Dropout(dropout),
+        keras.layers.Dense(64, activation="relu"),
+        keras.layers.BatchNormalization(),
+        keras.layers.Dense(len(POLLUTION_LEVELS), activation="softmax"),
+    ])
+    normalization.set_weights([np.asarray(stats["mean"], dtype=np.float32),
+                               np.asarray(stats["variance"], dtype=np.float32), np.int64(stats["count"])])
+    normalization.finalize_state()
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate), loss="sparse_categorical_crossentropy",
+                  metrics=["accuracy"])
+    return model
+
+
+def next_version_dir(root=VERSIONS_DIR):
+    os.makedirs(root, exist_ok=True)
+    numbers = [int(name[1:]) for name in os.listdir(root) if name.startswith("v") and name[1:].isdigit()]
+    path = os.path.join(root, f"v{max(numbers, default=0) + 1:04d}")
+    os.makedirs(path)
+    return path
+
+
+def confusion_matrix(tf, model, dataset):
+    matrix = np.zeros((len(POLLUTION_LEVELS), len(POLLUTION_LEVELS)), dtype=np.int64)
+    for features, labels in dataset:
+        predicted = np.argmax(model(features, training=False), axis=1)
+        np.add.at(matrix, (labels.numpy(), predicted), 1)
+    return matrix
+
+
+def train(source, epochs=30, batch_size=512, shuffle_buffer=50_000, validation_split=0.1, seed=42,
+          threads=None, learning_rate=1e-3, patience=5, stats_cache=STATS_CACHE, refresh_stats=False,
+          deterministic=False, versions_dir=VERSIONS_DIR, export_numpy=True, verbose=2):
+    """Huấn luyện một phiên bản mới; trả về (thư mục phiên bản, dict metrics đã ghi)."""
+    started = time.perf_counter()
+    threads = threads or os.cpu_count() or 1
+    import tensorflow as tf
+    from tensorflow import keras
+
+    # Dùng mọi lõi CPU cho cả phép toán lẫn pipeline dữ liệu.
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(threads)
+    keras.utils.set_random_seed(seed)
+    if deterministic:
+        tf.config.experimental.enable_op_determinism()
+    every = max(2, round(1 / validation_split))
+
+    phase = time.perf_counter()
+    stats, cached = feature_stats(source, every, stats_cache, refresh_stats)
+    stats_seconds = time.perf_counter() - phase
+
+    options = tf.data.Options()
+    options.threading.private_threadpool_size = threads
+    options.deterministic = deterministic
+    train_data = source.dataset(tf, True, every, batch_size, shuffle_buffer, seed)
+    val_data = source.dataset(tf, False, every, batch_size, shuffle_buffer, seed)
+    train_data = train_data.with_options(options).prefetch(tf.data.AUTOTUNE)
+    val_data = val_data.with_options(options).prefetch(tf.data.AUTOTUNE)
+
+    model = build_model(keras, stats, learning_rate)
+    phase = time.perf_counter()
+    history = model.fit(train_data, validation_data=val_data, epochs=epochs, verbose=verbose, shuffle=False,
+                        callbacks=[keras.callbacks.EarlyStopping(monitor="val_loss", patience=patience,
+                                                                 restore_best_weights=True)])
+    fit_seconds = time.perf_counter() - phase
+
+    val_loss, val_accuracy = model.evaluate(val_data, verbose=0)
+    matrix = confusion_matrix(tf, model, val_data)
+    version_dir = next_version_dir(versions_dir)
+    model_path = os.path.join(version_dir, "air_quality_model.h5")
+    model.save(model_path)
+    if export_numpy:
+        from numpy_model import export_npz
+
+        export_npz(model_path, os.path.join(version_dir, "air_quality_model.npz"))
+
+    result = {
+        "version": os.path.basename(version_dir),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "source": source.describe(),
+        "params": {"epochs": epochs, "batch_size": batch_size, "shuffle_buffer": shuffle_buffer,
+                   "validation_split": 1 / every, "seed": seed, "threads": threads,
+                   "learning_rate": learning_rate, "patience": patience, "deterministic": deterministic},
+        "rows": {"train": stats["count"], "validation": int(matrix.sum())},
+        "class_counts": dict(zip(POLLUTION_LEVELS, stats["class_counts"])),
+        "normalization": {"columns": stats["columns"], "mean": stats["mean"], "variance": stats["variance"],
+                          "cached": cached},
+        "epochs_run": len(history.history["loss"]),
+        "history": {key: [round(float(value), 6) for value in values] for key, values in history.history.items()},
+        "val_loss": round(float(val_loss), 6),
+        "val_accuracy": round(float(val_accuracy), 6),
+        "confusion_matrix": matrix.tolist(),
+        "seconds": {"stats": round(stats_seconds, 3), "fit": round(fit_seconds, 3),
+                    "total": round(time.perf_counter() - started, 3)},
+        "peak_rss_mb": peak_rss_mb(),
+        "versions": {"python": platform.python_version(), "tensorflow": tf.__version__, "numpy": np.__version__},
+    }
+    with open(os.path.join(version_dir, "metrics.json"), "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    return version_dir, result
+
+
+def promote(version_dir):
+    """Chép mô hình của phiên bản sang ``Config.MODEL_PATH`` / ``Config.NUMPY_MODEL_PATH``."""
+    shutil.copyfile(os.path.join(version_dir, "air_quality_model.h5"), Config.MODEL_PATH)
+    npz = os.path.join(version_dir, "air_quality_model.npz")
+    if os.path.exists(npz):
+        shutil.copyfile(npz, Config.NUMPY_MODEL_PATH)
+
+
+if __name__ == "__main__":
+    import argparse
+    from datetime import datetime
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", choices=["csv", "database"], default="csv")
+    parser.add_argument("--csv", default="Data/processed_AQI_data.csv", help="File CSV đã xử lý hoặc glob nhiều file")
+    parser.add_argument("--start", help="Ngày bắt đầu khi đọc từ kho lưu trữ, YYYY-MM-DD")
+    parser.add_argument("--end", help="Ngày kết thúc khi đọc từ kho lưu trữ, YYYY-MM-DD")
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--shuffle-buffer", type=int, default=50_000, help="Số dòng trong bộ đệm xáo trộn")
+    parser.add_argument("--validation-split", type=float, default=0.1)
+    parser.add_argument("--learning-rate", type=float, default=1e-3)
+    parser.add_argument("--patience", type=int, default=5, help="Số epoch không cải thiện val_loss trước khi dừng")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--threads", type=int, default=None, help="Mặc định: mọi lõi CPU")
+    parser.add_argument("--deterministic", action="store_true",
+                        help="Kết quả lặp lại được từng bit (chậm hơn: tắt op không tất định)")
+    parser.add_argument("--stats-cache", default=STATS_CACHE)
+    parser.add_argument("--refresh-stats", action="store_true", help="Tính lại thống kê chuẩn hóa")
+    parser.add_argument("--versions-dir", default=VERSIONS_DIR)
+    parser.add_argument("--promote", action="store_true", help="Chép mô hình mới sang MODEL_PATH / NUMPY_MODEL_PATH")
+    args = parser.parse_args()
+
+    if args.source == "database":
+        if not (args.start and args.end):
+            parser.error("--source database cần --start và --end")
+        data_source = StoreSource(datetime.fromisoformat(args.start), datetime.fromisoformat(args.end).replace(hour=23))
+    else:
+        data_source = CsvSource(args.csv)
+
+    try:
+        path, metrics = train(data_source, epochs=args.epochs, batch_size=args.batch_size,
+                              shuffle_buffer=args.shuffle_buffer, validation_split=args.validation_split,
+                              seed=args.seed, threads=args.threads, learning_rate=args.learning_rate,
+                              patience=args.patience, stats_cache=args.stats_cache, refresh_stats=args.refresh_stats,
+                              deterministic=args.deterministic, versions_dir=args.versions_dir)
+    finally:
+        if args.source == "database":
+            import db_pool
+
+            db_pool.shutdown_pool()
+
+    print(f"✅ {metrics['version']}: val_accuracy {metrics['val_accuracy']:.4f}, val_loss {metrics['val_loss']:.4f} "
+          f"sau {metrics['epochs_run']} epoch ({metrics['rows']['train']} dòng train, "
+          f"{metrics['rows']['validation']} dòng validation)")
+    print(f"⏱️ Thời gian: thống kê {metrics['seconds']['stats']}s"
+          f"{' (cache)' if metrics['normalization']['cached'] else ''}, huấn luyện {metrics['seconds']['fit']}s, "
+          f"tổng {metrics['seconds']['total']}s | RSS đỉnh: {metrics['peak_rss_mb']} MB")
+    print(f"📁 {path}")
+    if args.promote:
+        promote(path)
+        print(f"📦 Đã chép sang {Config.MODEL_PATH} và {Config.NUMPY_MODEL_PATH}")
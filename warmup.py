@@ -0,0 +1,53 @@
+"""
+🔥 Nạp trước các phụ thuộc nặng (Anthropic, driver Cassandra, mô hình) trong một
+luồng nền, sau khi server đã bắt đầu nhận request.
+
+Các module này được import lười ở lần dùng đầu tiên nên worker khởi động nhanh và
+/health trả lời ngay; luồng prewarm chỉ giúp request đầu tiên không phải chờ
+import/kết nối. Lỗi ở một bước (vd. Cassandra chưa chạy) được ghi lại và bước đó
+sẽ được thử lại ở lần dùng thật.
+"""
+
+import threading
+import time
+
+import metrics
+
+logger = metrics.get_logger("warmup")
+
+
+class Warmup:
+    """Chạy lần lượt các bước ``(tên, hàm)`` trong một luồng daemon."""
+
+    def __init__(self, steps):
+        self.steps = list(steps)
+        self.state = "pending"
+        self.seconds = {}
+        self.errors = {}
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self.state = "running"
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def run(self):
+        for name, step in self.steps:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                self.errors[name] = str(e)
+                logger.warning("Prewarm %s lỗi: %s", name, e)
+            self.seconds[name] = round(time.perf_counter() - start, 3)
+        self.state = "done"
+        logger.info("Prewarm xong: %s", self.seconds)
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {"state": self.state, "seconds": dict(self.seconds), "errors": dict(self.errors)}
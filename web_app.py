@@ -4,21 +4,63 @@
 Alternative to Gradio with HTML/CSS/JavaScript
 """
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, JSONResponse
-from pydantic import BaseModel
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, ValidationError, field_validator
+from datetime import datetime
 import uvicorn
+import json
 import os
+import tempfile
+import time
+import db_pool
+import inference_engine
+import ingest
+import metrics
+import result_cache
+import storage
+import timeseries_index
+import timestamp_filter
+import warmup
+from prediction_batcher import MicroBatcher
 from function_calling import PollutionQueryHandler
 from config import Config
 
+logger = metrics.get_logger("web_app")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Optionally warm the model and build the time-series index on startup, then prewarm
+    the lazily imported dependencies (or just the exists filter) in the background;
+    close the Cassandra pool on shutdown"""
+    if Config.PRELOAD_MODEL:
+        inference_engine.get_engine().load()
+    if Config.TS_INDEX_PATH:
+        await run_in_threadpool(timeseries_index.ensure_index)
+    if Config.PREWARM:
+        prewarm.start()
+    else:
+        timestamp_filter.build_in_background()
+    ingestor.start()
+    yield
+    await ingestor.stop()
+    await predict_batcher.stop()
+    db_pool.shutdown_pool()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Air Quality Monitor",
     description="AI-powered Air Quality Index monitoring system",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Setup templates and static files
@@ -30,9 +72,79 @@ try:
     Config.validate_config()
     ai_handler = PollutionQueryHandler(Config.ANTHROPIC_API_KEY)
 except Exception as e:
-    print(f"❌ Configuration error: {e}")
+    logger.error("Configuration error: %s", e)
     ai_handler = None
 
+# Heavy imports (anthropic, cassandra driver, model backend) happen on first use;
+# this loads them in a background thread once the server is up
+prewarm = warmup.Warmup(
+    ([("anthropic", ai_handler.prewarm_clients)] if ai_handler else [])
+    + [("storage", storage.get_store), ("exists_filter", timestamp_filter.get_filter),
+       ("model", lambda: inference_engine.get_engine().load())]
+)
+
+# Concurrent /api/predict requests share one forward pass
+predict_batcher = MicroBatcher(
+    lambda features: inference_engine.get_engine().predict_classes(features),
+    max_batch_size=Config.PREDICT_BATCH_MAX_SIZE,
+    max_wait_ms=Config.PREDICT_BATCH_MAX_WAIT_MS,
+    executor=inference_engine.get_executor()
+)
+
+# Live readings from /api/ingest are buffered and written to storage in batches
+ingestor = ingest.Ingestor()
+
+# Counters the caches, index and batcher already keep, read when /metrics is scraped
+metrics.REGISTRY.callback(
+    "aqm_tool_cache_lookups_total", "Tool-selection cache lookups by outcome",
+    lambda: {key: ai_handler.tool_cache.stats()[key] for key in ("hits", "rule_hits", "misses")} if ai_handler else None,
+    labelname="outcome", kind="counter")
+metrics.REGISTRY.callback(
+    "aqm_result_cache_lookups_total", "Query/stats result cache lookups by outcome",
+    lambda: {key: result_cache.get_cache().stats()[key] for key in ("hits", "misses")},
+    labelname="outcome", kind="counter")
+metrics.REGISTRY.callback(
+    "aqm_timeseries_index_lookups_total", "Reads served by the hourly time-series index",
+    lambda: (timeseries_index.stats() or {}).get("lookups"), kind="counter")
+metrics.REGISTRY.callback(
+    "aqm_exists_filter_checks_total", "Insert-tool existence checks by Bloom filter outcome",
+    lambda: {key: value for key, value in (timestamp_filter.stats() or {}).items()
+             if key in ("absent", "exists", "false_positive")},
+    labelname="outcome", kind="counter")
+metrics.REGISTRY.callback(
+    "aqm_predict_batches_total", "Micro-batched forward passes for /api/predict",
+    lambda: predict_batcher.stats()["batches"], kind="counter")
+metrics.REGISTRY.callback(
+    "aqm_ingest_rows_total", "Rows posted to /api/ingest by state (rejected rows failed validation)",
+    lambda: {key: ingestor.stats()[key] for key in ("accepted", "rejected", "written", "failed")},
+    labelname="state", kind="counter")
+metrics.REGISTRY.callback(
+    "aqm_ingest_buffered_rows", "Ingested rows waiting to be written", lambda: ingestor.buffered)
+metrics.REGISTRY.callback(
+    "aqm_ingest_lag_seconds", "Age of the oldest buffered ingest row", lambda: round(ingestor.lag(), 3))
+metrics.REGISTRY.callback(
+    "aqm_ingest_throttled_total", "Ingest requests rejected because the buffer was full",
+    lambda: ingestor.throttled, kind="counter")
+metrics.REGISTRY.callback(
+    "aqm_predict_rows_total", "Rows scored through the /api/predict micro-batcher",
+    lambda: predict_batcher.stats()["rows"], kind="counter")
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Request latency per route template (not the raw path, so labels stay bounded)"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.HTTP_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                     route=getattr(route, "path", "unmatched"), status=str(status))
+
+
 # Pydantic models for API
 class QueryRequest(BaseModel):
     message: str
@@ -48,6 +160,17 @@ class PredictionRequest(BaseModel):
     pt08_s2_nmhc: float
     pt08_s4_no2: float
 
+class BatchPredictionRequest(BaseModel):
+    start: datetime
+    end: datetime
+    write_back: bool = False
+
+    @field_validator("end", mode="before")
+    @classmethod
+    def _end_of_day(cls, value):
+        # Same rule as the batch_predict CLI: a date-only end covers that whole day
+        return storage.parse_end_time(value) if isinstance(value, str) else value
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     """Main page"""
@@ -59,9 +182,25 @@ async def health_check():
     return {
         "status": "healthy",
         "ai_handler": "available" if ai_handler else "unavailable",
+        "tool_cache": ai_handler.tool_cache.stats() if ai_handler else None,
+        "result_cache": result_cache.get_cache().stats(),
+        "database": storage.health(),
+        "timeseries_index": timeseries_index.stats(),
+        "exists_filter": timestamp_filter.stats(),
+        "inference": inference_engine.get_engine().stats(),
+        "predict_batching": predict_batcher.stats(),
+        "prewarm": prewarm.stats(),
+        "ingest": ingestor.stats(),
         "version": "1.0.0"
     }
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Per-stage latency histograms and counters in Prometheus text format (this worker only)"""
+    if not Config.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.post("/api/query")
 async def process_query(request: QueryRequest):
     """Process natural language queries"""
@@ -69,9 +208,9 @@ async def process_query(request: QueryRequest):
         raise HTTPException(status_code=503, detail="AI service unavailable")
     
     try:
-        # Process query with AI
-        result = ai_handler.call_claude_function(request.message)
-        final_result = ai_handler.rewrite_result_with_advice(result)
+        # Process query with AI (async client + async DB calls, nothing blocks the event loop)
+        result = await ai_handler.acall_claude_function(request.message)
+        final_result = await ai_handler.arewrite_result_with_advice(result)
         
         return {
             "success": True,
@@ -81,6 +220,22 @@ async def process_query(request: QueryRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query processing error: {str(e)}")
 
+@app.post("/api/query/stream")
+async def stream_query(request: QueryRequest):
+    """Process a query as server-sent events, each sent as soon as it is ready:
+    tool_selected, tool_result, answer (text chunks streamed from Claude), done or error"""
+    if not ai_handler:
+        raise HTTPException(status_code=503, detail="AI service unavailable")
+
+    async def events():
+        async for event, data in ai_handler.astream_query(request.message):
+            payload = json.dumps(jsonable_encoder(data), ensure_ascii=False)
+            yield f"event: {event}\ndata: {payload}\n\n"
+
+    # no-cache / X-Accel-Buffering keep proxies from holding events back
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/api/predict")
 async def predict_pollution(request: PredictionRequest):
     """Direct pollution prediction"""
@@ -88,17 +243,15 @@ async def predict_pollution(request: PredictionRequest):
         raise HTTPException(status_code=503, detail="AI service unavailable")
     
     try:
-        result = ai_handler.predict_pollution_level(
-            Day=request.day,
-            Month=request.month, 
-            Year=request.year,
-            Hour=request.hour,
-            PT08_S1_CO=request.pt08_s1_co,
-            C6H6_GT=request.c6h6_gt,
-            PT08_S5_O3=request.pt08_s5_o3,
-            PT08_S2_NMHC=request.pt08_s2_nmhc,
-            PT08_S4_NO2=request.pt08_s4_no2
-        )
+        predicted_class = int(await predict_batcher.submit([
+            request.day, request.month, request.year, request.hour,
+            request.pt08_s1_co, request.c6h6_gt, request.pt08_s5_o3,
+            request.pt08_s2_nmhc, request.pt08_s4_no2
+        ]))
+        result = {
+            "pollution_level": predicted_class,
+            "description": inference_engine.POLLUTION_LEVELS[predicted_class]
+        }
         
         return {
             "success": True,
@@ -107,21 +260,126 @@ async def predict_pollution(request: PredictionRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
 
+async def _spool_upload(request: Request):
+    """Copy the request body into a temp file that only stays in memory while it is small"""
+    upload = tempfile.SpooledTemporaryFile(max_size=Config.BATCH_UPLOAD_MEMORY_BYTES)
+    try:
+        async for chunk in request.stream():
+            upload.write(chunk)
+    except BaseException:
+        upload.close()
+        raise
+    upload.seek(0)
+    return upload
+
+def _iter_and_close(parts, upload):
+    try:
+        yield from parts
+    finally:
+        upload.close()
+
+@app.post("/api/predict/batch")
+async def predict_batch(request: Request):
+    """Batch prediction: a text/csv body is streamed back relabelled;
+    a JSON {start, end, write_back} body relabels a stored time range (write_back needs Cassandra)"""
+    if not ai_handler:
+        raise HTTPException(status_code=503, detail="AI service unavailable")
+
+    from batch_predict import BatchPredictor
+
+    predictor = BatchPredictor()
+    if request.headers.get("content-type", "").startswith("text/csv"):
+        upload = await _spool_upload(request)
+        return StreamingResponse(_iter_and_close(predictor.iter_csv(upload), upload), media_type="text/csv")
+
+    try:
+        payload = BatchPredictionRequest(**await request.json())
+    except (ValidationError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid batch request: {str(e)}")
+
+    store = await run_in_threadpool(storage.get_store)
+    if payload.write_back and getattr(store, "session", None) is None:
+        raise HTTPException(status_code=400,
+                            detail=f"write_back is not supported by the {store.backend} storage backend")
+    try:
+        result = await run_in_threadpool(
+            predictor.score_cassandra, store,
+            payload.start, payload.end, payload.write_back
+        )
+        return {
+            "success": True,
+            "batch": result
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch prediction error: {str(e)}")
+
+async def read_capped_body(request: Request, limit: int) -> bytes:
+    """Request body, or 413 as soon as Content-Length or the bytes received exceed ``limit``"""
+    too_large = HTTPException(status_code=413, detail=f"Request body exceeds {limit} bytes")
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > limit:
+        raise too_large
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+@app.post("/api/ingest")
+async def ingest_readings(request: Request, wait: bool = False):
+    """Live sensor readings in the AirQuality1.csv column layout, as NDJSON or CSV.
+    Rows are labelled with the AQI breakpoints, buffered and written in batches;
+    ?wait=true returns once they are written, or 202 with a ticket after INGEST_WAIT_SECONDS
+    (written when /health reports ingest.flushed_seq >= ticket). 429 when the buffer stays full,
+    413 when the body is larger than INGEST_MAX_BODY_BYTES"""
+    body = await read_capped_body(request, Config.INGEST_MAX_BODY_BYTES)
+    try:
+        raw = await run_in_threadpool(ingest.read_readings, body, request.headers.get("content-type", ""))
+        frame, rejected = await run_in_threadpool(ingestor.prepare, raw)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid readings: {str(e)}")
+
+    try:
+        accepted = await ingestor.submit(frame, rejected, wait=wait)
+    except ingest.BufferFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except ingest.WaitTimeout as e:
+        return JSONResponse(status_code=202, content={
+            "success": True,
+            "accepted": len(frame),
+            "rejected": rejected,
+            "written": False,
+            "ticket": e.ticket,
+            "buffered": ingestor.buffered
+        })
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return {
+        "success": True,
+        "accepted": accepted,
+        "rejected": rejected,
+        "written": wait,
+        "buffered": ingestor.buffered
+    }
+
 @app.get("/api/stats/{stat_type}")
 async def get_statistics(stat_type: str, start_day: int, start_month: int, 
-                        end_day: int, end_month: int, year: int):
+                        end_day: int, end_month: int, year: int, end_year: int = None):
     """Get statistical analysis"""
     if not ai_handler:
         raise HTTPException(status_code=503, detail="AI service unavailable")
     
     try:
-        result = ai_handler.statistical_analysis(
+        result = await ai_handler.astatistical_analysis(
             stat_type=stat_type,
             start_day=start_day,
             start_month=start_month,
             end_day=end_day,
             end_month=end_month,
-            year=year
+            year=year,
+            end_year=end_year
         )
         
         return {